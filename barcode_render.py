@@ -0,0 +1,50 @@
+from functools import lru_cache
+
+# -------------------- Barcode Rendering --------------------
+# Products store the barcode value; bars are computed from it on demand and drawn
+# straight into whatever target needs them (Qt pixmaps, SVG files), so nothing on the
+# hot path reads images from disk.
+
+QUIET_ZONE = 10  # modules of white space on each side
+
+
+@lru_cache(maxsize=4096)
+def code128_bars(code):
+    # (start, width) runs of dark modules and the total module count, quiet zones included
+    import barcode
+    modules = barcode.get_barcode_class('code128')(code).build()[0]
+    bars = []
+    start = None
+    for i, bit in enumerate(modules):
+        if bit == "1" and start is None:
+            start = i
+        elif bit != "1" and start is not None:
+            bars.append((start + QUIET_ZONE, i - start))
+            start = None
+    if start is not None:
+        bars.append((start + QUIET_ZONE, len(modules) - start))
+    return tuple(bars), len(modules) + 2 * QUIET_ZONE
+
+
+def render_svg(code, moduleWidth=2, height=60):
+    bars, total = code128_bars(code)
+    width = total * moduleWidth
+    rects = "".join(f'<rect x="{x * moduleWidth}" y="0" width="{w * moduleWidth}" height="{height}"/>'
+                    for x, w in bars)
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+            f'viewBox="0 0 {width} {height}"><rect width="100%" height="100%" fill="white"/>'
+            f'<g fill="black">{rects}</g></svg>')
+
+
+def render_qimage(code, width, height):
+    from PyQt5.QtCore import QRectF, Qt
+    from PyQt5.QtGui import QImage, QPainter
+    bars, total = code128_bars(code)
+    image = QImage(width, height, QImage.Format_RGB32)
+    image.fill(Qt.white)
+    scale = width / total
+    painter = QPainter(image)
+    for x, w in bars:
+        painter.fillRect(QRectF(x * scale, 0, w * scale, height), Qt.black)
+    painter.end()
+    return image
@@ -0,0 +1,318 @@
+import argparse, datetime, json, os, platform, random, resource, shutil, sqlite3, subprocess, sys, tempfile, time
+
+import connection
+import datagen
+import queries
+import query_builder
+import search
+import stock
+import summary
+from migrations import migrate
+from query_builder import TableQuery
+
+# -------------------- Data Access Benchmarks --------------------
+# Times what the GUI does on its hot paths, headless and against generated databases of
+# several sizes. Each benchmark calls the same data-layer function with the same arguments
+# as the MainWindow/InvoiceDialog slot it is named after. Results are JSON, so two runs (two
+# commits, say) can be compared with --compare.
+#
+# A generated database is cached per scale and seed in --data-dir and copied to a scratch
+# file for each run, so write benchmarks never change the cached copy.
+
+ITERATIONS = 200
+WARMUP = 5
+SAMPLE_SIZE = 1000
+REGRESSION_THRESHOLD = 10.0  # percent slower at p50 or p95 that counts as a regression
+NOISE_FLOOR_MS = 0.05  # smaller differences are timer and scheduler noise, whatever the percentage
+TABLES = ("Products", "Invoices", "Suppliers", "Categories", "Customers", "Users")
+# table -> search column, as the search combo boxes offer them
+SEARCH_COLUMNS = {"Products": "name", "Invoices": "payment_status", "Suppliers": "name",
+                  "Categories": "category_name", "Customers": "name", "Users": "username"}
+
+
+class SkipBenchmark(Exception):
+    pass
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def prepare_database(scale, seed, dataDir):
+    # -> path of the cached database for (scale, seed), generated the first time
+    os.makedirs(dataDir, exist_ok=True)
+    path = os.path.join(dataDir, f"{scale}-{seed}.db")
+    if os.path.exists(path):
+        return path
+    partial = path + ".partial"
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(partial + suffix):
+            os.remove(partial + suffix)
+    conn = connection.open_connection(partial)
+    try:
+        migrate(conn)
+        datagen.generate(conn, datagen.SCALES[scale], seed,
+                         progress=lambda message: sys.stderr.write(f"\r{scale}: {message}"))
+        sys.stderr.write("\n")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+    os.replace(partial, path)
+    return path
+
+
+class Workload:
+    # Arguments drawn from the database once, so every run of a scale asks for the same rows
+    def __init__(self, conn, seed, workdir):
+        rng = random.Random(seed)
+        self.workdir = workdir
+
+        def sample(sql):
+            rows = [tuple(r) for r in conn.execute(sql)]
+            return rng.sample(rows, min(len(rows), SAMPLE_SIZE))
+
+        self.rng = rng
+        self.products = sample("SELECT product_id, name, price, barcode FROM Products")
+        self.stocked = sample("SELECT product_id, price FROM Products WHERE stock_quantity >= 50")
+        self.customers = [r[0] for r in sample("SELECT customer_id FROM Customers")]
+        self.users = [r[0] for r in sample("SELECT user_id FROM Users")]
+        self.invoices = [r[0] for r in sample("SELECT invoice_id FROM Invoices")]
+        self.terms = {table: [str(r[0]).split()[0] for r in
+                              sample(f"SELECT {column} FROM {table} WHERE {column} IS NOT NULL LIMIT 100000")]
+                      for table, column in SEARCH_COLUMNS.items()}
+        self.counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                       for table in TABLES + ("Invoice_Items",)}
+
+    def choice(self, values):
+        if not values:
+            raise SkipBenchmark("no rows to draw arguments from")
+        return self.rng.choice(values)
+
+
+# ---------- benchmarks: name -> fn(workload) returning the operation to time ----------
+def _refresh(table):
+    # MainWindow._loadTable with no search, filter or sort: the first page of the view
+    spec = TableQuery(table).spec()
+    return lambda w: lambda: connection.run(query_builder.fetch_page, spec, readonly=True)
+
+
+def _search(table):
+    # MainWindow._search: the typed term as a full-text match or LIKE on the combo's column
+    column = SEARCH_COLUMNS[table]
+    op = "match" if search.is_searchable(table, column) else "like"
+
+    def bench(w):
+        def find():
+            spec = TableQuery(table, [[column, op, w.choice(w.terms[table])]]).spec()
+            return connection.run(query_builder.fetch_page, spec, readonly=True)
+        return find
+    return bench
+
+
+def _dashboard(w):
+    return lambda: connection.run(summary.dashboard, readonly=True)
+
+
+def _save_invoice(w):
+    # InvoiceDialog.saveInvoice for a new invoice of one to five lines
+    def save():
+        lines = w.rng.sample(w.stocked, min(len(w.stocked), w.rng.randint(1, 5)))
+        if not lines:
+            raise SkipBenchmark("no products in stock")
+        items = [{"product_id": pid, "quantity": 1, "price_per_item": price} for pid, price in lines]
+        return connection.run(stock.save_invoice, None, w.choice(w.customers), w.choice(w.users), "paid", items)
+    return save
+
+
+def _export_pdf(w):
+    # MainWindow.exportInvoicePDF
+    try:
+        import pdf_export
+    except ImportError as e:
+        raise SkipBenchmark(str(e))
+    return lambda: pdf_export.export_invoice_pdf(w.choice(w.invoices), w.workdir)
+
+
+def _barcode(w):
+    # ProductDialog: a new code, drawn as bars (SVG here instead of a QImage)
+    from barcode_service import new_barcode_code
+    try:
+        from barcode_render import render_svg
+        render_svg("BENCH")
+    except ImportError as e:
+        raise SkipBenchmark(str(e))
+    return lambda: render_svg(new_barcode_code())
+
+
+def _lookup_index(w):
+    # InvoiceDialog.scanBarcode with the barcode index loaded
+    from product_index import ProductIndex
+    index = ProductIndex()  # not the shared one, which may hold another scale's products
+    index.load()
+    codes = [p[3] for p in w.products if p[3]]
+    return lambda: index.lookup(w.choice(codes))
+
+
+def _lookup_sql(w):
+    codes = [p[3] for p in w.products if p[3]]
+    return lambda: connection.run(queries.lookup_barcode, w.choice(codes), readonly=True)
+
+
+def _pick_product(w):
+    # The product picker of InvoiceItemDialog, for the first three letters typed
+    return lambda: connection.run(queries.pick, "products", w.choice(w.products)[1][:3], readonly=True)
+
+
+BENCHMARKS = {}
+BENCHMARKS.update({f"refresh.{table}": _refresh(table) for table in TABLES})
+BENCHMARKS["refresh.Dashboard"] = _dashboard
+BENCHMARKS.update({f"search.{table}": _search(table) for table in TABLES})
+BENCHMARKS.update({
+    "invoice.save": _save_invoice,
+    "invoice.export_pdf": _export_pdf,
+    "barcode.generate": _barcode,
+    "lookup.barcode_index": _lookup_index,
+    "lookup.barcode_sql": _lookup_sql,
+    "lookup.product_picker": _pick_product,
+})
+
+
+def percentile(values, p):
+    # Nearest-rank percentile of an unsorted list
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def measure(op, iterations=ITERATIONS, warmup=WARMUP):
+    for _ in range(warmup):
+        op()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t = time.perf_counter()
+        op()
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - started
+    return {
+        "iterations": iterations,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "mean_ms": round(elapsed / iterations * 1000, 3),
+        "ops_per_s": round(iterations / elapsed, 1) if elapsed else 0.0,
+        "peak_rss_mb": peak_rss_mb(),  # of the whole run so far
+    }
+
+
+def run_scale(scale, seed=1, dataDir="bench_data", iterations=ITERATIONS, only=None, log=None):
+    source = prepare_database(scale, seed, dataDir)
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    dbFile = os.path.join(workdir, "bench.db")
+    shutil.copyfile(source, dbFile)
+    connection.close_pool()
+    connection.DB_FILE = dbFile
+    try:
+        with connection.get_connection(readonly=True) as conn:
+            workload = Workload(conn, seed, workdir)
+        results = {}
+        for name, bench in BENCHMARKS.items():
+            if only and not any(name.startswith(prefix) for prefix in only):
+                continue
+            try:
+                results[name] = measure(bench(workload), iterations)
+            except SkipBenchmark as e:
+                results[name] = {"skipped": str(e)}
+            if log is not None:
+                log(name, results[name])
+        return {"rows": workload.counts, "benchmarks": results}
+    finally:
+        connection.close_pool()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run(scales=("small",), seed=1, dataDir="bench_data", iterations=ITERATIONS, only=None, log=None):
+    return {
+        "commit": git_commit(),
+        "started": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "seed": seed,
+        "iterations": iterations,
+        "scales": {scale: run_scale(scale, seed, dataDir, iterations, only, log) for scale in scales},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def compare(base, new, threshold=REGRESSION_THRESHOLD, floor=NOISE_FLOOR_MS):
+    # -> (report lines, regressions) for the benchmarks both runs measured
+    lines = [f"{'benchmark':<36} {'p50 ms':^17} {'change':>8} {'p95 ms':^17} {'change':>8}"]
+    regressions = []
+    for scale, result in new["scales"].items():
+        before = base["scales"].get(scale, {}).get("benchmarks", {})
+        for name, stats in result["benchmarks"].items():
+            old = before.get(name)
+            if not old or "skipped" in old or "skipped" in stats:
+                continue
+            keys = ("p50_ms", "p95_ms")
+            changes = [(stats[k] - old[k]) / old[k] * 100 if old[k] else 0.0 for k in keys]
+            slower = [c > threshold and stats[k] - old[k] > floor for k, c in zip(keys, changes)]
+            flag = "  REGRESSION" if any(slower) else ""
+            if flag:
+                regressions.append(f"{scale}/{name}")
+            lines.append(f"{scale + '/' + name:<36} {old['p50_ms']:>8.3f}>{stats['p50_ms']:<8.3f} {changes[0]:>+7.1f}% "
+                         f"{old['p95_ms']:>8.3f}>{stats['p95_ms']:<8.3f} {changes[1]:>+7.1f}%{flag}")
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the data access behind the GUI's hot paths.")
+    parser.add_argument("--scale", nargs="+", choices=tuple(datagen.SCALES), default=["small"])
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--iterations", type=int, default=ITERATIONS)
+    parser.add_argument("--only", nargs="+", metavar="PREFIX", help="run only benchmarks starting with these")
+    parser.add_argument("--data-dir", default="bench_data", help="cache of generated databases")
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two result files and exit")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="percent slowdown reported as a regression (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if args.compare:
+        with open(args.compare[0]) as f:
+            base = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        lines, regressions = compare(base, new, args.threshold)
+        print("\n".join(lines))
+        print(f"\n{len(regressions)} regressions" + (f": {', '.join(regressions)}" if regressions else ""))
+        return 1 if regressions else 0
+
+    def log(name, stats):
+        detail = stats.get("skipped") and f"skipped ({stats['skipped']})" or \
+            f"p50 {stats['p50_ms']:.3f} ms  p99 {stats['p99_ms']:.3f} ms  {stats['ops_per_s']:,.0f}/s"
+        sys.stderr.write(f"{name:<28} {detail}\n")
+
+    results = run(args.scale, args.seed, args.data_dir, args.iterations, args.only, log)
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+import sys, threading, traceback
+
+# -------------------- Change Notifications --------------------
+# Data-layer writes record the table (and row keys when known) they touched. When the pool
+# gets the writer connection back after a commit, the recorded changes are published to
+# subscribers; a rolled-back transaction publishes nothing. Writes that recorded nothing
+# are published as table=None ("something changed"). Commits made by other processes are
+# found by poll_external() and published the same way.
+#
+# Callbacks run on the thread that committed, which is often a worker thread, and must
+# not block: mark state stale and let the owner refresh it.
+
+_subscribers = []  # (callback, tables or None)
+_subscribersLock = threading.Lock()
+_local = threading.local()
+
+
+def subscribe(callback, tables=None):
+    # callback(table, keys, origin): keys is a frozenset of primary keys, or None for "any row"
+    with _subscribersLock:
+        _subscribers.append((callback, frozenset(tables) if tables is not None else None))
+
+
+def unsubscribe(callback):
+    with _subscribersLock:
+        _subscribers[:] = [(cb, tables) for cb, tables in _subscribers if cb is not callback]
+
+
+def publish(table=None, keys=None, origin="local"):
+    keys = frozenset(keys) if keys is not None else None
+    with _subscribersLock:
+        targets = [cb for cb, tables in _subscribers if tables is None or table is None or table in tables]
+    for callback in targets:
+        try:
+            callback(table, keys, origin)
+        except Exception:
+            traceback.print_exc(file=sys.stderr)
+
+
+def record(table, keys=None):
+    # Note a change made by the write transaction running on this thread
+    pending = getattr(_local, "pending", None)
+    if pending is None:
+        pending = _local.pending = {}
+    if keys is None or None in keys:
+        pending[table] = None
+    elif table not in pending:
+        pending[table] = set(keys)
+    elif pending[table] is not None:
+        pending[table].update(keys)
+
+
+def flush(committed, changed=True):
+    # Called when this thread's write transaction ends
+    pending = getattr(_local, "pending", None) or {}
+    _local.pending = None
+    if not committed:
+        return
+    if not pending:
+        if changed:
+            publish(None)
+        return
+    for table, keys in pending.items():
+        publish(table, keys)
+
+
+def poll_external():
+    # Publish commits made outside this process; cheap enough for a GUI timer
+    import connection
+    remote = connection.get_remote()
+    if remote is not None:
+        for table, keys in remote.changes():
+            publish(table, keys, origin="external")
+        return
+    if connection.get_pool().externalChanges():
+        publish(None, origin="external")
@@ -0,0 +1,230 @@
+import argparse, sys
+
+import connection
+import sql_trace
+
+# -------------------- Command Line --------------------
+# Headless entry point for scripting and maintenance. Only the GUI-free data layer is
+# imported up front; heavier modules (ReportLab, pyarrow, python-barcode) are imported
+# inside the subcommand that needs them, so `python cli.py --help` starts instantly.
+
+
+def _progress(message):
+    sys.stderr.write(f"\r{message}")
+    sys.stderr.flush()
+
+
+def cmd_import(args):
+    import importer
+    result = importer.import_csv(args.kind, args.path, args.batch_size, args.on_conflict, args.defer_index,
+                                 progress=lambda r: _progress(f"{r.read} rows read, {r.inserted} inserted, "
+                                                              f"{r.updated} updated"))
+    sys.stderr.write("\n")
+    print(result.summary())
+    for error in result.errors:
+        print(f"  {error}")
+    return 0 if result.inserted or result.updated or not result.read else 1
+
+
+def cmd_export(conn, args):
+    import powerbi_export
+    written = powerbi_export.export_all(conn, args.dir, args.format, args.full, args.only or None)
+    connection.run(powerbi_export.prune_deletions, args.dir)
+    for name, count in written.items():
+        print(f"{name}: {count} rows")
+    return 0
+
+
+def cmd_pdf(args):
+    import pdf_export
+    progress = lambda done, total: _progress(f"{done}/{total} invoices")
+    if args.ids:
+        paths = pdf_export.export_batch(args.ids, args.dir, args.workers, progress=progress)
+    else:
+        paths = pdf_export.export_range(args.start, args.end, args.dir, args.workers, progress=progress)
+    sys.stderr.write("\n")
+    print(f"{len(paths)} invoices exported to {args.dir}")
+    return 0
+
+
+def cmd_barcodes(conn, args):
+    from barcode_service import BarcodeService
+    codes = [row[0] for row in conn.execute("SELECT barcode FROM Products WHERE barcode IS NOT NULL")]
+    service = BarcodeService(args.dir, args.workers)
+    try:
+        paths = service.generate_many(codes, format=args.format,
+                                      progress=lambda done, total: _progress(f"{done}/{total} barcodes"))
+    finally:
+        service.shutdown()
+    sys.stderr.write("\n")
+    print(f"{len(paths)} barcodes written to {args.dir}")
+    return 0
+
+
+def cmd_generate(conn, args):
+    import datagen
+    volumes = dict(datagen.SCALES[args.scale])
+    volumes.update({table: getattr(args, table) for table in volumes if getattr(args, table) is not None})
+    counts = datagen.generate(conn, volumes, args.seed, args.start, args.end, progress=_progress)
+    sys.stderr.write("\n")
+    for table, count in counts.items():
+        print(f"{table}: {count} rows")
+    return 0
+
+
+def cmd_reindex(conn, args):
+    import search, summary
+    search.rebuild(conn)
+    search.optimize(conn)
+    summary.rebuild(conn)
+    conn.commit()
+    print("Search index and summary tables rebuilt.")
+    return 0
+
+
+def cmd_vacuum(conn, args):
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.execute("PRAGMA optimize")
+    print("Database vacuumed.")
+    return 0
+
+
+def cmd_summary(conn, args):
+    import summary
+    data = summary.dashboard(conn, args.days, args.top)
+    print(f"Today: {data['today'][1]:,.2f} ({data['today'][0]} invoices)")
+    print(f"Last {args.days} days: {data['period'][1]:,.2f} ({data['period'][0]} invoices)")
+    print(f"Stock value: {data['stock_value']:,.2f}")
+    print("\nTop products:")
+    for row in data["top_products"]:
+        print(f"  {row['name']:<30} {row['units_sold']:>8} units {row['revenue']:>14,.2f}")
+    print("\nStock by category:")
+    for row in data["stock"]:
+        print(f"  {row['category_name']:<30} {row['units_in_stock']:>8} units {row['stock_value']:>14,.2f}")
+    return 0
+
+
+def cmd_slow_log(args):
+    groups = sql_trace.read_slow_log(args.path, args.top)
+    if not groups:
+        print(f"No slow queries logged in {args.path}.")
+        return 0
+    for group in groups:
+        scans = f"  full scan: {', '.join(group['full_scan'])}" if group["full_scan"] else ""
+        print(f"{group['calls']} x, {group['total_ms']:.1f} ms total, {group['max_ms']:.1f} ms max{scans}")
+        print(f"  {group['sql'][:300]}")
+        if group["site"]:
+            print(f"  at {group['site']}")
+        for step in group["plan"]:
+            print(f"    {step}")
+        print()
+    return 0
+
+
+def cmd_serve(args):
+    import pos_server
+    pos_server.run_server(args.host, args.port, args.db, args.token)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="Inventory billing maintenance and reporting.")
+    parser.add_argument("--db", default=connection.DB_FILE, help="database file (default: %(default)s)")
+    parser.add_argument("--trace-sql", nargs="?", type=float, const=50.0, metavar="MS",
+                        help="time every SQL statement, print the totals and log statements slower than MS "
+                             "(default 50) to slow_queries.log")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.required = True
+
+    p = commands.add_parser("import", help="bulk import a CSV file")
+    p.add_argument("kind", choices=("products", "customers", "suppliers"))
+    p.add_argument("path")
+    p.add_argument("--batch-size", type=int, default=10000)
+    p.add_argument("--on-conflict", choices=("abort", "ignore", "replace"), default="ignore")
+    p.add_argument("--defer-index", action="store_true", help="rebuild the search index once at the end")
+    p.set_defaults(fn=cmd_import, readonly=False, pooled=False)
+
+    p = commands.add_parser("export", help="write the PowerBI export files")
+    p.add_argument("--dir", default="PowerBI")
+    p.add_argument("--format", choices=("csv", "parquet"), default="csv")
+    p.add_argument("--full", action="store_true", help="ignore the incremental high-water marks")
+    p.add_argument("--only", nargs="+", metavar="NAME", help="export only these files")
+    p.set_defaults(fn=cmd_export, readonly=True)
+
+    p = commands.add_parser("pdf", help="export invoice PDFs in batch")
+    p.add_argument("--from", dest="start", metavar="YYYY-MM-DD")
+    p.add_argument("--to", dest="end", metavar="YYYY-MM-DD")
+    p.add_argument("--ids", nargs="+", type=int, metavar="ID")
+    p.add_argument("--dir", default="invoice_pdfs")
+    p.add_argument("--workers", type=int)
+    p.set_defaults(fn=cmd_pdf, readonly=True, pooled=False)
+
+    p = commands.add_parser("export-barcodes", help="write barcode image files for every product")
+    p.add_argument("--dir", default="barcodes")
+    p.add_argument("--format", choices=("png", "svg"), default="png")
+    p.add_argument("--workers", type=int)
+    p.set_defaults(fn=cmd_barcodes, readonly=True)
+
+    p = commands.add_parser("summary", help="print sales and stock totals")
+    p.add_argument("--days", type=int, default=30)
+    p.add_argument("--top", type=int, default=10, help="number of top products to list")
+    p.set_defaults(fn=cmd_summary, readonly=True)
+
+    p = commands.add_parser("serve", help="serve the database to POS client stations")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--token", help="shared token clients must send (default: $POS_TOKEN)")
+    p.set_defaults(fn=cmd_serve, readonly=None)
+
+    p = commands.add_parser("generate", help="fill the database with a reproducible synthetic dataset")
+    p.add_argument("--scale", choices=("small", "medium", "large"), default="small",
+                   help="preset volumes (default: %(default)s); the options below override them")
+    for table in ("categories", "suppliers", "products", "customers", "users", "invoices", "items"):
+        p.add_argument(f"--{table}", type=int, metavar="N")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--from", dest="start", default="2024-01-01", metavar="YYYY-MM-DD", help="first invoice date")
+    p.add_argument("--to", dest="end", default="2025-12-31", metavar="YYYY-MM-DD", help="last invoice date")
+    p.set_defaults(fn=cmd_generate, readonly=False)
+
+    p = commands.add_parser("slow-log", help="summarise the slow-query log written with --trace-sql")
+    p.add_argument("path", nargs="?", default="slow_queries.log")
+    p.add_argument("--top", type=int, default=20, help="number of statements to list")
+    p.set_defaults(fn=cmd_slow_log, readonly=None)
+
+    p = commands.add_parser("reindex", help="rebuild the search index and summary tables")
+    p.set_defaults(fn=cmd_reindex, readonly=False)
+
+    p = commands.add_parser("vacuum", help="compact the database file")
+    p.set_defaults(fn=cmd_vacuum, readonly=False)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    connection.DB_FILE = args.db
+    if args.trace_sql is not None:
+        sql_trace.enable(args.trace_sql)
+    if args.readonly is None:
+        return args.fn(args)  # manages its own connections
+    from migrations import migrate
+    try:
+        with connection.get_connection() as conn:
+            migrate(conn)
+        if not getattr(args, "pooled", True):
+            return args.fn(args)  # takes the connection it needs per unit of work
+        with connection.get_connection(readonly=args.readonly) as conn:
+            return args.fn(conn, args)
+    except KeyboardInterrupt:
+        return 130
+    except Exception as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        connection.close_pool()
+        if args.trace_sql is not None:
+            print(sql_trace.format_stats(sql_trace.snapshot()), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+import queue, sqlite3, threading, time
+
+import changes
+import metrics
+import sql_trace
+
+# -------------------- Connection Pool --------------------
+DB_FILE = "inventory_billing.db"
+
+# Applied once when a connection is opened instead of on every get_connection() call
+PRAGMAS = (
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA cache_size = -32768",
+)
+STATEMENT_CACHE_SIZE = 256
+READER_COUNT = 4
+BUSY_TIMEOUT = 10.0
+
+
+def open_connection(path, readonly=False):
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False,
+                           cached_statements=STATEMENT_CACHE_SIZE, factory=sql_trace.connection_factory())
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    if readonly:
+        conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+class PooledConnection:
+    # Proxy handed out by the pool. close() or leaving a `with` block returns the
+    # underlying connection; the block commits on success and rolls back on error.
+    # A block nested in another on the writer's thread is a savepoint of the outer
+    # transaction instead: its failure undoes only its own work, and nothing is committed
+    # until the outermost block exits.
+    def __init__(self, pool, conn, readonly, depth=1):
+        self._pool = pool
+        self._conn = conn
+        self.readonly = readonly
+        self._savepoint = f"pool_{depth}" if depth > 1 else None
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a connection returned to the pool.")
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        if self._savepoint is not None and self._conn is not None:
+            if not self._conn.in_transaction:
+                self._conn.execute("BEGIN")  # else releasing the savepoint would commit
+            self._conn.execute(f"SAVEPOINT {self._savepoint}")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self._conn is None:
+                pass
+            elif self._savepoint is not None:
+                if self._conn.in_transaction:
+                    if exc_type is not None:
+                        self._conn.execute(f"ROLLBACK TO {self._savepoint}")
+                    self._conn.execute(f"RELEASE {self._savepoint}")
+            elif exc_type is None:
+                self._conn.commit()
+            else:
+                self._conn.rollback()
+        finally:
+            self.close()
+        return False
+
+    def close(self):
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        self._pool._release(conn, self.readonly)
+
+
+class ConnectionPool:
+    # One writer connection serialised by a re-entrant lock and up to `readers`
+    # read-only connections, all opened lazily and reused for the life of the pool.
+    def __init__(self, path=DB_FILE, readers=READER_COUNT):
+        self.path = path
+        self._writer = None
+        self._writerLock = threading.RLock()
+        self._writerDepth = 0
+        self._writerChanges = 0
+        self._dataVersion = None
+        self._readers = queue.LifoQueue()
+        self._readerSlots = threading.BoundedSemaphore(readers)
+        self._allReaders = []
+
+    def writer(self):
+        if self._writerLock.acquire(blocking=False):
+            metrics.DB_LOCK_WAIT_SECONDS.labels("pool").observe(0.0)
+        else:
+            started = time.perf_counter()
+            self._writerLock.acquire()
+            metrics.DB_LOCK_WAIT_SECONDS.labels("pool").observe(time.perf_counter() - started)
+        try:
+            if self._writer is None:
+                self._writer = open_connection(self.path)
+        except Exception:
+            self._writerLock.release()
+            raise
+        self._writerDepth += 1
+        return PooledConnection(self, self._writer, False, self._writerDepth)
+
+    def reader(self):
+        self._readerSlots.acquire()
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            try:
+                conn = open_connection(self.path, readonly=True)
+            except Exception:
+                self._readerSlots.release()
+                raise
+            self._allReaders.append(conn)
+        return PooledConnection(self, conn, True)
+
+    def _release(self, conn, readonly):
+        if readonly:
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+            self._readerSlots.release()
+            return
+        self._writerDepth -= 1
+        try:
+            if self._writerDepth == 0:
+                # Like closing a plain connection, anything left uncommitted is discarded
+                committed = not conn.in_transaction
+                if not committed:
+                    conn.rollback()
+                changed = conn.total_changes != self._writerChanges
+                self._writerChanges = conn.total_changes
+                changes.flush(committed, changed)
+        finally:
+            self._writerLock.release()
+
+    def externalChanges(self):
+        # PRAGMA data_version on the writer only moves when another connection commits, and
+        # every in-process write goes through the writer, so a change means another process
+        if not self._writerLock.acquire(blocking=False):
+            return False  # we are writing right now; check again on the next poll
+        try:
+            if self._writer is None:
+                self._writer = open_connection(self.path)
+            version = self._writer.execute("PRAGMA data_version").fetchone()[0]
+            changed = self._dataVersion is not None and version != self._dataVersion
+            self._dataVersion = version
+            return changed
+        finally:
+            self._writerLock.release()
+
+    def close(self):
+        with self._writerLock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        for conn in self._allReaders:
+            conn.close()
+        self._allReaders = []
+        self._readers = queue.LifoQueue()
+
+
+_pool = None
+_poolLock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _poolLock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_FILE)
+    return _pool
+
+
+def get_connection(readonly=False):
+    if _remote is not None:
+        raise RemoteOnly("There is no local database in client mode; use a registered operation.")
+    pool = get_pool()
+    return pool.reader() if readonly else pool.writer()
+
+
+def close_pool():
+    global _pool
+    with _poolLock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+# -------------------- Client Mode --------------------
+# With a POS server configured (see pos_client.py) there is no local database file: run()
+# executes the server's registered operations on the server in a single round trip, and
+# get_connection() or any other operation raises RemoteOnly.
+_remote = None
+
+
+class RemoteOnly(RuntimeError):
+    pass
+
+
+def set_remote(client):
+    global _remote
+    _remote = client
+
+
+def get_remote():
+    return _remote
+
+
+def run(fn, *args, readonly=False, **kwargs):
+    # fn(conn, *args, **kwargs) as one unit of work, committed on success
+    if _remote is not None:
+        if not _remote.serves(fn):
+            raise RemoteOnly(f"{fn.__module__}.{fn.__name__} is not available on a client station.")
+        result = _remote.call(fn, *args, **kwargs)
+        if not readonly:
+            changes.poll_external()  # publish what the call changed without waiting for the timer
+        return result
+    with get_connection(readonly) as conn:
+        return fn(conn, *args, **kwargs)
@@ -0,0 +1,331 @@
+import bisect, datetime, random, time
+from itertools import accumulate
+
+import changes
+import powerbi_export
+import search
+import stock
+import summary
+
+# -------------------- Synthetic Data --------------------
+# Fills the schema with a reproducible dataset of any size for load and performance
+# testing: the same seed and volumes always give the same rows. Sales are skewed the way
+# real ones are: product and customer popularity follow a Zipf distribution, and invoice
+# dates follow the season, the day of the week and a growth trend.
+#
+# Rows are written with executemany() in large transactions. Derived data (summary
+# tables, full-text indexes, the stock ledger) and secondary indexes are not maintained
+# per row during the load; their triggers and indexes are dropped and rebuilt once at the
+# end.
+
+# name -> {table: rows}; "items" is the number of invoice lines
+SCALES = {
+    "small": {"categories": 20, "suppliers": 50, "products": 5000, "customers": 2000, "users": 10,
+              "invoices": 20000, "items": 100000},
+    "medium": {"categories": 100, "suppliers": 500, "products": 100000, "customers": 50000, "users": 50,
+               "invoices": 1000000, "items": 5000000},
+    "large": {"categories": 500, "suppliers": 5000, "products": 1000000, "customers": 1000000, "users": 200,
+              "invoices": 10000000, "items": 50000000},
+}
+DEFAULT_START = "2024-01-01"
+DEFAULT_END = "2025-12-31"
+BATCH_SIZE = 50000
+PRODUCT_SKEW = 1.1  # Zipf exponent of product popularity
+CUSTOMER_SKEW = 0.8
+PENDING_SHARE = 0.08
+LOADED_TABLES = ("Categories", "Suppliers", "Products", "Customers", "Users", "Invoices", "Invoice_Items",
+                 "Stock_Logs")
+
+# Relative sales per month (January first), per weekday (Monday first), and over the whole range
+MONTH_WEIGHTS = (0.8, 0.75, 0.9, 0.95, 1.0, 0.95, 0.9, 0.95, 1.0, 1.05, 1.25, 1.6)
+WEEKDAY_WEIGHTS = (0.85, 0.85, 0.9, 0.95, 1.15, 1.35, 1.0)
+GROWTH = 0.3
+OPENING_HOURS = (8, 22)
+
+BRANDS = ("Acme", "Northwind", "Contoso", "Fabrikam", "Globex", "Initech", "Umbrella", "Hooli", "Vandelay",
+          "Stark", "Wayne", "Tyrell", "Soylent", "Wonka", "Oceanic", "Aperture")
+ADJECTIVES = ("Organic", "Classic", "Premium", "Fresh", "Light", "Extra", "Original", "Spicy", "Smoked", "Whole",
+              "Natural", "Deluxe", "Mini", "Family", "Crunchy", "Sweet", "Roasted", "Wild", "Golden", "Pure")
+NOUNS = ("Coffee", "Tea", "Rice", "Pasta", "Flour", "Sugar", "Milk", "Butter", "Cheese", "Yogurt", "Bread",
+         "Cereal", "Juice", "Water", "Soap", "Shampoo", "Detergent", "Chocolate", "Biscuits", "Chips", "Honey",
+         "Olive Oil", "Beans", "Tuna", "Salt", "Pepper", "Jam", "Noodles", "Candles", "Batteries")
+SIZES = ("100g", "250g", "500g", "1kg", "2kg", "250ml", "500ml", "1l", "2l", "6 pack", "12 pack")
+FIRST_NAMES = ("James", "Mary", "Ahmed", "Fatima", "Wei", "Yuki", "Carlos", "Sofia", "Olga", "Ivan", "Priya",
+               "Arjun", "Amara", "Kwame", "Lucas", "Emma", "Noah", "Aisha", "Omar", "Hana", "Mateo", "Chloe",
+               "Ali", "Sara", "Daniel", "Zara", "Leon", "Mia", "Hassan", "Nina")
+LAST_NAMES = ("Smith", "Khan", "Garcia", "Chen", "Tanaka", "Silva", "Ivanova", "Patel", "Okafor", "Muller",
+              "Rossi", "Nguyen", "Kim", "Ali", "Johnson", "Lopez", "Brown", "Haddad", "Novak", "Cohen",
+              "Sato", "Jones", "Costa", "Singh", "Ahmed", "Martin", "Dubois", "Kowalski", "Mensah", "Yilmaz")
+CITIES = ("Springfield", "Riverside", "Fairview", "Greenville", "Madison", "Georgetown", "Franklin", "Clinton",
+          "Salem", "Bristol", "Lakeside", "Oakland")
+STREETS = ("Main", "Oak", "Pine", "Maple", "Cedar", "Elm", "Lake", "Hill", "Park", "Church", "Mill", "River")
+CATEGORY_NAMES = ("Beverages", "Dairy", "Bakery", "Produce", "Frozen", "Snacks", "Household", "Personal Care",
+                  "Pantry", "Meat", "Seafood", "Baby", "Pet", "Electronics", "Stationery", "Health")
+
+
+class ZipfSampler:
+    # Draws from `values` with the k-th most popular drawn in proportion to 1 / k**skew.
+    # Popularity rank is shuffled against the values, so popular rows are spread over the id range.
+    def __init__(self, rng, values, skew):
+        self.values = list(values)
+        rng.shuffle(self.values)
+        self.cumulative = list(accumulate(1.0 / rank ** skew for rank in range(1, len(self.values) + 1)))
+        self.total = self.cumulative[-1]
+        self.random = rng.random
+
+    def __call__(self):
+        return self.values[bisect.bisect(self.cumulative, self.random() * self.total)]
+
+
+def _next_id(conn, table, key):
+    return conn.execute(f"SELECT COALESCE(MAX({key}), 0) + 1 FROM {table}").fetchone()[0]
+
+
+def _barcode(productId):
+    # A bijection of the id onto 48 bits: unique, but not sequential like the ids
+    return f"BC-{(productId * 0x9E3779B97F4B) % (1 << 48):012x}"
+
+
+def _timestamp(day, seconds):
+    return f"{day.isoformat()} {seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def day_counts(rng, start, end, total):
+    # -> [(date, invoices)] for each day from start to end, summing to `total`
+    days = [start + datetime.timedelta(n) for n in range((end - start).days + 1)]
+    weights = [MONTH_WEIGHTS[d.month - 1] * WEEKDAY_WEIGHTS[d.weekday()] * (1 + GROWTH * i / max(1, len(days) - 1))
+               * rng.uniform(0.85, 1.15) for i, d in enumerate(days)]
+    scale = total / sum(weights)
+    counts, placed = [], 0
+    for day, cumulative in zip(days, accumulate(weights)):
+        upTo = min(total, round(cumulative * scale))
+        counts.append((day, upTo - placed))
+        placed = upTo
+    return counts
+
+
+class _Loader:
+    # Buffers rows per table and writes each buffer with one executemany() per transaction
+    def __init__(self, conn, progress):
+        self.conn = conn
+        self.progress = progress
+        self.counts = {}
+        self._buffers = {}
+
+    def add(self, table, columns, row):
+        buffer = self._buffers.setdefault((table, columns), [])
+        buffer.append(row)
+        if len(buffer) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not any(self._buffers.values()):
+            return
+        self.conn.execute("BEGIN")
+        try:
+            for (table, columns), rows in self._buffers.items():
+                if rows:
+                    self.conn.executemany(f"INSERT INTO {table} ({', '.join(columns)}) "
+                                          f"VALUES ({', '.join('?' * len(columns))})", rows)
+                    self.counts[table] = self.counts.get(table, 0) + len(rows)
+                    rows.clear()
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        if self.progress is not None:
+            self.progress(", ".join(f"{table} {count:,}" for table, count in self.counts.items()))
+
+
+def _drop_indexes(conn, tables):
+    # -> CREATE statements of the dropped secondary indexes, to run again after the load
+    rows = conn.execute(f"""
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'index' AND sql IS NOT NULL AND tbl_name IN ({', '.join('?' * len(tables))})
+    """, tables).fetchall()
+    for name, _ in rows:
+        conn.execute(f"DROP INDEX {name}")
+    return [sql for _, sql in rows]
+
+
+def _drop_triggers(conn):
+    summary.drop_triggers(conn)
+    stock.drop_ledger_trigger(conn)
+    powerbi_export.drop_tracking_triggers(conn)
+    for table in search.FTS_TABLES:
+        search.drop_triggers(conn, table)
+
+
+def _create_triggers(conn):
+    summary.create_triggers(conn)
+    stock.create_ledger_trigger(conn)
+    powerbi_export.create_tracking_triggers(conn)
+    for table in search.FTS_TABLES:
+        if search.has_index(conn, table):
+            search.create_triggers(conn, table)
+
+
+def _write_ledger(conn, firstProduct, firstInvoice):
+    # Each generated product opens with the stock it has now plus everything sold since,
+    # and every sale is a ledger row at the invoice's time, so the ledger adds up to stock
+    conn.execute("""
+        INSERT INTO Stock_Logs (product_id, change_type, quantity, created_at)
+        SELECT p.product_id, 'Addition', p.stock_quantity + COALESCE(s.sold, 0), p.created_at
+        FROM Products p LEFT JOIN (
+            SELECT i.product_id, SUM(i.quantity) AS sold FROM Invoice_Items i
+            WHERE i.invoice_id >= ? GROUP BY i.product_id
+        ) s ON s.product_id = p.product_id
+        WHERE p.product_id >= ? AND p.stock_quantity + COALESCE(s.sold, 0) <> 0
+    """, (firstInvoice, firstProduct))
+    conn.execute("""
+        INSERT INTO Stock_Logs (product_id, change_type, quantity, invoice_id, created_at)
+        SELECT i.product_id, 'Sale', -i.quantity, i.invoice_id, v.created_at
+        FROM Invoice_Items i JOIN Invoices v ON v.invoice_id = i.invoice_id
+        WHERE i.invoice_id >= ? ORDER BY i.invoice_id
+    """, (firstInvoice,))
+
+
+def generate(conn, volumes, seed=1, start=DEFAULT_START, end=DEFAULT_END, progress=None):
+    # Appends the requested number of rows to each table; returns {table: rows written}.
+    # progress(message) is called after every batch and at the start of each phase.
+    volumes = {**SCALES["small"], **volumes}
+    start, end = datetime.date.fromisoformat(start), datetime.date.fromisoformat(end)
+    if end < start:
+        raise ValueError("The end date is before the start date.")
+    for table in ("categories", "suppliers", "products", "customers", "users"):
+        if volumes[table] < 1:
+            raise ValueError(f"At least one row of {table} is needed.")
+    if volumes["items"] < volumes["invoices"]:
+        raise ValueError("Every invoice needs at least one line.")
+    say = progress or (lambda message: None)
+    started = time.perf_counter()
+    conn.commit()
+    first = {table: _next_id(conn, table, key) for table, key in (
+        ("Categories", "category_id"), ("Suppliers", "supplier_id"), ("Products", "product_id"),
+        ("Customers", "customer_id"), ("Users", "user_id"), ("Invoices", "invoice_id"),
+        ("Invoice_Items", "item_id"))}
+    taken = {name for (name,) in conn.execute("SELECT category_name FROM Categories")}
+    stamp = conn.execute(f"SELECT {powerbi_export.NOW}").fetchone()[0]  # updated_at of the generated rows
+    # The generated rows are consistent by construction, so foreign keys are not checked per row
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA foreign_keys = OFF")
+    conn.execute("BEGIN IMMEDIATE")
+    _drop_triggers(conn)
+    indexes = _drop_indexes(conn, LOADED_TABLES)
+    conn.commit()
+    loader = _Loader(conn, progress)
+    try:
+        _generate_rows(loader, volumes, seed, start, end, first, taken, stamp)
+        loader.flush()
+        say("Writing the stock ledger")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _write_ledger(conn, first["Products"], first["Invoices"])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        say("Rebuilding indexes, triggers and summary tables")
+        conn.execute("BEGIN IMMEDIATE")
+        for sql in indexes:
+            conn.execute(sql)
+        _create_triggers(conn)
+        search.rebuild(conn)
+        summary.rebuild(conn)
+        conn.commit()
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA analysis_limit = 1000")
+    conn.execute("ANALYZE")
+    for table in LOADED_TABLES:
+        changes.record(table)
+    say(f"Generated in {time.perf_counter() - started:.1f}s")
+    return loader.counts
+
+
+def _generate_rows(loader, volumes, seed, start, end, first, taken=(), stamp=None):
+    def rng(part):
+        # One stream per table, so changing one volume leaves the other tables' rows alone
+        return random.Random(f"{seed}:{part}")
+
+    r = rng("categories")
+    categoryIds = range(first["Categories"], first["Categories"] + volumes["categories"])
+    for n, categoryId in enumerate(categoryIds):
+        # Names already in the database, and repeats past the list, get the (new) id appended
+        name = CATEGORY_NAMES[n % len(CATEGORY_NAMES)]
+        if n >= len(CATEGORY_NAMES) or name in taken:
+            name = f"{name} {categoryId}"
+        loader.add("Categories", ("category_id", "category_name"), (categoryId, name))
+
+    r = rng("suppliers")
+    supplierIds = range(first["Suppliers"], first["Suppliers"] + volumes["suppliers"])
+    for supplierId in supplierIds:
+        contact = f"{r.choice(FIRST_NAMES)} {r.choice(LAST_NAMES)}"
+        loader.add("Suppliers", ("supplier_id", "name", "contact_name", "contact_email", "phone_number"),
+                   (supplierId, f"{r.choice(BRANDS)} {r.choice(('Trading', 'Foods', 'Supply', 'Wholesale'))} {supplierId}",
+                    contact, f"{contact.replace(' ', '.').lower()}.{supplierId}@supplier.example",
+                    f"+1-555-{r.randrange(10000000):07d}"))
+
+    r = rng("products")
+    productIds = range(first["Products"], first["Products"] + volumes["products"])
+    prices = {}
+    for productId in productIds:
+        price = round(min(2000.0, r.lognormvariate(1.6, 0.9)), 2) or 0.5
+        prices[productId] = price
+        created = start - datetime.timedelta(r.randrange(1, 366))
+        loader.add("Products", ("product_id", "name", "category_id", "supplier_id", "price", "stock_quantity",
+                                "barcode", "created_at"),
+                   (productId, f"{r.choice(BRANDS)} {r.choice(ADJECTIVES)} {r.choice(NOUNS)} {r.choice(SIZES)}",
+                    r.choice(categoryIds), r.choice(supplierIds), price, r.randrange(0, 500), _barcode(productId),
+                    _timestamp(created, r.randrange(86400))))
+
+    r = rng("customers")
+    customerIds = range(first["Customers"], first["Customers"] + volumes["customers"])
+    for customerId in customerIds:
+        firstName, lastName = r.choice(FIRST_NAMES), r.choice(LAST_NAMES)
+        loader.add("Customers", ("customer_id", "name", "email", "phone_number", "address"),
+                   (customerId, f"{firstName} {lastName}", f"{firstName}.{lastName}.{customerId}@example.com".lower(),
+                    f"+1-555-{r.randrange(10000000):07d}",
+                    f"{r.randrange(1, 9999)} {r.choice(STREETS)} St, {r.choice(CITIES)}"))
+
+    userIds = range(first["Users"], first["Users"] + volumes["users"])
+    for n, userId in enumerate(userIds):
+        loader.add("Users", ("user_id", "username", "password_hash", "role"),
+                   (userId, f"cashier{userId}" if n else f"admin{userId}", "password", "cashier" if n else "admin"))
+
+    r = rng("invoices")
+    pickProduct = ZipfSampler(r, productIds, PRODUCT_SKEW)
+    pickCustomer = ZipfSampler(r, customerIds, CUSTOMER_SKEW)
+    cashiers = list(userIds[1:]) or list(userIds)
+    opening, closing = OPENING_HOURS[0] * 3600, OPENING_HOURS[1] * 3600
+    invoiceId, itemId = first["Invoices"], first["Invoice_Items"]
+    invoicesLeft, linesLeft = volumes["invoices"], volumes["items"]
+    for day, count in day_counts(r, start, end, volumes["invoices"]):
+        for seconds in sorted(r.randrange(opening, closing) for _ in range(count)):
+            # Line counts average whatever is left per invoice left, so the total comes out exact
+            mean = linesLeft / invoicesLeft
+            lines = 1 + int(r.expovariate(1 / (mean - 1))) if mean > 1 else 1
+            lines = linesLeft if invoicesLeft == 1 else min(lines, linesLeft - (invoicesLeft - 1))
+            lines = max(1, min(lines, len(productIds)))  # lines of an invoice are distinct products
+            invoicesLeft -= 1
+            linesLeft -= lines
+            chosen = set()
+            while len(chosen) < lines:
+                productId = pickProduct()
+                if productId in chosen:
+                    productId = productIds[r.randrange(len(productIds))]
+                chosen.add(productId)
+            items = [(productId, 1 if r.random() < 0.7 else r.randint(2, 6)) for productId in chosen]
+            total = sum(quantity * prices[productId] for productId, quantity in items)
+            loader.add("Invoices", ("invoice_id", "customer_id", "user_id", "total_amount", "payment_status",
+                                    "created_at", "updated_at"),
+                       (invoiceId, pickCustomer(), r.choice(cashiers), round(total, 2),
+                        "pending" if r.random() < PENDING_SHARE else "paid", _timestamp(day, seconds),
+                        stamp))
+            for productId, quantity in items:
+                loader.add("Invoice_Items", ("item_id", "invoice_id", "product_id", "quantity", "price_per_item",
+                                             "updated_at"),
+                           (itemId, invoiceId, productId, quantity, prices[productId], stamp))
+                itemId += 1
+            invoiceId += 1
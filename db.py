@@ -1,107 +1,39 @@
-import sys, os, uuid, sqlite3, datetime
-import barcode
-from barcode.writer import ImageWriter
+import sys, os, datetime, argparse, bisect, time
+from collections import OrderedDict
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QTabWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QTableView, QMessageBox, QDialog, QFormLayout, QLineEdit,
-    QComboBox, QDialogButtonBox, QTableWidget, QTableWidgetItem, QLabel, QHeaderView, 
-    QSizePolicy
+    QComboBox, QDialogButtonBox, QLabel, QHeaderView, QAbstractItemView,
+    QSizePolicy, QFileDialog, QDateEdit, QProgressDialog, QCompleter, QShortcut
 )
-from PyQt5.QtCore import Qt, QAbstractTableModel, QVariant
-from PyQt5.QtGui import QPixmap, QFont
+from PyQt5.QtCore import (Qt, QAbstractTableModel, QAbstractListModel, QModelIndex, QObject, QTimer, QVariant, QDate,
+                          pyqtSignal)
+from PyQt5.QtGui import QPixmap, QFont, QKeySequence
 import qdarkstyle
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.units import mm
 
-# -------------------- SQLite Database Initialization --------------------
-DB_FILE = "inventory_billing.db"
+from connection import close_pool, run
+from migrations import migrate
+import search
+import queries
+import query_builder
+from query_builder import TableQuery
+import importer
+import pdf_export
+import summary
+import stock
+import changes
+import metrics
+import sql_trace
+from product_index import ProductEntry, get_index
+from workers import get_executor
+from barcode_service import new_barcode_code
+from barcode_render import render_qimage
 
+# -------------------- SQLite Database Initialization --------------------
 def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("PRAGMA foreign_keys = ON")
-    cursor.executescript("""
-    CREATE TABLE IF NOT EXISTS Categories (
-        category_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        category_name TEXT UNIQUE NOT NULL
-    );
-    CREATE TABLE IF NOT EXISTS Suppliers (
-        supplier_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        contact_name TEXT,
-        contact_email TEXT,
-        phone_number TEXT
-    );
-    CREATE TABLE IF NOT EXISTS Products (
-        product_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        category_id INTEGER,
-        supplier_id INTEGER,
-        price REAL NOT NULL,
-        stock_quantity INTEGER NOT NULL,
-        barcode TEXT UNIQUE,
-        created_at TEXT DEFAULT (datetime('now')),
-        FOREIGN KEY (category_id) REFERENCES Categories(category_id) ON DELETE SET NULL,
-        FOREIGN KEY (supplier_id) REFERENCES Suppliers(supplier_id) ON DELETE SET NULL
-    );
-    CREATE TABLE IF NOT EXISTS Customers (
-        customer_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        email TEXT UNIQUE,
-        phone_number TEXT,
-        address TEXT
-    );
-    CREATE TABLE IF NOT EXISTS Users (
-        user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE NOT NULL,
-        password_hash TEXT,
-        role TEXT CHECK(role IN ('admin', 'cashier')) NOT NULL
-    );
-    CREATE TABLE IF NOT EXISTS Invoices (
-        invoice_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        customer_id INTEGER,
-        user_id INTEGER,
-        total_amount REAL NOT NULL,
-        payment_status TEXT CHECK(payment_status IN ('paid','pending')) NOT NULL,
-        created_at TEXT DEFAULT (datetime('now')),
-        FOREIGN KEY (customer_id) REFERENCES Customers(customer_id) ON DELETE SET NULL,
-        FOREIGN KEY (user_id) REFERENCES Users(user_id) ON DELETE SET NULL
-    );
-    CREATE TABLE IF NOT EXISTS Invoice_Items (
-        item_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        invoice_id INTEGER,
-        product_id INTEGER,
-        quantity INTEGER NOT NULL,
-        price_per_item REAL NOT NULL,
-        FOREIGN KEY (invoice_id) REFERENCES Invoices(invoice_id) ON DELETE CASCADE,
-        FOREIGN KEY (product_id) REFERENCES Products(product_id) ON DELETE SET NULL
-    );
-    """)
-    conn.commit()
-    conn.close()
-
-def get_connection():
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON")
-    return conn
-
-init_db()
-
-# -------------------- Barcode Image Generation --------------------
-def generate_barcode_image(data):
-    if not os.path.exists("barcodes"):
-        os.makedirs("barcodes")
-    filename = f"barcodes/{data}"
-    Code128 = barcode.get_barcode_class('code128')
-    my_code = Code128(data, writer=ImageWriter())
-    full_filename = my_code.save(filename)
-    return full_filename
+    run(migrate)
 
 # -------------------- PDF Generation --------------------
 def export_invoice_to_pdf(invoice_id, invoiceData, invoiceItems):
@@ -140,8 +72,67 @@ def export_invoice_to_pdf(invoice_id, invoiceData, invoiceItems):
     c.save()
     return pdf_file
 
+# -------------------- Barcode Pixmap Cache --------------------
+class PixmapCache:
+    # Bounded LRU of barcode pixmaps drawn from the stored code value, so scrolling never
+    # touches the disk; eviction keeps the total pixel memory under maxBytes.
+    def __init__(self, maxBytes=16 * 1024 * 1024, width=200, height=50):
+        self.maxBytes = maxBytes
+        self.width = width
+        self.height = height
+        self.hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._entries = OrderedDict()  # code -> (pixmap, cost)
+
+    def get(self, code):
+        entry = self._entries.get(code)
+        if entry is not None:
+            self._entries.move_to_end(code)
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        try:
+            with metrics.BARCODE_RENDER_SECONDS.labels("pixmap").time():
+                pixmap = QPixmap.fromImage(render_qimage(code, self.width, self.height))
+        except Exception:
+            return None
+        self._insert(code, pixmap)
+        return pixmap
+
+    def _insert(self, key, pixmap):
+        cost = pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+        if cost > self.maxBytes:
+            return
+        self._entries[key] = (pixmap, cost)
+        self._bytes += cost
+        self._evict()
+
+    def _remove(self, key):
+        pixmap, cost = self._entries.pop(key)
+        self._bytes -= cost
+
+    def _evict(self):
+        while self._bytes > self.maxBytes and self._entries:
+            self._remove(next(iter(self._entries)))
+
+    def setMaxBytes(self, maxBytes):
+        self.maxBytes = maxBytes
+        self._evict()
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self):
+        return {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.maxBytes,
+                "hits": self.hits, "misses": self.misses}
+
 # -------------------- Custom Table Model --------------------
 class TableModel(QAbstractTableModel):
+    # Shared by every table so a barcode drawn once is reused by all views
+    pixmapCache = PixmapCache()
+
     def __init__(self, data, headers, parent=None):
         super(TableModel, self).__init__(parent)
         self._data = data
@@ -163,11 +154,13 @@ class TableModel(QAbstractTableModel):
             if header.lower() == "barcode":
                 return ""
             return str(value)
+        if role == Qt.ToolTipRole and header.lower() == "barcode":
+            return value
         if role == Qt.DecorationRole:
             if header.lower() == "barcode" and value:
-                pixmap = QPixmap(value)
-                if not pixmap.isNull():
-                    return pixmap.scaled(200, 50, Qt.KeepAspectRatioByExpanding)
+                pixmap = self.pixmapCache.get(value)
+                if pixmap is not None:
+                    return pixmap
         if role == Qt.TextAlignmentRole:
             return Qt.AlignCenter
         return QVariant()
@@ -187,6 +180,256 @@ class TableModel(QAbstractTableModel):
             return dict(self._data[row])
         return None
 
+# -------------------- Paged Table Model --------------------
+class PagedTableModel(TableModel):
+    # Pulls the rows of a TableQuery (filters and sort order, applied in SQL) in keyset
+    # pages as the view scrolls, so opening a tab never loads the whole table. Change
+    # notifications are applied row by row (applyChanges), so the view keeps its scroll
+    # position and selection when records are added, edited or deleted.
+    def __init__(self, query, headers, pageSize=queries.PAGE_SIZE, rows=None, parent=None):
+        super(PagedTableModel, self).__init__([], headers, parent)
+        self._query = query
+        self._table = query.table
+        self._key = query.key
+        self._pageSize = pageSize
+        self._cursor = None  # position of the last loaded row
+        self._lastOrder = None
+        self._exhausted = False
+        self._rowOf = {}  # primary key -> row number
+        self._queuedKeys = set()
+        self._queuedAll = False
+        self._refreshing = False
+        # The first page may already have been fetched on a worker thread
+        self._data.extend(self._fetchPage() if rows is None else self._track(rows))
+        self._indexRows()
+
+    def _fetchPage(self):
+        rows = run(query_builder.fetch_page, self._query.spec(), self._cursor, self._pageSize, readonly=True)
+        return self._track(rows)
+
+    def _track(self, rows):
+        if len(rows) < self._pageSize:
+            self._exhausted = True
+        if rows:
+            self._cursor = self._query.cursor(rows[-1])
+            self._lastOrder = self._query.orderKey(rows[-1])
+        return rows
+
+    def query(self):
+        return self._query
+
+    def _indexRows(self, first=0):
+        key = self._key
+        if first == 0:
+            self._rowOf = {}
+        for i in range(first, len(self._data)):
+            self._rowOf[self._data[i][key]] = i
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted:
+            return
+        try:
+            rows = self._fetchPage()
+        except Exception as e:
+            # Qt aborts on exceptions raised from virtual overrides; stop paging instead
+            self._exhausted = True
+            print(f"Fetching {self._table} rows failed: {e}", file=sys.stderr)
+            return
+        if not rows:
+            return
+        first = len(self._data)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._data.extend(rows)
+        self.endInsertRows()
+        self._indexRows(first)
+
+    # ---------- change notifications ----------
+    def applyChanges(self, keys):
+        # keys: primary keys changed in this table, or None if any row may have changed.
+        # One re-read runs at a time; changes arriving meanwhile are merged into the next.
+        if keys is None:
+            self._queuedAll = True
+        else:
+            self._queuedKeys.update(keys)
+        if not self._refreshing:
+            self._rereadChanged()
+
+    def _rereadChanged(self):
+        if self._queuedAll:
+            keys, covered = None, None
+        else:
+            keys, covered = sorted(self._queuedKeys), set(self._queuedKeys)
+        upTo = None if self._exhausted else self._cursor
+        self._queuedKeys, self._queuedAll = set(), False
+        self._refreshing = True
+        get_executor().submit(query_builder.fetch_rows, self._query.spec(), keys, upTo,
+                              onResult=lambda rows: self._applyRows(covered, rows), onError=self._rereadFailed)
+
+    def _rereadFailed(self, error):
+        self._refreshing = False
+        print(f"Refreshing {self._table} rows failed: {error}", file=sys.stderr)
+
+    def _applyRows(self, covered, rows):
+        self._refreshing = False
+        key, order = self._key, self._query.orderKey
+        fetched = {row[key]: row for row in rows}
+        if covered is None:
+            covered = set(self._rowOf) | set(fetched)
+        # Rows that were deleted, no longer match the filters, or moved in the sort order
+        # come out first; bottom up, so the row numbers still to be removed stay valid
+        gone = sorted((self._rowOf[k] for k in covered if k in self._rowOf and
+                       (k not in fetched or order(fetched[k]) != order(self._data[self._rowOf[k]]))), reverse=True)
+        for i in gone:
+            self.beginRemoveRows(QModelIndex(), i, i)
+            del self._data[i]
+            self.endRemoveRows()
+        if gone:
+            self._indexRows()
+        inserts = []
+        last = self.columnCount() - 1
+        for k, row in fetched.items():
+            i = self._rowOf.get(k)
+            if i is None:
+                inserts.append(row)
+            elif tuple(row) != tuple(self._data[i]):
+                self._data[i] = row
+                self.dataChanged.emit(self.index(i, 0), self.index(i, last))
+        if inserts:
+            loaded = [order(row) for row in self._data]
+            for row in sorted(inserts, key=order):
+                # Rows past the last loaded page arrive with the page that contains them
+                if not self._exhausted and (self._lastOrder is None or order(row) > self._lastOrder):
+                    continue
+                i = bisect.bisect_left(loaded, order(row))
+                self.beginInsertRows(QModelIndex(), i, i)
+                self._data.insert(i, row)
+                loaded.insert(i, order(row))
+                self.endInsertRows()
+            self._indexRows()
+        if self._queuedKeys or self._queuedAll:
+            self._rereadChanged()
+
+# -------------------- Change Relay --------------------
+class ChangeRelay(QObject):
+    # The change bus calls subscribers on whichever thread committed; this re-emits the
+    # notifications as a signal, which Qt delivers on the GUI thread
+    changed = pyqtSignal(object, object)
+
+    def __init__(self, parent=None):
+        super(ChangeRelay, self).__init__(parent)
+        changes.subscribe(self._relay)
+
+    def _relay(self, table, keys, origin):
+        self.changed.emit(table, keys)
+
+    def close(self):
+        changes.unsubscribe(self._relay)
+
+# -------------------- Record Picker --------------------
+# How each kind of record is described in the picker's drop-down
+PICKER_LABELS = {
+    "products": lambda r: f'{r["label"]} (${r["price"]:.2f}, {r["stock_quantity"]} in stock)',
+    "customers": lambda r: f'{r["label"]} ({r["phone_number"]})' if r["phone_number"] else r["label"],
+    "users": lambda r: f'{r["label"]} ({r["role"]})',
+}
+
+
+class PickerModel(QAbstractListModel):
+    # Holds one page of candidates; the query does the filtering, not the model
+    def __init__(self, describe, parent=None):
+        super(PickerModel, self).__init__(parent)
+        self._rows = []
+        self._describe = describe
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return QVariant()
+        row = self._rows[index.row()]
+        if role == Qt.DisplayRole:
+            return self._describe(row)
+        if role == Qt.EditRole:
+            return row["label"]
+        if role == Qt.UserRole:
+            return row
+        return QVariant()
+
+    def setRows(self, rows):
+        self.beginResetModel()
+        self._rows = list(rows)
+        self.endResetModel()
+
+
+class RecordPicker(QLineEdit):
+    # Type-ahead replacement for a combo box of every record: each pause in typing runs
+    # queries.pick() on a worker and the completer shows the page it returns.
+    recordChanged = pyqtSignal(object)
+
+    def __init__(self, kind, parent=None):
+        super(RecordPicker, self).__init__(parent)
+        self._kind = kind
+        self._record = None
+        self._model = PickerModel(PICKER_LABELS[kind], self)
+        completer = QCompleter(self._model, self)
+        completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        completer.setCompletionRole(Qt.EditRole)
+        completer.setMaxVisibleItems(12)
+        completer.activated[QModelIndex].connect(self._choose)
+        self.setCompleter(completer)
+        self.setPlaceholderText("Type to search")
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(150)
+        self._timer.timeout.connect(self._lookup)
+        self.textEdited.connect(self._edited)
+
+    def _edited(self, text):
+        if self._record is not None:
+            self._record = None
+            self.recordChanged.emit(None)
+        self._timer.start()
+
+    def _lookup(self):
+        get_executor().submit(queries.pick, self._kind, self.text(), key=id(self), onResult=self._showCandidates,
+                              onError=lambda e: print(f"Looking up {self._kind} failed: {e}", file=sys.stderr))
+
+    def _showCandidates(self, rows):
+        self._model.setRows(rows)
+        if rows and self.hasFocus():
+            self.completer().complete()
+
+    def _choose(self, index):
+        self._setRecord(index.data(Qt.UserRole))
+
+    def _setRecord(self, record):
+        self._record = record
+        self.setText(record["label"] if record is not None else "")
+        self.recordChanged.emit(record)
+
+    def focusInEvent(self, event):
+        super(RecordPicker, self).focusInEvent(event)
+        if self._record is None:
+            self._timer.start()  # offer the first page without waiting for a keystroke
+
+    def setRecordId(self, recordId):
+        record = None
+        if recordId is not None:
+            record = run(queries.pick_record, self._kind, recordId, readonly=True)
+        self._setRecord(record)
+
+    def currentRecord(self):
+        return self._record
+
+    def currentData(self):
+        return self._record["id"] if self._record is not None else None
+
 # -------------------- Add Category Dialog --------------------
 class AddCategoryDialog(QDialog):
     def __init__(self, parent=None):
@@ -207,11 +450,7 @@ class AddCategoryDialog(QDialog):
 
     def addCategory(self):
         try:
-            conn = get_connection()
-            cur = conn.cursor()
-            cur.execute("INSERT INTO Categories (category_name) VALUES (?)", (self.nameEdit.text(),))
-            conn.commit()
-            conn.close()
+            run(queries.insert_record, "Categories", {"category_name": self.nameEdit.text()})
             QMessageBox.information(self, "Success", "Category added!")
             self.accept()
         except Exception as e:
@@ -240,11 +479,8 @@ class EditCategoryDialog(QDialog):
 
     def updateCategory(self):
         try:
-            conn = get_connection()
-            cur = conn.cursor()
-            cur.execute("UPDATE Categories SET category_name = ? WHERE category_id = ?", (self.nameEdit.text(), self.categoryData.get("category_id")))
-            conn.commit()
-            conn.close()
+            run(queries.update_record, "Categories", self.categoryData.get("category_id"),
+                {"category_name": self.nameEdit.text()})
             QMessageBox.information(self, "Success", "Category updated!")
             self.accept()
         except Exception as e:
@@ -277,12 +513,9 @@ class AddCustomerDialog(QDialog):
 
     def addCustomer(self):
         try:
-            conn = get_connection()
-            cur = conn.cursor()
-            cur.execute("INSERT INTO Customers (name, email, phone_number, address) VALUES (?, ?, ?, ?)",
-                        (self.nameEdit.text(), self.emailEdit.text(), self.phoneEdit.text(), self.addressEdit.text()))
-            conn.commit()
-            conn.close()
+            run(queries.insert_record, "Customers", {"name": self.nameEdit.text(), "email": self.emailEdit.text(),
+                                                     "phone_number": self.phoneEdit.text(),
+                                                     "address": self.addressEdit.text()})
             QMessageBox.information(self, "Success", "Customer added!")
             self.accept()
         except Exception as e:
@@ -320,12 +553,9 @@ class EditCustomerDialog(QDialog):
 
     def updateCustomer(self):
         try:
-            conn = get_connection()
-            cur = conn.cursor()
-            cur.execute("UPDATE Customers SET name = ?, email = ?, phone_number = ?, address = ? WHERE customer_id = ?",
-                        (self.nameEdit.text(), self.emailEdit.text(), self.phoneEdit.text(), self.addressEdit.text(), self.customerData.get("customer_id")))
-            conn.commit()
-            conn.close()
+            run(queries.update_record, "Customers", self.customerData.get("customer_id"),
+                {"name": self.nameEdit.text(), "email": self.emailEdit.text(), "phone_number": self.phoneEdit.text(),
+                 "address": self.addressEdit.text()})
             QMessageBox.information(self, "Success", "Customer updated!")
             self.accept()
         except Exception as e:
@@ -333,6 +563,8 @@ class EditCustomerDialog(QDialog):
             self.reject()
 
 # -------------------- Main Window --------------------
+HEARTBEAT_INTERVAL = 0.1  # seconds, for the event loop lag metric
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -354,39 +586,105 @@ class MainWindow(QMainWindow):
         # Tabs
         self.tabs = QTabWidget()
         self.tabs.setStyleSheet("QTabBar::tab { padding: 10px; margin: 2px; }")
-        self.tabs.addTab(self.createProductsTab(), "Products")
-        self.tabs.addTab(self.createInvoicesTab(), "Invoices")
-        self.tabs.addTab(self.createSuppliersTab(), "Suppliers")
-        self.tabs.addTab(self.createCategoriesTab(), "Categories")
-        self.tabs.addTab(self.createCustomersTab(), "Customers")
-        self.tabs.addTab(self.createUsersTab(), "Users")
+        # Tabs start as empty placeholders; each is built (and loads its table) the first
+        # time it is shown, so startup does not depend on how much data there is
+        self._tabFactories = {}
+        for title, factory in [("Products", self.createProductsTab),
+                               ("Invoices", self.createInvoicesTab),
+                               ("Suppliers", self.createSuppliersTab),
+                               ("Categories", self.createCategoriesTab),
+                               ("Customers", self.createCustomersTab),
+                               ("Users", self.createUsersTab),
+                               ("Dashboard", self.createDashboardTab)]:
+            placeholder = QWidget()
+            QVBoxLayout(placeholder).setContentsMargins(0, 0, 0, 0)
+            self._tabFactories[placeholder] = factory
+            self.tabs.addTab(placeholder, title)
+        self.tabs.currentChanged.connect(self._ensureTab)
         mainLayout.addWidget(self.tabs)
         centralWidget = QWidget()
         centralWidget.setLayout(mainLayout)
         self.setCentralWidget(centralWidget)
-
-
-    # Search Products
-    def searchProducts(self):
-        term = self.prodSearchEdit.text().strip()
-        if not term:
-            return self.refreshProducts()
+        # Commits made by other processes (or, in client mode, other stations) reach the
+        # change subscribers through this poll
+        self.changesTimer = QTimer(self)
+        self.changesTimer.timeout.connect(self._pollChanges)
+        self.changesTimer.start(1000)
+        # Views registered by the tabs as they are built: table -> (view, search slot)
+        self._tableViews = {}
+        self._viewStates = {}
+        self._pendingChanges = {}  # table -> set of keys, or None for "any row"
+        self.changeRelay = ChangeRelay(self)
+        self.changeRelay.changed.connect(self._queueChange)
+        # A burst of notifications (an import, a busy server) is applied as one batch
+        self.applyChangesTimer = QTimer(self)
+        self.applyChangesTimer.setSingleShot(True)
+        self.applyChangesTimer.setInterval(50)
+        self.applyChangesTimer.timeout.connect(self._applyChanges)
+        QShortcut(QKeySequence("Ctrl+Shift+D"), self, self.showDiagnostics)
+        # With metrics on, a heartbeat measures how late the event loop serves timers
+        if metrics.enabled():
+            self._heartbeatDue = time.perf_counter() + HEARTBEAT_INTERVAL
+            self.heartbeatTimer = QTimer(self)
+            self.heartbeatTimer.timeout.connect(self._heartbeat)
+            self.heartbeatTimer.start(int(HEARTBEAT_INTERVAL * 1000))
+
+    def _heartbeat(self):
+        now = time.perf_counter()
+        metrics.EVENT_LOOP_LAG_SECONDS.observe(max(0.0, now - self._heartbeatDue))
+        self._heartbeatDue = now + HEARTBEAT_INTERVAL
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        # Build the first tab after the window has painted rather than before it appears
+        QTimer.singleShot(0, lambda: self._ensureTab(self.tabs.currentIndex()))
+
+    def _ensureTab(self, index):
+        placeholder = self.tabs.widget(index)
+        factory = self._tabFactories.pop(placeholder, None)
+        if factory is not None:
+            placeholder.layout().addWidget(factory())
+
+    def _pollChanges(self):
         try:
-            conn = get_connection()
-            cur = conn.cursor()
-            cur.execute(
-                "SELECT * FROM Products WHERE name LIKE ? OR CAST(product_id AS TEXT)=?",
-                (f"%{term}%", term)
-            )
-            data = cur.fetchall()
-            conn.close()
-            headers = list(data[0].keys()) if data else ["product_id", "name", "category_id", "supplier_id", "price", "stock_quantity", "barcode", "created_at"]
-            model = TableModel(data, headers)
-            self.productsTable.setModel(model)
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Product search failed:\n{e}")
-
-
+            changes.poll_external()
+        except Exception:
+            pass  # server unreachable or database busy; the next tick tries again
+
+    def _watchTable(self, table, view, searchSlot):
+        self._tableViews[table] = (view, searchSlot)
+        # Clicking a header sorts by that column, in SQL
+        header = view.horizontalHeader()
+        header.setSectionsClickable(True)
+        header.setSortIndicatorShown(True)
+        header.setSortIndicator(-1, Qt.AscendingOrder)
+        header.sortIndicatorChanged.connect(lambda section, order: self._sortTable(table, view, section, order))
+
+    def _queueChange(self, table, keys):
+        for name in [table] if table is not None else queries.TABLE_KEYS:
+            if keys is None or table is None:
+                self._pendingChanges[name] = None
+            elif self._pendingChanges.get(name, ()) is not None:
+                self._pendingChanges.setdefault(name, set()).update(keys)
+        self.applyChangesTimer.start()
+
+    def _applyChanges(self):
+        pending, self._pendingChanges = self._pendingChanges, {}
+        for table, keys in pending.items():
+            if table not in self._tableViews:
+                continue
+            view, searchSlot = self._tableViews[table]
+            model = view.model()
+            if isinstance(model, PagedTableModel):
+                model.applyChanges(keys)
+            elif model is not None:
+                searchSlot()  # the first page is still loading; load it again
+        if hasattr(self, "dashTotalsLabel") and pending.keys() & {"Invoices", "Products", "Categories"}:
+            self.refreshDashboard()
+
+    def closeEvent(self, event):
+        self.changeRelay.close()
+        super().closeEvent(event)
 
     # ---------- Products Tab ----------
     def createProductsTab(self):
@@ -396,6 +694,8 @@ class MainWindow(QMainWindow):
         for text, slot in [("Add Product", self.addProduct), 
                            ("Edit Product", self.editProduct),
                            ("Delete Product", self.deleteProduct),
+                           ("Import CSV", self.importProducts),
+                           ("Filter...", self.filterProducts),
                            ("Refresh", self.refreshProducts)]:
             btn = QPushButton(text)
             btn.setStyleSheet("padding: 8px;")
@@ -406,6 +706,7 @@ class MainWindow(QMainWindow):
         self.prodSearchEdit = QLineEdit()
         self.prodSearchEdit.setPlaceholderText("Search products...")
         toolbar.addWidget(self.prodSearchEdit)
+        self._searchAsYouType(self.prodSearchEdit, self.searchProducts)
         #combo box
         self.prodSearchCombo = QComboBox()
         self.prodSearchCombo.addItems([
@@ -444,26 +745,16 @@ class MainWindow(QMainWindow):
         layout.addLayout(toolbar)
         layout.addWidget(self.productsTable)
         widget.setLayout(layout)
+        self._watchTable("Products", self.productsTable, self.searchProducts)
         self.refreshProducts()
         return widget
 
     def refreshProducts(self):
-        try:
-            conn = get_connection()   
-            cur = conn.cursor()
-            cur.execute("SELECT * FROM Products")
-            data = cur.fetchall()
-            conn.close()
-            headers = list(data[0].keys()) if data else ["product_id", "name", "category_id", "supplier_id", "price", "stock_quantity", "barcode", "created_at"]
-            model = TableModel(data, headers)
-            self.productsTable.setModel(model)
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Load products failed:\n{e}")
+        self._loadTable(self.productsTable, "Products", error="Load products failed")
 
     def addProduct(self):
         dialog = ProductDialog(self)
-        if dialog.exec_() == QDialog.Accepted:
-            self.refreshProducts()
+        dialog.exec_()
 
     def editProduct(self):
         idx = self.productsTable.selectionModel().selectedRows()
@@ -473,8 +764,7 @@ class MainWindow(QMainWindow):
         row = idx[0].row()
         productData = self.productsTable.model().getRow(row)
         dialog = EditProductDialog(self, productData)
-        if dialog.exec_() == QDialog.Accepted:
-            self.refreshProducts()
+        dialog.exec_()
 
     def deleteProduct(self):
         idx = self.productsTable.selectionModel().selectedRows()
@@ -488,16 +778,72 @@ class MainWindow(QMainWindow):
                 f"Delete product '{productData.get('name')}'?", QMessageBox.Yes | QMessageBox.No)
         if confirm == QMessageBox.Yes:
             try:
-                conn = get_connection()
-                cur = conn.cursor()
-                cur.execute("DELETE FROM Products WHERE product_id = ?", (pid,))
-                conn.commit()
-                conn.close()
+                run(queries.delete_record, "Products", pid)
                 QMessageBox.information(self, "Success", "Product deleted!")
-                self.refreshProducts()
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Delete product failed:\n{e}")
 
+    # ---------- Dashboard Tab ----------
+    def createDashboardTab(self):
+        widget = QWidget()
+        layout = QVBoxLayout()
+        toolbar = QHBoxLayout()
+        btn = QPushButton("Refresh")
+        btn.setStyleSheet("padding: 8px;")
+        btn.clicked.connect(self.refreshDashboard)
+        toolbar.addWidget(btn)
+        btn = QPushButton("SQL Diagnostics")
+        btn.setStyleSheet("padding: 8px;")
+        btn.clicked.connect(self.showDiagnostics)
+        toolbar.addWidget(btn)
+        toolbar.addStretch()
+        self.dashTotalsLabel = QLabel("")
+        self.dashTotalsLabel.setFont(QFont("Arial", 14, QFont.Bold))
+        layout.addLayout(toolbar)
+        layout.addWidget(self.dashTotalsLabel)
+        tables = QHBoxLayout()
+        self.dashDailyTable = QTableView()
+        self.dashTopTable = QTableView()
+        self.dashStockTable = QTableView()
+        for title, view in [("Daily Sales", self.dashDailyTable),
+                            ("Top Products", self.dashTopTable),
+                            ("Stock by Category", self.dashStockTable)]:
+            view.setStyleSheet("""
+                QTableView { font: 10pt "Arial"; }
+                QHeaderView::section { font: 12pt "Arial"; font-weight: bold;}
+            """)
+            view.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+            column = QVBoxLayout()
+            column.addWidget(QLabel(title))
+            column.addWidget(view)
+            tables.addLayout(column)
+        layout.addLayout(tables)
+        widget.setLayout(layout)
+        self.refreshDashboard()
+        return widget
+
+    def refreshDashboard(self):
+        # Every figure is read from the trigger-maintained summary tables
+        self._dashboardStarted = time.perf_counter()
+        get_executor().submit(summary.dashboard, key=id(self.dashTotalsLabel), onResult=self._showDashboard,
+                              onError=lambda e: QMessageBox.critical(self, "Error", f"Load dashboard failed:\n{e}"))
+
+    def showDiagnostics(self):
+        DiagnosticsDialog(self).exec_()
+
+    def _showDashboard(self, data):
+        metrics.TABLE_LOAD_SECONDS.labels("Dashboard", "refresh").observe(time.perf_counter() - self._dashboardStarted)
+        todayCount, todayRevenue = data["today"]
+        periodCount, periodRevenue = data["period"]
+        self.dashTotalsLabel.setText(
+            f"Today: ${todayRevenue:,.2f} ({todayCount} invoices)    "
+            f"Last {data['days']} days: ${periodRevenue:,.2f} ({periodCount} invoices)    "
+            f"Stock value: ${data['stock_value']:,.2f}")
+        self.dashDailyTable.setModel(TableModel(data["daily"], ["day", "invoice_count", "revenue"]))
+        self.dashTopTable.setModel(TableModel(data["top_products"], ["name", "units_sold", "revenue"]))
+        self.dashStockTable.setModel(TableModel(data["stock"], ["category_name", "product_count",
+                                                                 "units_in_stock", "stock_value"]))
+
     # ---------- Invoices Tab ----------
     def createInvoicesTab(self):
         widget = QWidget()
@@ -507,6 +853,8 @@ class MainWindow(QMainWindow):
                            ("Edit Invoice", self.editInvoice),
                            ("Delete Invoice", self.deleteInvoice),
                            ("Export Invoice PDF", self.exportInvoicePDF),
+                           ("Batch Export PDFs", self.batchExportInvoicePDFs),
+                           ("Filter...", self.filterInvoices),
                            ("Refresh", self.refreshInvoices)]:
             btn = QPushButton(text)
             btn.setStyleSheet("padding: 8px;")
@@ -517,6 +865,7 @@ class MainWindow(QMainWindow):
         self.InvoiceSearchEdit = QLineEdit()
         self.InvoiceSearchEdit.setPlaceholderText("Search Invoices...")
         toolbar.addWidget(self.InvoiceSearchEdit)
+        self._searchAsYouType(self.InvoiceSearchEdit, self.searchInvoices)
         #combobox
         self.invSearchCombo = QComboBox()
         self.invSearchCombo.addItems([
@@ -543,26 +892,16 @@ class MainWindow(QMainWindow):
         layout.addLayout(toolbar)
         layout.addWidget(self.invoicesTable)
         widget.setLayout(layout)
+        self._watchTable("Invoices", self.invoicesTable, self.searchInvoices)
         self.refreshInvoices()
         return widget
 
     def refreshInvoices(self):
-        try:
-            conn = get_connection()
-            cur = conn.cursor()
-            cur.execute("SELECT * FROM Invoices")
-            data = cur.fetchall()
-            conn.close()
-            headers = list(data[0].keys()) if data else ["invoice_id", "customer_id", "user_id", "total_amount", "payment_status", "created_at"]
-            model = TableModel(data, headers)
-            self.invoicesTable.setModel(model)
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Load invoices failed:\n{e}")
+        self._loadTable(self.invoicesTable, "Invoices", error="Load invoices failed")
 
     def addInvoice(self):
         dialog = InvoiceDialog(self)
-        if dialog.exec_() == QDialog.Accepted:
-            self.refreshInvoices()
+        dialog.exec_()
 
     def editInvoice(self):
         idx = self.invoicesTable.selectionModel().selectedRows()
@@ -572,8 +911,7 @@ class MainWindow(QMainWindow):
         row = idx[0].row()
         invoiceData = self.invoicesTable.model().getRow(row)
         dialog = InvoiceDialog(self, invoiceData)
-        if dialog.exec_() == QDialog.Accepted:
-            self.refreshInvoices()
+        dialog.exec_()
 
     def deleteInvoice(self):
         idx = self.invoicesTable.selectionModel().selectedRows()
@@ -587,14 +925,8 @@ class MainWindow(QMainWindow):
                 f"Delete invoice ID '{iid}'?", QMessageBox.Yes | QMessageBox.No)
         if confirm == QMessageBox.Yes:
             try:
-                conn = get_connection()
-                cur = conn.cursor()
-                cur.execute("DELETE FROM Invoice_Items WHERE invoice_id = ?", (iid,))
-                cur.execute("DELETE FROM Invoices WHERE invoice_id = ?", (iid,))
-                conn.commit()
-                conn.close()
+                run(stock.delete_invoice, iid)
                 QMessageBox.information(self, "Success", "Invoice deleted!")
-                self.refreshInvoices()
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Delete invoice failed:\n{e}")
 
@@ -606,195 +938,154 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Warning", "Select an invoice to export.")
             return
         row = idx[0].row()
-        invoiceData = self.invoicesTable.model().getRow(row)
-        invoice_id = invoiceData.get("invoice_id")
-        customer_id = invoiceData.get("customer_id")  # Assuming invoiceData has customer_id
+        invoice_id = self.invoicesTable.model().getRow(row).get("invoice_id")
+        started = time.perf_counter()
 
-        try:
-            # Connect to the database
-            conn = get_connection()
-            cur = conn.cursor()
-
-            # Retrieve invoice items with associated product details
-            cur.execute("""
-                SELECT ii.product_id, p.name as product_name, ii.quantity, ii.price_per_item 
-                FROM Invoice_Items ii 
-                JOIN Products p ON ii.product_id = p.product_id 
-                WHERE invoice_id = ?
-            """, (invoice_id,))
-            items = cur.fetchall()
-            items = [dict(i) for i in items]
-
-            # Retrieve customer name using the customer_id
-            cur.execute("SELECT name FROM Customers WHERE customer_id = ?", (customer_id,))
-            result = cur.fetchone()
-            if result:
-                customer_name = result["name"]
-            else:
-                customer_name = "Unknown"
-            conn.close()
-
-            # Build the PDF file
-            pdf_file = f"Invoice_{invoice_id}.pdf"
-            doc = SimpleDocTemplate(pdf_file, pagesize=A4,
-                                    rightMargin=20*mm, leftMargin=20*mm,
-                                    topMargin=40*mm, bottomMargin=20*mm)
-            styles = getSampleStyleSheet()
-            elements = []
-
-            # Invoice Header Section
-            header_title = Paragraph(f"<b>Invoice #{invoice_id}</b>", styles["Title"])
-            elements.append(header_title)
-            elements.append(Spacer(1, 12))
-
-            # Invoice Details Table with customer name included
-            details = [
-                ["Invoice Date:", invoiceData.get("created_at")],
-                ["Customer Name:", customer_name],
-                ["Total Amount:", f"${invoiceData.get('total_amount'):.2f}"]
-            ]
-            details_table = Table(details, colWidths=[120, 300])
-            details_table.setStyle(TableStyle([
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-            ]))
-            elements.append(details_table)
-            elements.append(Spacer(1, 12))
-
-            # Invoice Items Table
-            table_data = [["Product ID", "Product Name", "Quantity", "Price per Item", "Total"]]
-            for item in items:
-                total_price = item["quantity"] * item["price_per_item"]
-                table_data.append([
-                    item["product_id"],
-                    item["product_name"],
-                    item["quantity"],
-                    f"${item['price_per_item']:.2f}",
-                    f"${total_price:.2f}"
-                ])
-            items_table = Table(table_data, colWidths=[60, 200, 50, 80, 80])
-            items_table.setStyle(TableStyle([
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-                ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 8)
-            ]))
-            elements.append(items_table)
-            elements.append(Spacer(1, 24))
-
-            # Additional Notes
-            notes = Paragraph("Please contact us if you have any questions regarding this invoice.", styles["Normal"])
-            elements.append(notes)
-
-            # Advanced Header/Footer Callback Function
-            def draw_header_footer(c: canvas.Canvas, doc_obj):
-                c.saveState()
-                width, height = A4
-
-                # Draw Header Background
-                c.setFillColorRGB(0.2, 0.5, 0.8)  # blue tone
-                c.rect(0, height - 60, width, 60, fill=1, stroke=0)
-
-                # Draw Company Logo if available
-                try:
-                    logo = "logo.png"  # Adjust the image path as needed
-                    c.drawImage(logo, 20, height - 50, width=40, height=40, preserveAspectRatio=True)
-                except Exception:
-                    pass
-
-                # Header Text: Company Name and Tagline
-                c.setFillColor(colors.whitesmoke)
-                c.setFont("Helvetica-Bold", 16)
-                c.drawString(70, height - 35, "Inventory Billing System")
-                c.setFont("Helvetica", 10)
-                c.drawString(70, height - 50, "Innovative Solutions for Modern Business")
-
-                # Draw Footer Background
-                c.setFillColorRGB(0.2, 0.5, 0.8)
-                c.rect(0, 0, width, 30, fill=1, stroke=0)
-                c.setFillColor(colors.whitesmoke)
-                c.setFont("Helvetica", 9)
-                # Page Number Centered
-                page_number_text = f"Page {c.getPageNumber()}"
-                c.drawCentredString(width / 2, 10, page_number_text)
-                # Footer Message on the Right
-                c.drawRightString(width - 20, 10, "Thank you for your business!")
-                c.restoreState()
-
-            # Build the PDF with the header/footer callback
-            doc.build(elements, onFirstPage=draw_header_footer, onLaterPages=draw_header_footer)
+        def onResult(pdf_file):
+            self._pdfExported("single", started)
             QMessageBox.information(self, "PDF Exported", f"Invoice exported as {pdf_file}")
-        except Exception as e:
+
+        def onError(e):
+            metrics.PDF_EXPORTS.labels("single", "error").inc()
             QMessageBox.critical(self, "Error", f"PDF export failed:\n{e}")
 
+        get_executor().submit(pdf_export.export_invoice_pdf, invoice_id, pooled=False, onResult=onResult,
+                              onError=onError)
+
+    def _pdfExported(self, kind, started):
+        metrics.PDF_EXPORT_SECONDS.labels(kind).observe(time.perf_counter() - started)
+        metrics.PDF_EXPORTS.labels(kind, "ok").inc()
+
+    def batchExportInvoicePDFs(self):
+        # Selected invoices if several are selected, otherwise a date range
+        idx = self.invoicesTable.selectionModel().selectedRows()
+        model = self.invoicesTable.model()
+        if len(idx) > 1:
+            ids = sorted(model.getRow(i.row()).get("invoice_id") for i in idx)
+            directory = QFileDialog.getExistingDirectory(self, "Export Invoice PDFs", pdf_export.BATCH_DIR)
+            if not directory:
+                return
+            fn, args = pdf_export.export_batch, (ids, directory)
+        else:
+            dialog = BatchExportDialog(self)
+            if dialog.exec_() != QDialog.Accepted:
+                return
+            start, end, directory = dialog.getRange()
+            fn, args = pdf_export.export_range, (start, end, directory)
+        progressDialog = QProgressDialog("Exporting invoice PDFs...", None, 0, 0, self)
+        progressDialog.setWindowTitle("Batch Export")
+        progressDialog.setWindowModality(Qt.WindowModal)
+        progressDialog.setMinimumDuration(0)
+        progressDialog.show()
+        started = time.perf_counter()
+
+        def onProgress(done, total):
+            progressDialog.setMaximum(total)
+            progressDialog.setValue(done)
+
+        def onResult(paths):
+            progressDialog.close()
+            self._pdfExported("batch", started)
+            QMessageBox.information(self, "PDF Exported", f"{len(paths)} invoices exported to {directory}")
+
+        def onError(e):
+            progressDialog.close()
+            metrics.PDF_EXPORTS.labels("batch", "error").inc()
+            QMessageBox.critical(self, "Error", f"Batch PDF export failed:\n{e}")
+
+        get_executor().submit(fn, *args, pooled=False, onResult=onResult, onError=onError, onProgress=onProgress)
+
 
     def searchProducts(self):
-        term = self.prodSearchEdit.text().strip()
-        if not term: return self.refreshProducts()
-        # q = "SELECT * FROM Products WHERE name LIKE ? OR CAST(product_id AS TEXT)=?"
-        # args = (f"%{term}%", term)
-        col = self.prodSearchCombo.currentText()
-        q = f"SELECT * FROM Products WHERE {col} LIKE ?"
-        args = (f"%{term}%",)
-        self._applySearch(q, args, self.refreshProducts, self.productsTable)
+        self._search("Products", self.prodSearchCombo.currentText(), self.prodSearchEdit.text(), self.productsTable)
 
     def searchInvoices(self):
-        term = self.InvoiceSearchEdit.text().strip()
-        if not term: return self.refreshInvoices()
-        col = self.invSearchCombo.currentText()
-        q = f"SELECT * FROM Invoices WHERE {col} LIKE ?"
-        args = (f"%{term}%",)
-        self._applySearch(q, args, self.refreshInvoices, self.invoicesTable)
+        self._search("Invoices", self.invSearchCombo.currentText(), self.InvoiceSearchEdit.text(), self.invoicesTable)
 
     def searchSuppliers(self):
-        term = self.supSearchEdit.text().strip()
-        if not term: return self.refreshSuppliers()
-        col = self.supSearchCombo.currentText()
-        q = f"SELECT * FROM Suppliers WHERE {col} LIKE ?"
-        args = (f"%{term}%",)
-        self._applySearch(q, args, self.refreshSuppliers, self.suppliersTable)
+        self._search("Suppliers", self.supSearchCombo.currentText(), self.supSearchEdit.text(), self.suppliersTable)
 
     def searchCategories(self):
-        term = self.catSearchEdit.text().strip()
-        if not term: return self.refreshCategories()
-        col = self.catSearchCombo.currentText()
-        q = f"SELECT * FROM Categories WHERE {col} LIKE ?"
-        args = (f"%{term}%",)
-        self._applySearch(q, args, self.refreshCategories, self.categoriesTable)
+        self._search("Categories", self.catSearchCombo.currentText(), self.catSearchEdit.text(), self.categoriesTable)
 
     def searchCustomers(self):
-        term = self.custSearchEdit.text().strip()
-        if not term: return self.refreshCustomers()
-        col = self.custSearchCombo.currentText()
-        q = f"SELECT * FROM Customers WHERE {col} LIKE ?"
-        args = (f"%{term}%",)
-        self._applySearch(q, args, self.refreshCustomers, self.customersTable)
+        self._search("Customers", self.custSearchCombo.currentText(), self.custSearchEdit.text(), self.customersTable)
 
     def searchUsers(self):
-        term = self.userSearchEdit.text().strip()
-        if not term: return self.refreshUsers()
-        col = self.userSearchCombo.currentText()
-        q = f"SELECT * FROM Users WHERE {col} LIKE ?"
-        args = (f"%{term}%",)
-        self._applySearch(q, args, self.refreshUsers, self.usersTable)
-
-    def _applySearch(self, query, args, fallback, table_view):
-        try:
-            conn = get_connection(); cur = conn.cursor()
-            cur.execute(query, args)
-            data = cur.fetchall()
-            conn.close()
-            headers = list(data[0].keys()) if data else table_view.model()._headers
-            table_view.setModel(TableModel(data, headers))
-        except Exception as e:
-            QMessageBox.critical(self, "Search Error", str(e))
-
+        self._search("Users", self.userSearchCombo.currentText(), self.userSearchEdit.text(), self.usersTable)
+
+    def _viewState(self, table):
+        # What a table view shows: search box filter, range filters and sort column
+        return self._viewStates.setdefault(table, {"search": [], "ranges": [], "rangeText": {},
+                                                   "sort": None, "descending": False})
+
+    def _search(self, table, col, term, table_view):
+        term = term.strip()
+        state = self._viewState(table)
+        # Full-text columns use the FTS index; TableQuery falls back to LIKE for the rest
+        state["search"] = [[col, "match" if search.is_searchable(table, col) else "like", term]] if term else []
+        self._loadTable(table_view, table, error="Search failed", action="search")
+
+    def _sortTable(self, table, table_view, section, order):
+        state = self._viewState(table)
+        state["sort"] = queries.TABLE_COLUMNS[table][section]
+        state["descending"] = order == Qt.DescendingOrder
+        self._loadTable(table_view, table, error="Sort failed", action="sort")
+
+    def _filterTable(self, table, table_view):
+        state = self._viewState(table)
+        dialog = RangeFilterDialog(table, state["rangeText"], self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        state["ranges"], state["rangeText"] = dialog.getFilters()
+        self._loadTable(table_view, table, error="Filter failed", action="filter")
+
+    def filterProducts(self):
+        self._filterTable("Products", self.productsTable)
+
+    def filterInvoices(self):
+        self._filterTable("Invoices", self.invoicesTable)
+
+    def _loadTable(self, table_view, table, error="Load failed", action="refresh"):
+        # The first page is fetched off the GUI thread; a newer load of the same view wins
+        if table_view.model() is None:
+            table_view.setModel(TableModel([], queries.TABLE_COLUMNS[table]))
+        state = self._viewState(table)
+        query = TableQuery(table, state["search"] + state["ranges"], state["sort"], state["descending"])
+        started = time.perf_counter()
+        def show(rows):
+            table_view.setModel(PagedTableModel(query, queries.TABLE_COLUMNS[table], rows=rows))
+            metrics.TABLE_LOAD_SECONDS.labels(table, action).observe(time.perf_counter() - started)
+        get_executor().submit(query_builder.fetch_page, query.spec(), key=id(table_view), onResult=show,
+                              onError=lambda e: QMessageBox.critical(self, "Error", f"{error}:\n{e}"))
+
+    def _searchAsYouType(self, edit, slot):
+        # Re-run the search shortly after typing stops; the executor drops stale results
+        timer = QTimer(edit)
+        timer.setSingleShot(True)
+        timer.setInterval(250)
+        timer.timeout.connect(slot)
+        edit.textChanged.connect(lambda _: timer.start())
+        edit.returnPressed.connect(slot)
+
+    def importProducts(self):
+        self._importCsv("products")
+
+    def importSuppliers(self):
+        self._importCsv("suppliers")
+
+    def importCustomers(self):
+        self._importCsv("customers")
+
+    def _importCsv(self, kind):
+        path, _ = QFileDialog.getOpenFileName(self, "Import CSV", "", "CSV Files (*.csv)")
+        if not path:
+            return
+        def done(result):
+            details = "\n".join(result.errors[:10])
+            QMessageBox.information(self, "Import Finished", f"{result.summary()}\n{details}".strip())
+        get_executor().submit(importer.import_csv, kind, path, pooled=False, onResult=done,
+                              onError=lambda e: QMessageBox.critical(self, "Error", f"Import failed:\n{e}"))
 
     # ---------- Suppliers Tab ----------
     def createSuppliersTab(self):
@@ -804,6 +1095,7 @@ class MainWindow(QMainWindow):
         for text, slot in [("Add Supplier", self.addSupplier),
                            ("Edit Supplier", self.editSupplier),
                            ("Delete Supplier", self.deleteSupplier),
+                           ("Import CSV", self.importSuppliers),
                            ("Refresh", self.refreshSuppliers)]:
             btn = QPushButton(text)
             btn.setStyleSheet("padding: 8px;")
@@ -813,6 +1105,7 @@ class MainWindow(QMainWindow):
         self.supSearchEdit = QLineEdit()
         self.supSearchEdit.setPlaceholderText("Search Suppliers...")
         toolbar.addWidget(self.supSearchEdit)
+        self._searchAsYouType(self.supSearchEdit, self.searchSuppliers)
         self.supSearchCombo = QComboBox()
         self.supSearchCombo.addItems([
             "supplier_id","name","contact_name",
@@ -835,26 +1128,16 @@ class MainWindow(QMainWindow):
         layout.addLayout(toolbar)
         layout.addWidget(self.suppliersTable)
         widget.setLayout(layout)
+        self._watchTable("Suppliers", self.suppliersTable, self.searchSuppliers)
         self.refreshSuppliers()
         return widget
 
     def refreshSuppliers(self):
-        try:
-            conn = get_connection()
-            cur = conn.cursor()
-            cur.execute("SELECT * FROM Suppliers")
-            data = cur.fetchall()
-            conn.close()
-            headers = list(data[0].keys()) if data else ["supplier_id", "name", "contact_name", "contact_email", "phone_number"]
-            model = TableModel(data, headers)
-            self.suppliersTable.setModel(model)
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Load suppliers failed:\n{e}")
+        self._loadTable(self.suppliersTable, "Suppliers", error="Load suppliers failed")
 
     def addSupplier(self):
         dialog = AddSupplierDialog(self)
-        if dialog.exec_() == QDialog.Accepted:
-            self.refreshSuppliers()
+        dialog.exec_()
 
     def editSupplier(self):
         idx = self.suppliersTable.selectionModel().selectedRows()
@@ -864,8 +1147,7 @@ class MainWindow(QMainWindow):
         row = idx[0].row()
         supplierData = self.suppliersTable.model().getRow(row)
         dialog = EditSupplierDialog(self, supplierData)
-        if dialog.exec_() == QDialog.Accepted:
-            self.refreshSuppliers()
+        dialog.exec_()
 
     def deleteSupplier(self):
         idx = self.suppliersTable.selectionModel().selectedRows()
@@ -879,13 +1161,8 @@ class MainWindow(QMainWindow):
                 f"Delete supplier '{supplierData.get('name')}'?", QMessageBox.Yes | QMessageBox.No)
         if confirm == QMessageBox.Yes:
             try:
-                conn = get_connection()
-                cur = conn.cursor()
-                cur.execute("DELETE FROM Suppliers WHERE supplier_id = ?", (sid,))
-                conn.commit()
-                conn.close()
+                run(queries.delete_record, "Suppliers", sid)
                 QMessageBox.information(self, "Success", "Supplier deleted!")
-                self.refreshSuppliers()
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Delete supplier failed:\n{e}")
 
@@ -906,6 +1183,7 @@ class MainWindow(QMainWindow):
         self.catSearchEdit = QLineEdit()
         self.catSearchEdit.setPlaceholderText("Search Categories...")
         toolbar.addWidget(self.catSearchEdit)
+        self._searchAsYouType(self.catSearchEdit, self.searchCategories)
         self.catSearchCombo = QComboBox()
         self.catSearchCombo.addItems(["category_id","category_name"])
         toolbar.addWidget(self.catSearchCombo)
@@ -925,26 +1203,16 @@ class MainWindow(QMainWindow):
         layout.addLayout(toolbar)
         layout.addWidget(self.categoriesTable)
         widget.setLayout(layout)
+        self._watchTable("Categories", self.categoriesTable, self.searchCategories)
         self.refreshCategories()
         return widget
 
     def refreshCategories(self):
-        try:
-            conn = get_connection()
-            cur = conn.cursor()
-            cur.execute("SELECT * FROM Categories")
-            data = cur.fetchall()
-            conn.close()
-            headers = list(data[0].keys()) if data else ["category_id", "category_name"]
-            model = TableModel(data, headers)
-            self.categoriesTable.setModel(model)
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Load categories failed:\n{e}")
+        self._loadTable(self.categoriesTable, "Categories", error="Load categories failed")
 
     def addCategory(self):
         dialog = AddCategoryDialog(self)
-        if dialog.exec_() == QDialog.Accepted:
-            self.refreshCategories()
+        dialog.exec_()
 
     def editCategory(self):
         idx = self.categoriesTable.selectionModel().selectedRows()
@@ -954,8 +1222,7 @@ class MainWindow(QMainWindow):
         row = idx[0].row()
         categoryData = self.categoriesTable.model().getRow(row)
         dialog = EditCategoryDialog(self, categoryData)
-        if dialog.exec_() == QDialog.Accepted:
-            self.refreshCategories()
+        dialog.exec_()
 
     def deleteCategory(self):
         idx = self.categoriesTable.selectionModel().selectedRows()
@@ -969,13 +1236,8 @@ class MainWindow(QMainWindow):
                 f"Delete category '{categoryData.get('category_name')}'?", QMessageBox.Yes | QMessageBox.No)
         if confirm == QMessageBox.Yes:
             try:
-                conn = get_connection()
-                cur = conn.cursor()
-                cur.execute("DELETE FROM Categories WHERE category_id = ?", (cid,))
-                conn.commit()
-                conn.close()
+                run(queries.delete_record, "Categories", cid)
                 QMessageBox.information(self, "Success", "Category deleted!")
-                self.refreshCategories()
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Delete category failed:\n{e}")
 
@@ -987,6 +1249,7 @@ class MainWindow(QMainWindow):
         for text, slot in [("Add Customer", self.addCustomer),
                            ("Edit Customer", self.editCustomer),
                            ("Delete Customer", self.deleteCustomer),
+                           ("Import CSV", self.importCustomers),
                            ("Refresh", self.refreshCustomers)]:
             btn = QPushButton(text)
             btn.setStyleSheet("padding: 8px;")
@@ -996,6 +1259,7 @@ class MainWindow(QMainWindow):
         self.custSearchEdit = QLineEdit()
         self.custSearchEdit.setPlaceholderText("Search Customers...")
         toolbar.addWidget(self.custSearchEdit)
+        self._searchAsYouType(self.custSearchEdit, self.searchCustomers)
         self.custSearchCombo = QComboBox()
         self.custSearchCombo.addItems([
             "customer_id","name","email",
@@ -1018,26 +1282,16 @@ class MainWindow(QMainWindow):
         layout.addLayout(toolbar)
         layout.addWidget(self.customersTable)
         widget.setLayout(layout)
+        self._watchTable("Customers", self.customersTable, self.searchCustomers)
         self.refreshCustomers()
         return widget
 
     def refreshCustomers(self):
-        try:
-            conn = get_connection()
-            cur = conn.cursor()
-            cur.execute("SELECT * FROM Customers")
-            data = cur.fetchall()
-            conn.close()
-            headers = list(data[0].keys()) if data else ["customer_id", "name", "email", "phone_number", "address"]
-            model = TableModel(data, headers)
-            self.customersTable.setModel(model)
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Load customers failed:\n{e}")
+        self._loadTable(self.customersTable, "Customers", error="Load customers failed")
 
     def addCustomer(self):
         dialog = AddCustomerDialog(self)
-        if dialog.exec_() == QDialog.Accepted:
-            self.refreshCustomers()
+        dialog.exec_()
 
     def editCustomer(self):
         idx = self.customersTable.selectionModel().selectedRows()
@@ -1047,8 +1301,7 @@ class MainWindow(QMainWindow):
         row = idx[0].row()
         customerData = self.customersTable.model().getRow(row)
         dialog = EditCustomerDialog(self, customerData)
-        if dialog.exec_() == QDialog.Accepted:
-            self.refreshCustomers()
+        dialog.exec_()
 
     def deleteCustomer(self):
         idx = self.customersTable.selectionModel().selectedRows()
@@ -1062,13 +1315,8 @@ class MainWindow(QMainWindow):
                 f"Delete customer '{customerData.get('name')}'?", QMessageBox.Yes | QMessageBox.No)
         if confirm == QMessageBox.Yes:
             try:
-                conn = get_connection()
-                cur = conn.cursor()
-                cur.execute("DELETE FROM Customers WHERE customer_id = ?", (cid,))
-                conn.commit()
-                conn.close()
+                run(queries.delete_record, "Customers", cid)
                 QMessageBox.information(self, "Success", "Customer deleted!")
-                self.refreshCustomers()
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Delete customer failed:\n{e}")
 
@@ -1089,6 +1337,7 @@ class MainWindow(QMainWindow):
         self.userSearchEdit = QLineEdit()
         self.userSearchEdit.setPlaceholderText("Search Users...")
         toolbar.addWidget(self.userSearchEdit)
+        self._searchAsYouType(self.userSearchEdit, self.searchUsers)
         self.userSearchCombo = QComboBox()
         self.userSearchCombo.addItems(["user_id","username","role"])
         toolbar.addWidget(self.userSearchCombo)
@@ -1108,26 +1357,16 @@ class MainWindow(QMainWindow):
         layout.addLayout(toolbar)
         layout.addWidget(self.usersTable)
         widget.setLayout(layout)
+        self._watchTable("Users", self.usersTable, self.searchUsers)
         self.refreshUsers()
         return widget
 
     def refreshUsers(self):
-        try:
-            conn = get_connection()
-            cur = conn.cursor()
-            cur.execute("SELECT * FROM Users")
-            data = cur.fetchall()
-            conn.close()
-            headers = list(data[0].keys()) if data else ["user_id", "username", "password_hash", "role"]
-            model = TableModel(data, headers)
-            self.usersTable.setModel(model)
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Load users failed:\n{e}")
+        self._loadTable(self.usersTable, "Users", error="Load users failed")
 
     def addUser(self):
         dialog = AddUserDialog(self)
-        if dialog.exec_() == QDialog.Accepted:
-            self.refreshUsers()
+        dialog.exec_()
 
     def editUser(self):
         idx = self.usersTable.selectionModel().selectedRows()
@@ -1137,8 +1376,7 @@ class MainWindow(QMainWindow):
         row = idx[0].row()
         userData = self.usersTable.model().getRow(row)
         dialog = EditUserDialog(self, userData)
-        if dialog.exec_() == QDialog.Accepted:
-            self.refreshUsers()
+        dialog.exec_()
 
     def deleteUser(self):
         idx = self.usersTable.selectionModel().selectedRows()
@@ -1152,13 +1390,8 @@ class MainWindow(QMainWindow):
                 f"Delete user '{userData.get('username')}'?", QMessageBox.Yes | QMessageBox.No)
         if confirm == QMessageBox.Yes:
             try:
-                conn = get_connection()
-                cur = conn.cursor()
-                cur.execute("DELETE FROM Users WHERE user_id = ?", (uid,))
-                conn.commit()
-                conn.close()
+                run(queries.delete_record, "Users", uid)
                 QMessageBox.information(self, "Success", "User deleted!")
-                self.refreshUsers()
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Delete user failed:\n{e}")
 
@@ -1192,16 +1425,12 @@ class ProductDialog(QDialog):
 
     def populateCategories(self):
         try:
-            conn = get_connection()
-            cur = conn.cursor()
-            cur.execute("SELECT category_id, category_name FROM Categories ORDER BY category_name")
-            cats = cur.fetchall()
-            conn.close()
+            cats = run(queries.list_options, "Categories", readonly=True)
             self.categoryCombo.clear()
             if cats:
                 self.categoryCombo.addItem("Select Category", None)
                 for cat in cats:
-                    self.categoryCombo.addItem(cat["category_name"], cat["category_id"])
+                    self.categoryCombo.addItem(cat["label"], cat["id"])
             else:
                 self.categoryCombo.addItem("No Category Available", None)
         except Exception as e:
@@ -1209,16 +1438,12 @@ class ProductDialog(QDialog):
 
     def populateSuppliers(self):
         try:
-            conn = get_connection()
-            cur = conn.cursor()
-            cur.execute("SELECT supplier_id, name FROM Suppliers ORDER BY name")
-            sups = cur.fetchall()
-            conn.close()
+            sups = run(queries.list_options, "Suppliers", readonly=True)
             self.supplierCombo.clear()
             if sups:
                 self.supplierCombo.addItem("Select Supplier", None)
                 for sup in sups:
-                    self.supplierCombo.addItem(sup["name"], sup["supplier_id"])
+                    self.supplierCombo.addItem(sup["label"], sup["id"])
             else:
                 self.supplierCombo.addItem("No Supplier Available", None)
         except Exception as e:
@@ -1233,18 +1458,11 @@ class ProductDialog(QDialog):
         if sup_id is None:
             QMessageBox.critical(self, "Error", "Select a valid supplier.")
             return
-        unique_code = uuid.uuid4().hex[:8]
-        barcode_data = "BC-" + unique_code
-        barcode_file = generate_barcode_image(barcode_data)
+        barcode_data = new_barcode_code()
+        metrics.BARCODES_GENERATED.labels("code").inc()
         try:
-            conn = get_connection()
-            cur = conn.cursor()
-            cur.execute("""
-                INSERT INTO Products (name, category_id, supplier_id, price, stock_quantity, barcode)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (self.nameEdit.text(), cat_id, sup_id, float(self.priceEdit.text()), int(self.stockEdit.text()), barcode_file))
-            conn.commit()
-            conn.close()
+            run(queries.add_product, self.nameEdit.text(), cat_id, sup_id, float(self.priceEdit.text()),
+                int(self.stockEdit.text()), barcode_data)
             QMessageBox.information(self, "Success", "Product added!")
             self.accept()
         except Exception as e:
@@ -1276,14 +1494,10 @@ class AddSupplierDialog(QDialog):
 
     def addSupplier(self):
         try:
-            conn = get_connection()
-            cur = conn.cursor()
-            cur.execute("""
-                INSERT INTO Suppliers (name, contact_name, contact_email, phone_number)
-                VALUES (?, ?, ?, ?)
-            """, (self.nameEdit.text(), self.contactNameEdit.text(), self.contactEmailEdit.text(), self.phoneEdit.text()))
-            conn.commit()
-            conn.close()
+            run(queries.insert_record, "Suppliers", {"name": self.nameEdit.text(),
+                                                     "contact_name": self.contactNameEdit.text(),
+                                                     "contact_email": self.contactEmailEdit.text(),
+                                                     "phone_number": self.phoneEdit.text()})
             QMessageBox.information(self, "Success", "Supplier added!")
             self.accept()
         except Exception as e:
@@ -1321,15 +1535,9 @@ class EditSupplierDialog(QDialog):
 
     def updateSupplier(self):
         try:
-            conn = get_connection()
-            cur = conn.cursor()
-            cur.execute("""
-                UPDATE Suppliers
-                SET name = ?, contact_name = ?, contact_email = ?, phone_number = ?
-                WHERE supplier_id = ?
-            """, (self.nameEdit.text(), self.contactNameEdit.text(), self.contactEmailEdit.text(), self.phoneEdit.text(), self.supplierData.get("supplier_id")))
-            conn.commit()
-            conn.close()
+            run(queries.update_record, "Suppliers", self.supplierData.get("supplier_id"),
+                {"name": self.nameEdit.text(), "contact_name": self.contactNameEdit.text(),
+                 "contact_email": self.contactEmailEdit.text(), "phone_number": self.phoneEdit.text()})
             QMessageBox.information(self, "Success", "Supplier updated!")
             self.accept()
         except Exception as e:
@@ -1378,16 +1586,12 @@ class EditProductDialog(QDialog):
 
     def populateCategories(self):
         try:
-            conn = get_connection()
-            cur = conn.cursor()
-            cur.execute("SELECT category_id, category_name FROM Categories ORDER BY category_name")
-            cats = cur.fetchall()
-            conn.close()
+            cats = run(queries.list_options, "Categories", readonly=True)
             self.categoryCombo.clear()
             if cats:
                 self.categoryCombo.addItem("Select Category", None)
                 for cat in cats:
-                    self.categoryCombo.addItem(cat["category_name"], cat["category_id"])
+                    self.categoryCombo.addItem(cat["label"], cat["id"])
             else:
                 self.categoryCombo.addItem("No Category Available", None)
         except Exception as e:
@@ -1395,16 +1599,12 @@ class EditProductDialog(QDialog):
 
     def populateSuppliers(self):
         try:
-            conn = get_connection()
-            cur = conn.cursor()
-            cur.execute("SELECT supplier_id, name FROM Suppliers ORDER BY name")
-            sups = cur.fetchall()
-            conn.close()
+            sups = run(queries.list_options, "Suppliers", readonly=True)
             self.supplierCombo.clear()
             if sups:
                 self.supplierCombo.addItem("Select Supplier", None)
                 for sup in sups:
-                    self.supplierCombo.addItem(sup["name"], sup["supplier_id"])
+                    self.supplierCombo.addItem(sup["label"], sup["id"])
             else:
                 self.supplierCombo.addItem("No Supplier Available", None)
         except Exception as e:
@@ -1421,21 +1621,189 @@ class EditProductDialog(QDialog):
             return
         pid = self.productData.get("product_id")
         try:
-            conn = get_connection()
-            cur = conn.cursor()
-            cur.execute("""
-                UPDATE Products
-                SET name = ?, category_id = ?, supplier_id = ?, price = ?, stock_quantity = ?
-                WHERE product_id = ?
-            """, (self.nameEdit.text(), cat_id, sup_id, float(self.priceEdit.text()), int(self.stockEdit.text()), pid))
-            conn.commit()
-            conn.close()
+            run(queries.update_product, pid, self.nameEdit.text(), cat_id, sup_id,
+                float(self.priceEdit.text()), int(self.stockEdit.text()))
             QMessageBox.information(self, "Success", "Product updated!")
             self.accept()
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Update product failed:\n{e}")
             self.reject()
 
+# -------------------- Invoice Lines Model --------------------
+def _cents(quantity, price):
+    return int(round(quantity * price * 100))
+
+
+def parse_invoice_lines(text):
+    # Pasted line lists: one line per row as "code quantity [price]", separated by tabs
+    # (spreadsheets), commas or semicolons. The code is a barcode or a product id.
+    lines, errors = [], []
+    for number, raw in enumerate(text.splitlines(), 1):
+        fields = [f.strip() for f in raw.replace(";", "\t").replace(",", "\t").split("\t") if f.strip()]
+        if not fields:
+            continue
+        try:
+            quantity = int(fields[1]) if len(fields) > 1 else 1
+            price = float(fields[2]) if len(fields) > 2 else None
+            if quantity <= 0 or (price is not None and price < 0):
+                raise ValueError
+        except ValueError:
+            errors.append(f"Line {number}: {raw.strip()}")
+            continue
+        lines.append((fields[0], quantity, price))
+    return lines, errors
+
+
+class InvoiceLinesModel(QAbstractTableModel):
+    # Invoice lines being edited. Rows are inserted and removed individually, the total is
+    # kept as a running sum in cents, and a product added again at the same price is
+    # merged into its existing line.
+    HEADERS = ["Product ID", "Product Name", "Quantity", "Price", "Line Total"]
+    QUANTITY, PRICE = 2, 3
+    totalChanged = pyqtSignal(float)
+
+    def __init__(self, parent=None):
+        super(InvoiceLinesModel, self).__init__(parent)
+        self._lines = []  # dicts: product_id, product_name, quantity, price_per_item
+        self._rowOf = {}  # (product_id, price) -> row, for merging
+        self._totalCents = 0
+
+    # ---------- Qt model ----------
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._lines)
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return QVariant()
+        line = self._lines[index.row()]
+        column = index.column()
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            if column == 0:
+                return str(line["product_id"])
+            if column == 1:
+                return line["product_name"]
+            if column == self.QUANTITY:
+                return line["quantity"] if role == Qt.EditRole else str(line["quantity"])
+            if column == self.PRICE:
+                return line["price_per_item"] if role == Qt.EditRole else f'{line["price_per_item"]:.2f}'
+            return f'{line["quantity"] * line["price_per_item"]:.2f}'
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        return QVariant()
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        if role == Qt.DisplayRole:
+            return section + 1
+        return QVariant()
+
+    def flags(self, index):
+        flags = super(InvoiceLinesModel, self).flags(index)
+        if index.isValid() and index.column() in (self.QUANTITY, self.PRICE):
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not index.isValid() or index.column() not in (self.QUANTITY, self.PRICE):
+            return False
+        row = index.row()
+        line = self._lines[row]
+        try:
+            if index.column() == self.QUANTITY:
+                quantity, price = int(value), line["price_per_item"]
+            else:
+                quantity, price = line["quantity"], float(value)
+        except (TypeError, ValueError):
+            return False
+        if quantity <= 0 or price < 0:
+            return False
+        if price != line["price_per_item"] and self._rowOf.get((line["product_id"], line["price_per_item"])) == row:
+            del self._rowOf[(line["product_id"], line["price_per_item"])]
+            self._rowOf.setdefault((line["product_id"], price), row)
+        self._setLine(row, quantity, price)
+        return True
+
+    # ---------- editing ----------
+    def total(self):
+        return self._totalCents / 100.0
+
+    def lines(self):
+        return [dict(line) for line in self._lines]
+
+    def _addTotal(self, cents):
+        if cents:
+            self._totalCents += cents
+            self.totalChanged.emit(self.total())
+
+    def _setLine(self, row, quantity, price):
+        line = self._lines[row]
+        delta = _cents(quantity, price) - _cents(line["quantity"], line["price_per_item"])
+        line["quantity"], line["price_per_item"] = quantity, price
+        self.dataChanged.emit(self.index(row, self.QUANTITY), self.index(row, len(self.HEADERS) - 1))
+        self._addTotal(delta)
+
+    def addLine(self, product_id, product_name, quantity, price):
+        self.addLines([(product_id, product_name, quantity, price)])
+
+    def addLines(self, lines):
+        # Lines for products already on the invoice at the same price add to those lines;
+        # the rest are appended with a single insert
+        new, newRows, cents = [], {}, 0
+        for product_id, product_name, quantity, price in lines:
+            mergeKey = (product_id, price)
+            row = self._rowOf.get(mergeKey) if product_id is not None else None
+            if row is not None:
+                self._setLine(row, self._lines[row]["quantity"] + quantity, price)
+            elif product_id is not None and mergeKey in newRows:
+                new[newRows[mergeKey]]["quantity"] += quantity
+                cents += _cents(quantity, price)
+            else:
+                if product_id is not None:
+                    newRows[mergeKey] = len(new)
+                new.append({"product_id": product_id, "product_name": product_name,
+                            "quantity": quantity, "price_per_item": price})
+                cents += _cents(quantity, price)
+        if not new:
+            return
+        first = len(self._lines)
+        self.beginInsertRows(QModelIndex(), first, first + len(new) - 1)
+        self._lines.extend(new)
+        for mergeKey, offset in newRows.items():
+            self._rowOf[mergeKey] = first + offset
+        self.endInsertRows()
+        self._addTotal(cents)
+
+    def removeLines(self, rows):
+        # Contiguous runs are removed together, bottom up, so earlier row numbers stay valid
+        rows = sorted(set(rows), reverse=True)
+        if not rows:
+            return
+        cents = 0
+        while rows:
+            last = first = rows.pop(0)
+            while rows and rows[0] == first - 1:
+                first = rows.pop(0)
+            self.beginRemoveRows(QModelIndex(), first, last)
+            for line in self._lines[first:last + 1]:
+                cents -= _cents(line["quantity"], line["price_per_item"])
+            del self._lines[first:last + 1]
+            self.endRemoveRows()
+        self._rowOf = {}
+        for row, line in enumerate(self._lines):
+            if line["product_id"] is not None:
+                self._rowOf.setdefault((line["product_id"], line["price_per_item"]), row)
+        self._addTotal(cents)
+
+    def setLines(self, items):
+        self.beginResetModel()
+        self._lines, self._rowOf, self._totalCents = [], {}, 0
+        self.endResetModel()
+        self.addLines([(i["product_id"], i["product_name"], i["quantity"], i["price_per_item"]) for i in items])
+
 # -------------------- Invoice Dialog (Detailed) --------------------
 class InvoiceDialog(QDialog):
     def __init__(self, parent=None, invoiceData=None):
@@ -1445,41 +1813,54 @@ class InvoiceDialog(QDialog):
             self.setWindowTitle("Edit Invoice")
         else:
             self.setWindowTitle("Add Invoice")
-        self.invoiceItems = []  # List of dicts: {product_id, product_name, quantity, price_per_item}
+        get_index().warm()
+        self.opened = time.perf_counter()  # checkout latency runs from here to the save
         self.initUI()
         if invoiceData:
             self.loadInvoiceData()
 
     def initUI(self):
         self.formLayout = QFormLayout(self)
-        self.customerCombo = QComboBox(self)
-        self.userCombo = QComboBox(self)
-        for widget in (self.customerCombo, self.userCombo):
+        self.customerPicker = RecordPicker("customers", self)
+        self.userPicker = RecordPicker("users", self)
+        for widget in (self.customerPicker, self.userPicker):
             widget.setFont(QFont("Arial", 14))
-        self.populateCustomers()
-        self.populateUsers()
         self.paymentStatusCombo = QComboBox(self)
         self.paymentStatusCombo.setFont(QFont("Arial", 14))
         self.paymentStatusCombo.addItems(["paid", "pending"])
-        self.itemsTable = QTableWidget(0, 4, self)
-        self.itemsTable.setHorizontalHeaderLabels(["Product ID", "Product Name", "Quantity", "Price"])
+        self.scanEdit = QLineEdit(self)
+        self.scanEdit.setFont(QFont("Arial", 14))
+        self.scanEdit.setPlaceholderText("Scan or type a barcode and press Enter")
+        self.scanEdit.returnPressed.connect(self.scanBarcode)
+        self.linesModel = InvoiceLinesModel(self)
+        self.itemsTable = QTableView(self)
+        self.itemsTable.setModel(self.linesModel)
         self.itemsTable.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.itemsTable.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.itemsTable.setFont(QFont("Arial", 14))
+        # Quantity and price are edited in place; Ctrl+V pastes a list of lines
+        QShortcut(QKeySequence.Paste, self.itemsTable, self.pasteItems)
+        QShortcut(QKeySequence.Delete, self.itemsTable, self.removeInvoiceItem)
         self.addItemButton = QPushButton("Add Item")
-        self.removeItemButton = QPushButton("Remove Selected Item")
-        for btn in (self.addItemButton, self.removeItemButton):
+        self.pasteItemsButton = QPushButton("Paste Lines")
+        self.removeItemButton = QPushButton("Remove Selected Items")
+        for btn in (self.addItemButton, self.pasteItemsButton, self.removeItemButton):
             btn.setFont(QFont("Arial", 14))
             btn.setStyleSheet("padding: 8px;")
         self.addItemButton.clicked.connect(self.addInvoiceItem)
+        self.pasteItemsButton.clicked.connect(self.pasteItems)
         self.removeItemButton.clicked.connect(self.removeInvoiceItem)
         self.totalLabel = QLabel("Total Amount: 0.00")
         self.totalLabel.setFont(QFont("Arial", 14))
-        self.formLayout.addRow("Customer:", self.customerCombo)
-        self.formLayout.addRow("User:", self.userCombo)
+        self.linesModel.totalChanged.connect(lambda total: self.totalLabel.setText(f"Total Amount: {total:.2f}"))
+        self.formLayout.addRow("Customer:", self.customerPicker)
+        self.formLayout.addRow("User:", self.userPicker)
         self.formLayout.addRow("Payment Status:", self.paymentStatusCombo)
+        self.formLayout.addRow("Scan:", self.scanEdit)
         self.formLayout.addRow("Invoice Items:", self.itemsTable)
         itemsButtonsLayout = QHBoxLayout()
         itemsButtonsLayout.addWidget(self.addItemButton)
+        itemsButtonsLayout.addWidget(self.pasteItemsButton)
         itemsButtonsLayout.addWidget(self.removeItemButton)
         self.formLayout.addRow("", itemsButtonsLayout)
         self.formLayout.addRow("", self.totalLabel)
@@ -1490,128 +1871,109 @@ class InvoiceDialog(QDialog):
         self.buttonBox.rejected.connect(self.reject)
         self.formLayout.addWidget(self.buttonBox)
 
-    def populateCustomers(self):
+    def addInvoiceItem(self):
+        dialog = InvoiceItemDialog(self)
+        if dialog.exec_() == QDialog.Accepted:
+            item = dialog.getItemData()
+            if item["product_id"] is None or item["quantity"] <= 0:
+                QMessageBox.warning(self, "Warning", "Choose a product and a quantity above zero.")
+                return
+            self.linesModel.addLine(item["product_id"], item["product_name"], item["quantity"], item["price_per_item"])
+
+    def scanBarcode(self):
+        code = self.scanEdit.text().strip()
+        self.scanEdit.clear()
+        if not code:
+            return
         try:
-            conn = get_connection()
-            cur = conn.cursor()
-            cur.execute("SELECT customer_id, name FROM Customers ORDER BY name")
-            data = cur.fetchall()
-            conn.close()
-            self.customerCombo.clear()
-            if data:
-                for row in data:
-                    self.customerCombo.addItem(row["name"], row["customer_id"])
-            else:
-                self.customerCombo.addItem("No Customer Available", None)
+            product = get_index().lookup(code)
         except Exception as e:
-            QMessageBox.critical(self, "Error", f"Load customers failed:\n{e}")
+            QMessageBox.critical(self, "Error", f"Barcode lookup failed:\n{e}")
+            return
+        if product is None:
+            QMessageBox.warning(self, "Warning", f"No product with barcode {code}.")
+            return
+        # Scanning the same product again adds to its line instead of starting a new one
+        self.linesModel.addLine(product.product_id, product.name, 1, product.price)
 
-    def populateUsers(self):
+    def pasteItems(self):
+        lines, errors = parse_invoice_lines(QApplication.clipboard().text())
+        resolved = []
+        index = get_index()
         try:
-            conn = get_connection()
-            cur = conn.cursor()
-            cur.execute("SELECT user_id, username FROM Users ORDER BY username")
-            data = cur.fetchall()
-            conn.close()
-            self.userCombo.clear()
-            if data:
-                for row in data:
-                    self.userCombo.addItem(row["username"], row["user_id"])
-            else:
-                self.userCombo.addItem("No User Available", None)
+            for code, quantity, price in lines:
+                product = index.lookup(code)
+                if product is None and code.isdigit():
+                    record = run(queries.pick_record, "products", int(code), readonly=True)
+                    if record is not None:
+                        product = ProductEntry(record["id"], record["label"], record["price"], record["stock_quantity"])
+                if product is None:
+                    errors.append(f"Unknown product: {code}")
+                    continue
+                resolved.append((product.product_id, product.name, quantity,
+                                 product.price if price is None else price))
         except Exception as e:
-            QMessageBox.critical(self, "Error", f"Load users failed:\n{e}")
-
-    def addInvoiceItem(self):
-        dialog = InvoiceItemDialog(self)
-        if dialog.exec_() == QDialog.Accepted:
-            item = dialog.getItemData()
-            self.invoiceItems.append(item)
-            self.refreshItemsTable()
-            self.calculateTotal()
+            QMessageBox.critical(self, "Error", f"Product lookup failed:\n{e}")
+            return
+        self.linesModel.addLines(resolved)
+        if errors:
+            QMessageBox.warning(self, "Paste Lines", f"{len(resolved)} lines added, {len(errors)} skipped:\n"
+                                + "\n".join(errors[:10]))
+        elif not resolved:
+            QMessageBox.information(self, "Paste Lines", "The clipboard holds no invoice lines "
+                                    "(one \"code, quantity[, price]\" per line).")
 
     def removeInvoiceItem(self):
-        selected = self.itemsTable.selectedItems()
-        if not selected:
+        rows = [index.row() for index in self.itemsTable.selectionModel().selectedRows()]
+        if not rows:
             QMessageBox.warning(self, "Warning", "Select an item to remove.")
             return
-        row = selected[0].row()
-        del self.invoiceItems[row]
-        self.refreshItemsTable()
-        self.calculateTotal()
-
-    def refreshItemsTable(self):
-        self.itemsTable.setRowCount(0)
-        for item in self.invoiceItems:
-            rowPos = self.itemsTable.rowCount()
-            self.itemsTable.insertRow(rowPos)
-            self.itemsTable.setItem(rowPos, 0, QTableWidgetItem(str(item["product_id"])))
-            self.itemsTable.setItem(rowPos, 1, QTableWidgetItem(item["product_name"]))
-            self.itemsTable.setItem(rowPos, 2, QTableWidgetItem(str(item["quantity"])))
-            self.itemsTable.setItem(rowPos, 3, QTableWidgetItem(f'{item["price_per_item"]:.2f}'))
-
-    def calculateTotal(self):
-        total = sum(item["quantity"] * item["price_per_item"] for item in self.invoiceItems)
-        self.totalLabel.setText(f"Total Amount: {total:.2f}")
+        self.linesModel.removeLines(rows)
 
     def loadInvoiceData(self):
-        self.customerCombo.setCurrentIndex(self.customerCombo.findData(self.invoiceData.get("customer_id")))
-        self.userCombo.setCurrentIndex(self.userCombo.findData(self.invoiceData.get("user_id")))
         status = self.invoiceData.get("payment_status", "pending")
         self.paymentStatusCombo.setCurrentIndex(self.paymentStatusCombo.findText(status))
         try:
-            conn = get_connection()
-            cur = conn.cursor()
-            cur.execute("""
-                SELECT ii.product_id, p.name as product_name, ii.quantity, ii.price_per_item 
-                FROM Invoice_Items ii JOIN Products p ON ii.product_id = p.product_id 
-                WHERE invoice_id = ?
-            """, (self.invoiceData.get("invoice_id"),))
-            items = cur.fetchall()
-            conn.close()
-            self.invoiceItems = [dict(i) for i in items]
-            self.refreshItemsTable()
-            self.calculateTotal()
+            self.customerPicker.setRecordId(self.invoiceData.get("customer_id"))
+            self.userPicker.setRecordId(self.invoiceData.get("user_id"))
+            items = run(queries.fetch_invoice_items, self.invoiceData.get("invoice_id"), readonly=True)
+            self.linesModel.setLines([dict(i) for i in items])
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Load invoice items failed:\n{e}")
 
     def saveInvoice(self):
-        customer_id = self.customerCombo.currentData()
-        user_id = self.userCombo.currentData()
+        customer_id = self.customerPicker.currentData()
+        user_id = self.userPicker.currentData()
         payment_status = self.paymentStatusCombo.currentText()
-        total = sum(item["quantity"] * item["price_per_item"] for item in self.invoiceItems)
-        if not customer_id or not user_id or not self.invoiceItems:
+        items = self.linesModel.lines()
+        if not customer_id or not user_id or not items:
             QMessageBox.critical(self, "Error", "Select a valid customer, user and add at least one item.")
             return
-        try:
-            conn = get_connection()
-            cur = conn.cursor()
-            if self.invoiceData:
-                invoice_id = self.invoiceData.get("invoice_id")
-                cur.execute("""
-                    UPDATE Invoices
-                    SET customer_id = ?, user_id = ?, total_amount = ?, payment_status = ?
-                    WHERE invoice_id = ?
-                """, (customer_id, user_id, total, payment_status, invoice_id))
-                cur.execute("DELETE FROM Invoice_Items WHERE invoice_id = ?", (invoice_id,))
-            else:
-                cur.execute("""
-                    INSERT INTO Invoices (customer_id, user_id, total_amount, payment_status)
-                    VALUES (?, ?, ?, ?)
-                """, (customer_id, user_id, total, payment_status))
-                invoice_id = cur.lastrowid
-            for item in self.invoiceItems:
-                cur.execute("""
-                    INSERT INTO Invoice_Items (invoice_id, product_id, quantity, price_per_item)
-                    VALUES (?, ?, ?, ?)
-                """, (invoice_id, item["product_id"], item["quantity"], item["price_per_item"]))
-            conn.commit()
-            conn.close()
-            QMessageBox.information(self, "Success", "Invoice saved!")
-            self.accept()
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Save invoice failed:\n{e}")
-            self.reject()
+        invoice_id = self.invoiceData.get("invoice_id") if self.invoiceData else None
+        # The write runs on a worker so a locked database cannot freeze the window
+        self.buttonBox.setEnabled(False)
+        self.saveStarted = time.perf_counter()
+        get_executor().submit(stock.save_invoice, invoice_id, customer_id, user_id, payment_status,
+                              items, readonly=False,
+                              onResult=self._invoiceSaved, onError=self._invoiceSaveFailed)
+
+    def _invoiceSaved(self, invoice_id):
+        now = time.perf_counter()
+        metrics.INVOICE_SAVE_SECONDS.observe(now - self.saveStarted)
+        metrics.INVOICES_SAVED.labels("ok").inc()
+        if not self.invoiceData:
+            metrics.CHECKOUT_SECONDS.observe(now - self.opened)
+        QMessageBox.information(self, "Success", "Invoice saved!")
+        self.accept()
+
+    def _invoiceSaveFailed(self, error):
+        # The dialog stays open with its lines so the cashier can fix them and save again
+        metrics.INVOICES_SAVED.labels("error").inc()
+        self.buttonBox.setEnabled(True)
+        if isinstance(error, stock.InsufficientStock) or getattr(error, "type", None) == "InsufficientStock":
+            QMessageBox.warning(self, "Not Enough Stock", f"{error}\nReduce the quantity or remove the line.")
+            return
+        QMessageBox.critical(self, "Error", f"Save invoice failed:\n{error}")
 
 # -------------------- Invoice Item Dialog --------------------
 class InvoiceItemDialog(QDialog):
@@ -1622,15 +1984,14 @@ class InvoiceItemDialog(QDialog):
 
     def initUI(self):
         self.formLayout = QFormLayout(self)
-        self.productCombo = QComboBox(self)
-        self.productCombo.setFont(QFont("Arial", 14))
-        self.populateProducts()
+        self.productPicker = RecordPicker("products", self)
+        self.productPicker.setFont(QFont("Arial", 14))
         self.quantityEdit = QLineEdit(self)
         self.quantityEdit.setFont(QFont("Arial", 14))
-        self.priceLabel = QLabel("")
+        self.priceLabel = QLabel("0.00")
         self.priceLabel.setFont(QFont("Arial", 14))
-        self.productCombo.currentIndexChanged.connect(self.updatePrice)
-        self.formLayout.addRow("Product:", self.productCombo)
+        self.productPicker.recordChanged.connect(self.updatePrice)
+        self.formLayout.addRow("Product:", self.productPicker)
         self.formLayout.addRow("Quantity:", self.quantityEdit)
         self.formLayout.addRow("Price per Unit:", self.priceLabel)
         self.buttonBox = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel, self)
@@ -1640,42 +2001,174 @@ class InvoiceItemDialog(QDialog):
         self.buttonBox.rejected.connect(self.reject)
         self.formLayout.addWidget(self.buttonBox)
 
-    def populateProducts(self):
-        try:
-            conn = get_connection()
-            cur = conn.cursor()
-            cur.execute("SELECT product_id, name, price FROM Products ORDER BY name")
-            products = cur.fetchall()
-            conn.close()
-            self.productCombo.clear()
-            if products:
-                for p in products:
-                    display = f'{p["name"]} (${p["price"]:.2f})'
-                    self.productCombo.addItem(display, (p["product_id"], p["price"]))
-            else:
-                self.productCombo.addItem("No Product Available", None)
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Load products failed:\n{e}")
-
-    def updatePrice(self):
-        data = self.productCombo.currentData()
-        if data:
-            self.priceLabel.setText(f'{data[1]:.2f}')
+    def updatePrice(self, product):
+        if product is not None:
+            self.priceLabel.setText(f'{product["price"]:.2f}')
         else:
             self.priceLabel.setText("0.00")
 
     def getItemData(self):
-        data = self.productCombo.currentData()
-        if data:
-            product_id, price = data
-        else:
-            product_id, price = None, 0.0
+        product = self.productPicker.currentRecord()
         try:
             quantity = int(self.quantityEdit.text())
         except:
             quantity = 0
-        product_name = self.productCombo.currentText().split(" ($")[0]
-        return {"product_id": product_id, "product_name": product_name, "quantity": quantity, "price_per_item": price}
+        if product is None:
+            return {"product_id": None, "product_name": "", "quantity": quantity, "price_per_item": 0.0}
+        return {"product_id": product["id"], "product_name": product["label"], "quantity": quantity,
+                "price_per_item": product["price"]}
+
+# -------------------- Range Filter Dialog --------------------
+def _day(text):
+    return datetime.date.fromisoformat(text).isoformat()
+
+
+def _dayAfter(text):
+    # created_at holds date and time, so "to" a day means before the next one
+    return (datetime.date.fromisoformat(text) + datetime.timedelta(days=1)).isoformat()
+
+
+# table -> [(label, column, operator, convert)]; every field left empty is ignored
+RANGE_FILTERS = {
+    "Products": [("Price from", "price", ">=", float), ("Price to", "price", "<=", float),
+                 ("Created from", "created_at", ">=", _day), ("Created to", "created_at", "<", _dayAfter),
+                 ("Stock below", "stock_quantity", "<", int)],
+    "Invoices": [("Total from", "total_amount", ">=", float), ("Total to", "total_amount", "<=", float),
+                 ("Created from", "created_at", ">=", _day), ("Created to", "created_at", "<", _dayAfter),
+                 ("Payment status", "payment_status", "=", str)],
+}
+
+
+class RangeFilterDialog(QDialog):
+    def __init__(self, table, texts=None, parent=None):
+        super(RangeFilterDialog, self).__init__(parent)
+        self.setWindowTitle(f"Filter {table}")
+        self.fields = RANGE_FILTERS[table]
+        self.texts = texts or {}
+        self.filters = ([], {})
+        self.initUI()
+
+    def initUI(self):
+        self.formLayout = QFormLayout(self)
+        self.edits = {}
+        for label, column, op, convert in self.fields:
+            edit = QLineEdit(self.texts.get(label, ""), self)
+            edit.setFont(QFont("Arial", 14))
+            if convert in (_day, _dayAfter):
+                edit.setPlaceholderText("YYYY-MM-DD")
+            self.edits[label] = edit
+            self.formLayout.addRow(f"{label}:", edit)
+        self.buttonBox = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Reset | QDialogButtonBox.Cancel, self)
+        self.buttonBox.accepted.connect(self.applyFilters)
+        self.buttonBox.rejected.connect(self.reject)
+        self.buttonBox.button(QDialogButtonBox.Reset).clicked.connect(self.clearFilters)
+        self.formLayout.addWidget(self.buttonBox)
+
+    def clearFilters(self):
+        for edit in self.edits.values():
+            edit.clear()
+
+    def applyFilters(self):
+        filters, texts = [], {}
+        for label, column, op, convert in self.fields:
+            text = self.edits[label].text().strip()
+            if not text:
+                continue
+            try:
+                filters.append([column, op, convert(text)])
+            except ValueError:
+                QMessageBox.critical(self, "Error", f"Invalid value for {label}: {text}")
+                return
+            texts[label] = text
+        self.filters = (filters, texts)
+        self.accept()
+
+    def getFilters(self):
+        return self.filters
+
+# -------------------- Batch Export Dialog --------------------
+class BatchExportDialog(QDialog):
+    def __init__(self, parent=None):
+        super(BatchExportDialog, self).__init__(parent)
+        self.setWindowTitle("Batch Export Invoice PDFs")
+        self.initUI()
+
+    def initUI(self):
+        self.formLayout = QFormLayout(self)
+        today = QDate.currentDate()
+        self.fromEdit = QDateEdit(today.addMonths(-1), self)
+        self.fromEdit.setCalendarPopup(True)
+        self.toEdit = QDateEdit(today, self)
+        self.toEdit.setCalendarPopup(True)
+        self.dirEdit = QLineEdit(pdf_export.BATCH_DIR, self)
+        btnBrowse = QPushButton("Browse...")
+        btnBrowse.clicked.connect(self.chooseDirectory)
+        dirLayout = QHBoxLayout()
+        dirLayout.addWidget(self.dirEdit)
+        dirLayout.addWidget(btnBrowse)
+        self.formLayout.addRow("From:", self.fromEdit)
+        self.formLayout.addRow("To:", self.toEdit)
+        self.formLayout.addRow("Directory:", dirLayout)
+        self.buttonBox = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel, self)
+        self.buttonBox.accepted.connect(self.accept)
+        self.buttonBox.rejected.connect(self.reject)
+        self.formLayout.addWidget(self.buttonBox)
+
+    def chooseDirectory(self):
+        directory = QFileDialog.getExistingDirectory(self, "Export Invoice PDFs", self.dirEdit.text())
+        if directory:
+            self.dirEdit.setText(directory)
+
+    def getRange(self):
+        return (self.fromEdit.date().toString("yyyy-MM-dd"), self.toEdit.date().toString("yyyy-MM-dd"),
+                self.dirEdit.text().strip() or pdf_export.BATCH_DIR)
+
+# -------------------- Diagnostics Dialog --------------------
+class DiagnosticsDialog(QDialog):
+    # SQL statement totals of this session and the slow-query log (see sql_trace.py)
+    STATEMENT_COLUMNS = ["calls", "total_ms", "mean_ms", "max_ms", "rows", "slow", "full_scan", "site", "sql"]
+    SLOW_COLUMNS = ["calls", "total_ms", "max_ms", "full_scan", "site", "sql", "plan"]
+
+    def __init__(self, parent=None):
+        super(DiagnosticsDialog, self).__init__(parent)
+        self.setWindowTitle("SQL Diagnostics")
+        self.resize(1100, 600)
+        self.initUI()
+        self.refresh()
+
+    def initUI(self):
+        layout = QVBoxLayout(self)
+        if not sql_trace.enabled():
+            notice = QLabel("SQL tracing is off. Start the application with --trace-sql [MS] to time every "
+                            "statement and log those slower than MS milliseconds.")
+            notice.setWordWrap(True)
+            layout.addWidget(notice)
+        self.tabs = QTabWidget(self)
+        self.statementsTable = QTableView()
+        self.slowTable = QTableView()
+        for title, view in [("Statements", self.statementsTable), ("Slow Query Log", self.slowTable)]:
+            view.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+            view.horizontalHeader().setStretchLastSection(True)
+            view.setSelectionBehavior(QAbstractItemView.SelectRows)
+            self.tabs.addTab(view, title)
+        layout.addWidget(self.tabs)
+        buttons = QHBoxLayout()
+        for text, slot in [("Refresh", self.refresh), ("Reset Totals", self.resetTotals), ("Close", self.accept)]:
+            btn = QPushButton(text)
+            btn.clicked.connect(slot)
+            buttons.addWidget(btn)
+        buttons.insertStretch(2)
+        layout.addLayout(buttons)
+
+    def refresh(self):
+        self.statementsTable.setModel(TableModel(sql_trace.snapshot(), self.STATEMENT_COLUMNS))
+        slow = [dict(group, full_scan=", ".join(group["full_scan"]), plan="; ".join(group["plan"]))
+                for group in sql_trace.read_slow_log()]
+        self.slowTable.setModel(TableModel(slow, self.SLOW_COLUMNS))
+
+    def resetTotals(self):
+        sql_trace.reset()
+        self.refresh()
 
 # -------------------- Add User Dialog --------------------
 class AddUserDialog(QDialog):
@@ -1703,12 +2196,9 @@ class AddUserDialog(QDialog):
 
     def addUser(self):
         try:
-            conn = get_connection()
-            cur = conn.cursor()
-            cur.execute("INSERT INTO Users (username, password_hash, role) VALUES (?, ?, ?)",
-                        (self.usernameEdit.text(), self.passwordEdit.text(), self.roleCombo.currentText()))
-            conn.commit()
-            conn.close()
+            run(queries.insert_record, "Users", {"username": self.usernameEdit.text(),
+                                                 "password_hash": self.passwordEdit.text(),
+                                                 "role": self.roleCombo.currentText()})
             QMessageBox.information(self, "Success", "User added!")
             self.accept()
         except Exception as e:
@@ -1743,16 +2233,10 @@ class EditUserDialog(QDialog):
 
     def updateUser(self):
         try:
-            conn = get_connection()
-            cur = conn.cursor()
-            if self.passwordEdit.text().strip() == "":
-                cur.execute("UPDATE Users SET username = ?, role = ? WHERE user_id = ?",
-                            (self.usernameEdit.text(), self.roleCombo.currentText(), self.userData.get("user_id")))
-            else:
-                cur.execute("UPDATE Users SET username = ?, password_hash = ?, role = ? WHERE user_id = ?",
-                            (self.usernameEdit.text(), self.passwordEdit.text(), self.roleCombo.currentText(), self.userData.get("user_id")))
-            conn.commit()
-            conn.close()
+            values = {"username": self.usernameEdit.text(), "role": self.roleCombo.currentText()}
+            if self.passwordEdit.text().strip() != "":
+                values["password_hash"] = self.passwordEdit.text()
+            run(queries.update_record, "Users", self.userData.get("user_id"), values)
             QMessageBox.information(self, "Success", "User updated!")
             self.accept()
         except Exception as e:
@@ -1761,13 +2245,35 @@ class EditUserDialog(QDialog):
 
 # -------------------- Main --------------------
 def main():
-    app = QApplication(sys.argv)
+    # --server host:port (or POS_SERVER) runs this station as a client of pos_server.py,
+    # authenticated with --token (or POS_TOKEN)
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--server", default=os.environ.get("POS_SERVER"))
+    parser.add_argument("--token", default=os.environ.get("POS_TOKEN"))
+    # --trace-sql [MS] times every statement for the SQL Diagnostics dialog (Ctrl+Shift+D)
+    parser.add_argument("--trace-sql", nargs="?", type=float, const=sql_trace.SLOW_THRESHOLD_MS)
+    # --metrics-port PORT serves Prometheus metrics on localhost; --metrics-file [PATH] keeps a rolling snapshot
+    parser.add_argument("--metrics-port", type=int)
+    parser.add_argument("--metrics-file", nargs="?", const=metrics.SNAPSHOT_FILE)
+    args, qtArgs = parser.parse_known_args()
+    if args.trace_sql is not None:
+        sql_trace.enable(args.trace_sql)
+    if args.metrics_port is not None or args.metrics_file:
+        metrics.enable(args.metrics_port, args.metrics_file)
+    if args.server:
+        import pos_client
+        pos_client.connect(args.server, args.token)
+    else:
+        init_db()
+    app = QApplication(sys.argv[:1] + qtArgs)
     style = qdarkstyle.load_stylesheet_pyqt5() + """
         QLineEdit, QComboBox, QLabel, QTableWidget, QTableView { font-size: 14px; }
         QPushButton { font-size: 14px; padding: 8px; }
         QTabBar::tab { padding: 10px; margin: 2px; }
     """
     app.setStyleSheet(style)
+    app.aboutToQuit.connect(get_executor().shutdown)
+    app.aboutToQuit.connect(close_pool)
     window = MainWindow()
     window.show()
     sys.exit(app.exec_())
@@ -0,0 +1,191 @@
+import csv, time
+from itertools import islice
+
+import changes
+import connection
+import search
+import stock
+from barcode_service import new_barcode_code
+
+# -------------------- Bulk CSV Import --------------------
+# Streams a CSV file in fixed-size batches. Each batch is validated in Python (types,
+# required fields, foreign keys checked against in-memory id sets) and written with a
+# single executemany() in its own short transaction on the pool's writer, which is given
+# back between batches so the GUI (or another client) can write while a long import runs.
+
+BATCH_SIZE = 10000
+MAX_REPORTED_ERRORS = 50
+
+# kind -> (table, {column: converter}, required columns, {fk column: (table, key)})
+IMPORT_SPECS = {
+    "products": ("Products",
+                 {"product_id": int, "name": str, "category_id": int, "supplier_id": int,
+                  "price": float, "stock_quantity": int, "barcode": str, "created_at": str},
+                 ("name", "price", "stock_quantity"),
+                 {"category_id": ("Categories", "category_id"), "supplier_id": ("Suppliers", "supplier_id")}),
+    "customers": ("Customers",
+                  {"customer_id": int, "name": str, "email": str, "phone_number": str, "address": str},
+                  ("name",), {}),
+    "suppliers": ("Suppliers",
+                  {"supplier_id": int, "name": str, "contact_name": str, "contact_email": str, "phone_number": str},
+                  ("name",), {}),
+}
+# "replace" is an upsert on the first of these columns the file provides: existing rows are
+# updated in place (never deleted and re-inserted, which would cascade to their invoice
+# lines and stock ledger), and stock changes on existing products are logged as adjustments
+UPSERT_KEYS = {"products": ("product_id", "barcode"), "customers": ("customer_id",), "suppliers": ("supplier_id",)}
+CONFLICT_CLAUSES = {"abort": "INSERT", "ignore": "INSERT OR IGNORE", "replace": "INSERT"}
+LOOKUP_CHUNK = 500  # keys per IN (...) when finding the rows a batch updates
+
+
+class ImportResult:
+    def __init__(self, table):
+        self.table = table
+        self.read = 0
+        self.inserted = 0
+        self.updated = 0
+        self.rejected = 0
+        self.errors = []
+        self.elapsed = 0.0
+
+    def reject(self, line, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"line {line}: {message}")
+
+    def rowsPerSecond(self):
+        return (self.inserted + self.updated) / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (f"{self.table}: {self.inserted} inserted, {self.updated} updated, {self.rejected} rejected "
+                f"of {self.read} rows in {self.elapsed:.2f}s ({self.rowsPerSecond():,.0f} rows/s)")
+
+
+def load_ids(conn, kind, column):
+    # Keys of the table `column` of an import kind refers to
+    fkTable, fkKey = IMPORT_SPECS[kind][3][column]
+    return [row[0] for row in conn.execute(f"SELECT {fkKey} FROM {fkTable}")]
+
+
+def _existing(conn, table, key, values):
+    # -> {key value: (product_id, stock_quantity)} for rows of the batch that are already stored
+    found = {}
+    values = list({v for v in values if v is not None})
+    extra = ", product_id, stock_quantity" if table == "Products" else ""
+    for i in range(0, len(values), LOOKUP_CHUNK):
+        chunk = values[i:i + LOOKUP_CHUNK]
+        for row in conn.execute(f"SELECT {key}{extra} FROM {table} WHERE {key} IN ({', '.join('?' * len(chunk))})",
+                                chunk):
+            found[row[0]] = tuple(row[1:])
+    return found
+
+
+def write_batch(conn, kind, columns, rows, onConflict="ignore", generated=()):
+    # One batch in one transaction -> [inserted, updated]. `generated` columns were filled in
+    # by the importer (new barcodes) and are not copied onto rows that already exist.
+    table, converters, required, foreignKeys = IMPORT_SPECS[kind]
+    unknown = [c for c in columns if c not in converters]
+    if unknown:
+        raise ValueError(f"Unknown {table} columns: {', '.join(unknown)}")
+    sql = (f"{CONFLICT_CLAUSES[onConflict]} INTO {table} ({', '.join(columns)}) "
+           f"VALUES ({', '.join('?' * len(columns))})")
+    key = next((c for c in UPSERT_KEYS[kind] if c in columns and c not in generated), None)
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    if onConflict != "replace" or key is None:
+        cur = conn.executemany(sql, rows)
+        changes.record(table)
+        return [cur.rowcount, 0]
+    keyIndex = columns.index(key)
+    existing = _existing(conn, table, key, [row[keyIndex] for row in rows])
+    assignments = [f"{c} = excluded.{c}" for c in columns if c not in (key, "stock_quantity") and c not in generated]
+    sql += f" ON CONFLICT({key}) DO " + (f"UPDATE SET {', '.join(assignments)}" if assignments else "NOTHING")
+    cur = conn.executemany(sql, rows)
+    updated = sum(1 for row in rows if row[keyIndex] in existing)
+    if table == "Products" and "stock_quantity" in columns:
+        # New products open their ledger through the insert trigger; existing ones move by the difference
+        stockIndex = columns.index("stock_quantity")
+        target = {existing[row[keyIndex]][0]: row[stockIndex] for row in rows if row[keyIndex] in existing}
+        old = {productId: quantity for productId, quantity in existing.values()}
+        stock.apply_movements(conn, {pid: quantity - old[pid] for pid, quantity in target.items()}, "Adjustment")
+    changes.record(table)
+    return [max(cur.rowcount - updated, 0), updated]
+
+
+def restore_search_index(conn, table):
+    search.create_triggers(conn, table)
+    search.rebuild(conn, [table])
+
+
+def import_csv(kind, path, batchSize=BATCH_SIZE, onConflict="ignore", deferSearchIndex=False, progress=None):
+    # Reads and writes go through connection.run(), one short unit of work each, so no pooled
+    # connection is held for the length of the import
+    table, converters, required, foreignKeys = IMPORT_SPECS[kind]
+    result = ImportResult(table)
+    started = time.perf_counter()
+    knownIds = {col: set(connection.run(load_ids, kind, col, readonly=True)) for col in foreignKeys}
+    indexed = table in search.FTS_TABLES and connection.run(search.has_index, table, readonly=True)
+    if deferSearchIndex and indexed:
+        # Per-row index triggers dominate large loads; rebuild the index once at the end instead
+        connection.run(search.drop_triggers, table)
+    try:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.reader(f)
+            header = [h.strip() for h in next(reader, [])]
+            columns = [c for c in header if c in converters]
+            generated = []
+            if table == "Products" and "barcode" not in columns:
+                columns.append("barcode")
+                generated.append("barcode")
+            missing = [c for c in required if c not in columns]
+            if missing:
+                raise ValueError(f"{path} is missing required columns: {', '.join(missing)}")
+            # Per-column work is resolved once here rather than per row
+            plan = [(header.index(c) if c in header else None, c, None if converters[c] is str else converters[c],
+                     c in required, knownIds.get(c)) for c in columns]
+            line = 1
+            while True:
+                chunk = list(islice(reader, batchSize))
+                if not chunk:
+                    break
+                batch = []
+                for record in chunk:
+                    line += 1
+                    result.read += 1
+                    row = _convert(record, plan, result, line)
+                    if row is not None:
+                        batch.append(row)
+                inserted, updated = connection.run(write_batch, kind, columns, batch, onConflict, generated)
+                result.inserted += inserted
+                result.updated += updated
+                result.rejected += len(batch) - inserted - updated  # skipped by OR IGNORE
+                if progress is not None:
+                    progress(result)
+    finally:
+        if deferSearchIndex and indexed:
+            connection.run(restore_search_index, table)
+        result.elapsed = time.perf_counter() - started
+    return result
+
+
+def _convert(record, plan, result, line):
+    row = []
+    for index, col, convert, isRequired, ids in plan:
+        value = record[index].strip() if index is not None and index < len(record) else ""
+        if value == "":
+            if isRequired:
+                result.reject(line, f"{col} is required")
+                return None
+            row.append(new_barcode_code() if col == "barcode" else None)
+            continue
+        if convert is not None:
+            try:
+                value = convert(value)
+            except ValueError:
+                result.reject(line, f"{col} has invalid value {value!r}")
+                return None
+        if ids is not None and value not in ids:
+            result.reject(line, f"{col} {value} does not exist")
+            return None
+        row.append(value)
+    return row
@@ -0,0 +1,337 @@
+import atexit, bisect, json, os, threading, time
+from contextlib import nullcontext
+
+# -------------------- Metrics --------------------
+# Counters, gauges and histograms for watching a terminal in operation: checkout latency,
+# invoice saves, database lock waits, GUI freezes. enable() turns recording on and can
+# serve the values in Prometheus text format on a localhost port and append a snapshot
+# to a JSON-lines file at an interval (rotated when it grows past SNAPSHOT_MAX_BYTES).
+#
+# Until enable() is called every update returns after one flag check, so call sites are
+# instrumented unconditionally.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SNAPSHOT_FILE = "metrics.jsonl"
+SNAPSHOT_INTERVAL = 60.0
+SNAPSHOT_MAX_BYTES = 5 * 1024 * 1024
+
+_enabled = False
+_registry = {}  # name -> metric, in registration order
+_registryLock = threading.Lock()
+_NULL = nullcontext()
+
+
+def enabled():
+    return _enabled
+
+
+# ---------- metric types ----------
+class _Timer:
+    __slots__ = ("target", "started")
+
+    def __init__(self, target):
+        self.target = target
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.target.observe(time.perf_counter() - self.started)
+        return False
+
+
+class _CounterValue:
+    __slots__ = ("value", "lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        if not _enabled:
+            return
+        with self.lock:
+            self.value += amount
+
+    def sample(self):
+        return {"value": self.value}
+
+
+class _GaugeValue(_CounterValue):
+    __slots__ = ()
+
+    def set(self, value):
+        if _enabled:
+            self.value = value
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count", "lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # per bucket, the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        if not _enabled:
+            return
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        # with histogram.time(): ... observes the block's duration in seconds
+        return _Timer(self) if _enabled else _NULL
+
+    def sample(self):
+        with self.lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative, running = [], 0
+        for n in counts:
+            running += n
+            cumulative.append(running)
+        return {"buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], cumulative)),
+                "sum": total, "count": count}
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labelNames = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        if not self.labelNames:
+            self._default = self.labels()
+
+    def _newValue(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        value = self._values.get(values)
+        if value is None:
+            if len(values) != len(self.labelNames):
+                raise ValueError(f"{self.name} takes labels {self.labelNames}, got {values}.")
+            with self._lock:
+                value = self._values.setdefault(values, self._newValue())
+        return value
+
+    def samples(self):
+        # -> [(label dict, sample dict)]
+        return [(dict(zip(self.labelNames, values)), value.sample()) for values, value in list(self._values.items())]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _newValue(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), function=None):
+        super().__init__(name, help, labels)
+        self.function = function  # read at collection time instead of set()
+
+    def _newValue(self):
+        return _GaugeValue()
+
+    def set(self, value):
+        self._default.set(value)
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def dec(self, amount=1):
+        self._default.dec(amount)
+
+    def samples(self):
+        if self.function is not None:
+            try:
+                return [({}, {"value": float(self.function())})]
+            except Exception:
+                return []
+        return super().samples()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labels)
+
+    def _newValue(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+
+def _register(metric):
+    with _registryLock:
+        if metric.name in _registry:
+            raise ValueError(f"Metric {metric.name} is already registered.")
+        _registry[metric.name] = metric
+    return metric
+
+
+def counter(name, help, labels=()):
+    return _register(Counter(name, help, labels))
+
+
+def gauge(name, help, labels=(), function=None):
+    return _register(Gauge(name, help, labels, function))
+
+
+def histogram(name, help, labels=(), buckets=DEFAULT_BUCKETS):
+    return _register(Histogram(name, help, labels, buckets))
+
+
+# ---------- exposition ----------
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labelText(labels, extra=None):
+    pairs = list(labels.items()) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def render():
+    # Prometheus text exposition format, version 0.0.4
+    lines = []
+    for metric in list(_registry.values()):
+        lines.append(f"# HELP {metric.name} {_escape(metric.help)}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for labels, sample in metric.samples():
+            if metric.kind == "histogram":
+                for bound, count in sample["buckets"].items():
+                    lines.append(f"{metric.name}_bucket{_labelText(labels, ('le', bound))} {count}")
+                lines.append(f"{metric.name}_sum{_labelText(labels)} {_number(sample['sum'])}")
+                lines.append(f"{metric.name}_count{_labelText(labels)} {sample['count']}")
+            else:
+                lines.append(f"{metric.name}{_labelText(labels)} {_number(sample['value'])}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot():
+    import socket
+    return {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "host": socket.gethostname(), "pid": os.getpid(),
+            "metrics": {metric.name: [dict(labels=labels, **sample) for labels, sample in metric.samples()]
+                        for metric in list(_registry.values())}}
+
+
+def serve(port, host="127.0.0.1"):
+    # GET http://host:port/metrics on a daemon thread; returns the server. http.server is
+    # imported here so that importing this module (which connection.py does) stays cheap.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def write_snapshot(path=SNAPSHOT_FILE, maxBytes=SNAPSHOT_MAX_BYTES):
+    # Appends one line; a file past maxBytes is moved to path + ".1" first
+    try:
+        if os.path.getsize(path) > maxBytes:
+            os.replace(path, path + ".1")
+    except OSError:
+        pass
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(snapshot(), separators=(",", ":")) + "\n")
+
+
+def _snapshotLoop(path, interval, stop):
+    while not stop.wait(interval):
+        try:
+            write_snapshot(path)
+        except OSError:
+            pass
+
+
+def enable(port=None, snapshotPath=None, interval=SNAPSHOT_INTERVAL):
+    global _enabled
+    _enabled = True
+    server = serve(port) if port is not None else None
+    if snapshotPath:
+        stop = threading.Event()
+        threading.Thread(target=_snapshotLoop, args=(snapshotPath, interval, stop), name="metrics-snapshot",
+                         daemon=True).start()
+        # A last snapshot on the way out, so a short session is not lost
+        atexit.register(lambda: (stop.set(), write_snapshot(snapshotPath)))
+    return server
+
+
+def _resident_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # peak, where statm is missing
+
+
+# -------------------- Application Metrics --------------------
+CHECKOUT_SECONDS = histogram("pos_checkout_seconds", "Time from opening a new invoice to saving it",
+                             buckets=(5, 10, 20, 30, 45, 60, 90, 120, 180, 300, 600))
+INVOICE_SAVE_SECONDS = histogram("pos_invoice_save_seconds", "Time to write an invoice, queueing included")
+INVOICES_SAVED = counter("pos_invoices_saved_total", "Invoice saves by result", ["result"])
+TABLE_LOAD_SECONDS = histogram("pos_table_load_seconds", "Time until a table view shows its first page",
+                               ["table", "action"])
+PDF_EXPORT_SECONDS = histogram("pos_pdf_export_seconds", "Time to export invoice PDFs", ["kind"])
+PDF_EXPORTS = counter("pos_pdf_exports_total", "Invoice PDF exports by result", ["kind", "result"])
+BARCODE_RENDER_SECONDS = histogram("pos_barcode_render_seconds", "Time to draw one barcode", ["target"],
+                                   buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+BARCODES_GENERATED = counter("pos_barcodes_generated_total", "Barcodes created or rendered to files", ["kind"])
+DB_LOCK_WAIT_SECONDS = histogram("pos_db_lock_wait_seconds",
+                                 "Waits for the writer connection (pool) or the database write lock (database)",
+                                 ["lock"], buckets=(0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0))
+EVENT_LOOP_LAG_SECONDS = histogram("pos_event_loop_lag_seconds",
+                                   "How late the GUI thread ran a periodic timer; long lags are freezes",
+                                   buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+RESIDENT_MEMORY = gauge("process_resident_memory_bytes", "Resident memory of this process",
+                        function=_resident_bytes)
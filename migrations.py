@@ -0,0 +1,191 @@
+import sqlite3
+import powerbi_export
+import search
+import summary
+import stock
+
+# -------------------- Schema Migrations --------------------
+# Each migration moves the schema up one version. PRAGMA user_version records the
+# last version applied, so startup only runs what an existing database is missing.
+
+def run_script(conn, script):
+    # executescript() would commit the surrounding transaction, so run statements one by one
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            conn.execute(statement)
+            statement = ""
+    if statement.strip():
+        conn.execute(statement)
+
+
+def _v1_base_schema(conn):
+    run_script(conn, """
+    CREATE TABLE IF NOT EXISTS Categories (
+        category_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        category_name TEXT UNIQUE NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS Suppliers (
+        supplier_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        contact_name TEXT,
+        contact_email TEXT,
+        phone_number TEXT
+    );
+    CREATE TABLE IF NOT EXISTS Products (
+        product_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        category_id INTEGER,
+        supplier_id INTEGER,
+        price REAL NOT NULL,
+        stock_quantity INTEGER NOT NULL,
+        barcode TEXT UNIQUE,
+        created_at TEXT DEFAULT (datetime('now')),
+        FOREIGN KEY (category_id) REFERENCES Categories(category_id) ON DELETE SET NULL,
+        FOREIGN KEY (supplier_id) REFERENCES Suppliers(supplier_id) ON DELETE SET NULL
+    );
+    CREATE TABLE IF NOT EXISTS Customers (
+        customer_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        email TEXT UNIQUE,
+        phone_number TEXT,
+        address TEXT
+    );
+    CREATE TABLE IF NOT EXISTS Users (
+        user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password_hash TEXT,
+        role TEXT CHECK(role IN ('admin', 'cashier')) NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS Invoices (
+        invoice_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        customer_id INTEGER,
+        user_id INTEGER,
+        total_amount REAL NOT NULL,
+        payment_status TEXT CHECK(payment_status IN ('paid','pending')) NOT NULL,
+        created_at TEXT DEFAULT (datetime('now')),
+        FOREIGN KEY (customer_id) REFERENCES Customers(customer_id) ON DELETE SET NULL,
+        FOREIGN KEY (user_id) REFERENCES Users(user_id) ON DELETE SET NULL
+    );
+    CREATE TABLE IF NOT EXISTS Invoice_Items (
+        item_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        invoice_id INTEGER,
+        product_id INTEGER,
+        quantity INTEGER NOT NULL,
+        price_per_item REAL NOT NULL,
+        FOREIGN KEY (invoice_id) REFERENCES Invoices(invoice_id) ON DELETE CASCADE,
+        FOREIGN KEY (product_id) REFERENCES Products(product_id) ON DELETE SET NULL
+    );
+    """)
+
+
+def _v2_secondary_indexes(conn):
+    # Foreign keys and the invoice date are what the item joins and lookups filter on
+    run_script(conn, """
+    CREATE INDEX IF NOT EXISTS idx_invoice_items_invoice ON Invoice_Items(invoice_id);
+    CREATE INDEX IF NOT EXISTS idx_invoice_items_product ON Invoice_Items(product_id);
+    CREATE INDEX IF NOT EXISTS idx_invoices_customer ON Invoices(customer_id);
+    CREATE INDEX IF NOT EXISTS idx_invoices_created_at ON Invoices(created_at);
+    CREATE INDEX IF NOT EXISTS idx_products_category ON Products(category_id);
+    CREATE INDEX IF NOT EXISTS idx_products_supplier ON Products(supplier_id);
+    """)
+
+
+def _v3_full_text_search(conn):
+    search.create_indexes(conn)
+
+
+def _v4_barcode_values(conn):
+    # Products.barcode held the rendered PNG path ("barcodes/<code>.png"); keep only the code
+    conn.execute("""
+        UPDATE Products SET barcode = substr(barcode, 10, length(barcode) - 13)
+        WHERE barcode LIKE 'barcodes/%.png'
+    """)
+
+
+def _v5_summary_tables(conn):
+    summary.create_tables(conn)
+
+
+def _v6_stock_ledger(conn):
+    stock.create_ledger(conn)
+
+
+def _v7_name_indexes(conn):
+    # The invoice pickers look names up by case-insensitive prefix
+    run_script(conn, """
+    CREATE INDEX IF NOT EXISTS idx_products_name ON Products(name COLLATE NOCASE);
+    CREATE INDEX IF NOT EXISTS idx_customers_name ON Customers(name COLLATE NOCASE);
+    CREATE INDEX IF NOT EXISTS idx_users_username ON Users(username COLLATE NOCASE);
+    """)
+
+
+def _v8_sort_indexes(conn):
+    # Columns the table views sort and range-filter on; each index also orders by rowid,
+    # which is what keyset paging continues on
+    run_script(conn, """
+    CREATE INDEX IF NOT EXISTS idx_products_price ON Products(price);
+    CREATE INDEX IF NOT EXISTS idx_products_stock ON Products(stock_quantity);
+    CREATE INDEX IF NOT EXISTS idx_products_created_at ON Products(created_at);
+    CREATE INDEX IF NOT EXISTS idx_invoices_total ON Invoices(total_amount);
+    CREATE INDEX IF NOT EXISTS idx_invoices_status ON Invoices(payment_status);
+    CREATE INDEX IF NOT EXISTS idx_invoices_user ON Invoices(user_id);
+    CREATE INDEX IF NOT EXISTS idx_suppliers_name ON Suppliers(name COLLATE NOCASE);
+    CREATE INDEX IF NOT EXISTS idx_categories_name ON Categories(category_name COLLATE NOCASE);
+    """)
+
+
+def _v9_export_tracking(conn):
+    powerbi_export.create_tracking(conn)
+
+
+def _v10_summary_day_guard(conn):
+    # Triggers are created IF NOT EXISTS, so the fixed ones replace the old ones explicitly
+    summary.drop_triggers(conn)
+    summary.create_triggers(conn)
+    summary.rebuild(conn)
+
+
+# (version, description, apply) in ascending order; append new migrations at the end
+MIGRATIONS = [
+    (1, "base schema", _v1_base_schema),
+    (2, "secondary indexes", _v2_secondary_indexes),
+    (3, "full-text search", _v3_full_text_search),
+    (4, "store barcode values instead of image paths", _v4_barcode_values),
+    (5, "sales and stock summary tables", _v5_summary_tables),
+    (6, "stock ledger", _v6_stock_ledger),
+    (7, "case-insensitive name indexes", _v7_name_indexes),
+    (8, "sort and range filter indexes", _v8_sort_indexes),
+    (9, "change tracking for the PowerBI export", _v9_export_tracking),
+    (10, "summary triggers skip invoices without a date", _v10_summary_day_guard),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, target=LATEST_VERSION):
+    applied = []
+    for version, description, apply in MIGRATIONS:
+        if version > target or version <= schema_version(conn):
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have migrated while we waited for the write lock
+            if schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            apply(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append((version, description))
+    if applied:
+        conn.execute("PRAGMA optimize")
+    return applied
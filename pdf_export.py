@@ -0,0 +1,181 @@
+import multiprocessing, os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+import connection
+from queries import fetch_invoices, select_invoice_ids
+
+# -------------------- Invoice PDF Export --------------------
+LOGO_FILE = "logo.png"
+BATCH_DIR = "invoice_pdfs"
+CHUNK_SIZE = 25
+
+_logo = None
+
+
+def load_logo(path=LOGO_FILE):
+    # Decoded once per process and shared by every page of every invoice
+    global _logo
+    if _logo is None and os.path.exists(path):
+        try:
+            _logo = ImageReader(path)
+        except Exception:
+            pass
+    return _logo
+
+
+def build_invoice_pdf(invoice, pdf_file, logo=None):
+    invoice_id = invoice["invoice_id"]
+    doc = SimpleDocTemplate(pdf_file, pagesize=A4,
+                            rightMargin=20*mm, leftMargin=20*mm,
+                            topMargin=40*mm, bottomMargin=20*mm)
+    styles = getSampleStyleSheet()
+    elements = []
+
+    # Invoice Header Section
+    header_title = Paragraph(f"<b>Invoice #{invoice_id}</b>", styles["Title"])
+    elements.append(header_title)
+    elements.append(Spacer(1, 12))
+
+    # Invoice Details Table with customer name included
+    details = [
+        ["Invoice Date:", invoice.get("created_at")],
+        ["Customer Name:", invoice.get("customer_name")],
+        ["Total Amount:", f"${invoice.get('total_amount'):.2f}"]
+    ]
+    details_table = Table(details, colWidths=[120, 300])
+    details_table.setStyle(TableStyle([
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ]))
+    elements.append(details_table)
+    elements.append(Spacer(1, 12))
+
+    # Invoice Items Table
+    table_data = [["Product ID", "Product Name", "Quantity", "Price per Item", "Total"]]
+    for item in invoice["items"]:
+        total_price = item["quantity"] * item["price_per_item"]
+        table_data.append([
+            item["product_id"],
+            item["product_name"],
+            item["quantity"],
+            f"${item['price_per_item']:.2f}",
+            f"${total_price:.2f}"
+        ])
+    items_table = Table(table_data, colWidths=[60, 200, 50, 80, 80])
+    items_table.setStyle(TableStyle([
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 8)
+    ]))
+    elements.append(items_table)
+    elements.append(Spacer(1, 24))
+
+    # Additional Notes
+    notes = Paragraph("Please contact us if you have any questions regarding this invoice.", styles["Normal"])
+    elements.append(notes)
+
+    # Advanced Header/Footer Callback Function
+    def draw_header_footer(c: canvas.Canvas, doc_obj):
+        c.saveState()
+        width, height = A4
+
+        # Draw Header Background
+        c.setFillColorRGB(0.2, 0.5, 0.8)  # blue tone
+        c.rect(0, height - 60, width, 60, fill=1, stroke=0)
+
+        # Draw Company Logo if available
+        if logo is not None:
+            c.drawImage(logo, 20, height - 50, width=40, height=40, preserveAspectRatio=True)
+
+        # Header Text: Company Name and Tagline
+        c.setFillColor(colors.whitesmoke)
+        c.setFont("Helvetica-Bold", 16)
+        c.drawString(70, height - 35, "Inventory Billing System")
+        c.setFont("Helvetica", 10)
+        c.drawString(70, height - 50, "Innovative Solutions for Modern Business")
+
+        # Draw Footer Background
+        c.setFillColorRGB(0.2, 0.5, 0.8)
+        c.rect(0, 0, width, 30, fill=1, stroke=0)
+        c.setFillColor(colors.whitesmoke)
+        c.setFont("Helvetica", 9)
+        # Page Number Centered
+        page_number_text = f"Page {c.getPageNumber()}"
+        c.drawCentredString(width / 2, 10, page_number_text)
+        # Footer Message on the Right
+        c.drawRightString(width - 20, 10, "Thank you for your business!")
+        c.restoreState()
+
+    # Build the PDF with the header/footer callback
+    doc.build(elements, onFirstPage=draw_header_footer, onLaterPages=draw_header_footer)
+    return pdf_file
+
+
+def export_invoice_pdf(invoice_id, directory="."):
+    # Only the read needs the database (or the POS server); the PDF is drawn locally
+    invoices = connection.run(fetch_invoices, [invoice_id], readonly=True)
+    if not invoices:
+        raise ValueError(f"Invoice {invoice_id} does not exist.")
+    return build_invoice_pdf(invoices[0], os.path.join(directory, f"Invoice_{invoice_id}.pdf"), load_logo())
+
+
+# -------------------- Batch Export --------------------
+_workerConn = None
+
+
+def _init_worker(dbFile, logoFile):
+    # Runs once per worker process: one read-only connection and one decoded logo
+    global _workerConn
+    _workerConn = connection.open_connection(dbFile, readonly=True)
+    load_logo(logoFile)
+
+
+def _render_chunk(invoiceIds, directory):
+    return [build_invoice_pdf(invoice, os.path.join(directory, f"Invoice_{invoice['invoice_id']}.pdf"), _logo)
+            for invoice in fetch_invoices(_workerConn, invoiceIds)]
+
+
+def export_batch(invoiceIds, directory=BATCH_DIR, workers=None, chunkSize=CHUNK_SIZE, progress=None):
+    invoiceIds = list(invoiceIds)
+    os.makedirs(directory, exist_ok=True)
+    chunks = [invoiceIds[i:i + chunkSize] for i in range(0, len(invoiceIds), chunkSize)]
+    paths = []
+    if not chunks:
+        return paths
+    if connection.get_remote() is not None:
+        # Client mode: there is no local database file for worker processes to open
+        logo = load_logo()
+        for chunk in chunks:
+            invoices = connection.run(fetch_invoices, chunk, readonly=True)
+            paths.extend(build_invoice_pdf(invoice, os.path.join(directory, f"Invoice_{invoice['invoice_id']}.pdf"),
+                                           logo) for invoice in invoices)
+            if progress is not None:
+                progress(len(paths), len(invoiceIds))
+        return paths
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(connection.DB_FILE, LOGO_FILE)) as executor:
+        futures = [executor.submit(_render_chunk, chunk, directory) for chunk in chunks]
+        for future in as_completed(futures):
+            paths.extend(future.result())
+            if progress is not None:
+                progress(len(paths), len(invoiceIds))
+    return paths
+
+
+def export_range(start=None, end=None, directory=BATCH_DIR, workers=None, progress=None):
+    invoiceIds = connection.run(select_invoice_ids, start, end, readonly=True)
+    return export_batch(invoiceIds, directory, workers, progress=progress)
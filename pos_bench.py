@@ -0,0 +1,120 @@
+import argparse, json, os, random, secrets, shutil, subprocess, sys, tempfile, threading, time
+
+import connection
+import queries
+import stock
+from pos_client import PosClient, RemoteError, call_op
+
+# -------------------- POS Server Benchmark --------------------
+# Starts pos_server.py on a scratch copy of the database and runs N cashier threads
+# against it over localhost. Each checkout looks up a customer and a few products, then
+# saves an invoice; with --batch the lookups go out as one /batch request.
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def prepare_database(source, target, stockLevel):
+    shutil.copyfile(source, target)
+    conn = connection.open_connection(target)
+    from migrations import migrate
+    migrate(conn)
+    products = [tuple(r) for r in conn.execute("SELECT product_id, price FROM Products")]
+    customers = [r[0] for r in conn.execute("SELECT customer_id FROM Customers")]
+    users = [r[0] for r in conn.execute("SELECT user_id FROM Users")]
+    # Enough stock that the run measures the server rather than sell-outs
+    for productId, _ in products:
+        stock.set_stock(conn, productId, stockLevel)
+    conn.close()
+    if not (products and customers and users):
+        raise SystemExit("The database needs at least one product, customer and user.")
+    return products, customers, users
+
+
+def start_server(dbFile, port, token):
+    process = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "pos_server.py"),
+                                "--db", dbFile, "--port", str(port)], stdout=subprocess.PIPE, text=True,
+                               env=dict(os.environ, POS_TOKEN=token))
+    process.stdout.readline()  # "Serving ..." once the socket is bound
+    return process
+
+
+def cashier(url, token, checkouts, products, customers, users, batch, seed, latencies, errors):
+    rng = random.Random(seed)
+    client = PosClient(url, token)
+    for _ in range(checkouts):
+        customerId = rng.choice(customers)
+        lines = rng.sample(products, min(len(products), rng.randint(1, 4)))
+        started = time.perf_counter()
+        try:
+            lookups = [call_op(queries.pick_record, "customers", customerId)]
+            lookups += [call_op(queries.pick_record, "products", productId) for productId, _ in lines]
+            if batch:
+                client.batch(lookups)
+            else:
+                for op in lookups:
+                    client.request(op)
+            items = [{"product_id": productId, "quantity": rng.randint(1, 3), "price_per_item": price}
+                     for productId, price in lines]
+            client.call(stock.save_invoice, None, customerId, rng.choice(users), "paid", items)
+            latencies.append(time.perf_counter() - started)
+        except RemoteError as e:
+            errors.append(str(e))
+    client.close()
+
+
+def run(source=connection.DB_FILE, clients=8, checkouts=100, batch=False, port=8799, stockLevel=1000000, seed=1):
+    workdir = tempfile.mkdtemp(prefix="pos_bench_")
+    dbFile = os.path.join(workdir, "bench.db")
+    products, customers, users = prepare_database(source, dbFile, stockLevel)
+    token = secrets.token_hex(16)
+    server = start_server(dbFile, port, token)
+    try:
+        url = f"127.0.0.1:{port}"
+        latencies, errors = [], []
+        threads = [threading.Thread(target=cashier, args=(url, token, checkouts, products, customers, users, batch,
+                                                          seed + i, latencies, errors)) for i in range(clients)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+        stats = PosClient(url, token).health()["stats"]
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "clients": clients,
+        "checkouts": len(latencies),
+        "errors": len(errors),
+        "batch": batch,
+        "elapsed_s": round(elapsed, 3),
+        "checkouts_per_s": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "requests": stats["requests"],
+        "writes_per_commit": round(stats["writes"] / stats["write_groups"], 2) if stats["write_groups"] else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent cashier stations against pos_server.py.")
+    parser.add_argument("--db", default=connection.DB_FILE, help="database to copy for the run")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--checkouts", type=int, default=100, help="checkouts per client")
+    parser.add_argument("--batch", action="store_true", help="send each checkout's lookups as one request")
+    parser.add_argument("--port", type=int, default=8799)
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.db, args.clients, args.checkouts, args.batch, args.port), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
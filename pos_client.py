@@ -0,0 +1,151 @@
+import http.client, json, threading
+from urllib.parse import urlsplit
+
+import connection
+from pos_server import DEFAULT_PORT, FUNCTIONS, function_name
+
+# -------------------- POS Client --------------------
+# Talks to pos_server.py. connect() switches the whole data layer into client mode: the
+# registered operations (saving an invoice, paging a table, editing a record) run on the
+# server in one request each, sent with the station's shared token. There is no local
+# database, so anything else that needs a connection fails instead of reaching the server.
+
+
+class RemoteError(RuntimeError):
+    def __init__(self, message, type=None):
+        super().__init__(message)
+        self.type = type
+
+
+class RemoteRow(tuple):
+    # Behaves like sqlite3.Row: index by position or column name, keys(), dict(row)
+    def __new__(cls, columns, index, values):
+        row = super().__new__(cls, values)
+        row._columns = columns
+        row._index = index
+        return row
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            key = self._index[key]
+        return tuple.__getitem__(self, key)
+
+    def keys(self):
+        return list(self._columns)
+
+
+def decode(value):
+    if isinstance(value, dict):
+        if "$rows" in value:
+            columns, rows = value["$rows"]
+            index = {c: i for i, c in enumerate(columns)}
+            return [RemoteRow(columns, index, r) for r in rows]
+        if "$row" in value:
+            columns, values = value["$row"]
+            return RemoteRow(columns, {c: i for i, c in enumerate(columns)}, values)
+        return {k: decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [decode(v) for v in value]
+    return value
+
+
+def _unwrap(envelope):
+    if envelope.get("ok"):
+        return decode(envelope.get("result"))
+    raise RemoteError(envelope.get("error"), envelope.get("type"))
+
+
+# ---------- op builders, for PosClient.batch() ----------
+def call_op(fn, *args, **kwargs):
+    name = fn if isinstance(fn, str) else function_name(fn)
+    return {"op": "call", "fn": name, "args": list(args), "kwargs": kwargs}
+
+
+class PosClient:
+    def __init__(self, url, token, timeout=30.0):
+        parts = urlsplit(url if "://" in url else f"http://{url}")
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or DEFAULT_PORT
+        self.token = token
+        self.timeout = timeout
+        self._local = threading.local()  # one keep-alive HTTP connection per thread
+        self._changeSeq = None
+
+    def _http(self):
+        conn = getattr(self._local, "http", None)
+        if conn is None:
+            conn = self._local.http = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def _send(self, method, path, payload=None):
+        body = None if payload is None else json.dumps(payload, separators=(",", ":"))
+        headers = {"Authorization": f"Bearer {self.token}"}
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+        for attempt in range(2):
+            conn = self._http()
+            reused = conn.sock is not None
+            try:
+                conn.request(method, path, body, headers)
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                conn.close()
+                self._local.http = None
+                # Only an idle keep-alive socket closed by the server is retried; the
+                # request never reached it, so nothing can be applied twice
+                if attempt or not reused:
+                    raise
+        if response.status != 200:
+            raise RemoteError(f"HTTP {response.status}: {json.loads(data or b'{}').get('error', '')}")
+        return json.loads(data)
+
+    def close(self):
+        conn = getattr(self._local, "http", None)
+        if conn is not None:
+            conn.close()
+            self._local.http = None
+
+    # ---------- requests ----------
+    def health(self):
+        return self._send("GET", "/health")
+
+    def changes(self):
+        # Changes committed on the server since the last call, as (table, keys) pairs
+        since = -1 if self._changeSeq is None else self._changeSeq
+        reply = self._send("GET", f"/changes?since={since}")
+        first = self._changeSeq is None
+        self._changeSeq = reply["seq"]
+        if first:
+            return []
+        if reply["reset"]:
+            return [(None, None)]
+        return [(table, keys) for table, keys in reply["changes"]]
+
+    def request(self, op):
+        return _unwrap(self._send("POST", "/rpc", op))
+
+    def batch(self, ops):
+        # Several ops in one round trip; failed ops come back as RemoteError instances
+        results = []
+        for envelope in self._send("POST", "/batch", list(ops)):
+            try:
+                results.append(_unwrap(envelope))
+            except RemoteError as e:
+                results.append(e)
+        return results
+
+    def serves(self, fn):
+        return function_name(fn) in FUNCTIONS
+
+    def call(self, fn, *args, **kwargs):
+        return self.request(call_op(fn, *args, **kwargs))
+
+
+def connect(url, token):
+    client = PosClient(url, token)
+    client.health()  # fail fast if the server is not reachable
+    client.changes()  # start following the server's change log from here
+    connection.set_remote(client)
+    return client
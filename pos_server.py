@@ -0,0 +1,334 @@
+import argparse, asyncio, hmac, json, os, sqlite3, sys, threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import changes
+import connection
+import importer
+import product_index
+import queries
+import query_builder
+import search
+import stock
+import summary
+from migrations import migrate
+
+# -------------------- POS Sync Server --------------------
+# One process owns inventory_billing.db and cashier stations talk to it over HTTP/JSON
+# (see pos_client.py). Reads run on the reader connections of the pool; writes from all
+# clients are queued to a single writer that commits whatever has accumulated in one
+# transaction, each request isolated in its own savepoint. Clients can only call the
+# data-layer functions registered in FUNCTIONS, never send SQL, and every request must
+# carry the shared token ("Authorization: Bearer <token>") the server was started with.
+#
+#   POST /rpc    {"op": "call", "fn": "stock.save_invoice", "args": [...], "kwargs": {...}}
+#   POST /batch  [op, op, ...] -> [envelope, ...] in order, one round trip
+#   GET  /changes?since=N  committed changes after sequence number N, for client caches
+#   GET  /health
+#
+# Every op answers with {"ok": true, "result": ...} or {"ok": false, "error": ..., "type": ...}.
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+TOKEN_ENV = "POS_TOKEN"
+MAX_GROUP = 64  # queued writes committed together
+MAX_BODY = 16 * 1024 * 1024
+CHANGE_LOG_SIZE = 10000
+REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 413: "Payload Too Large"}
+
+
+def function_name(fn):
+    return f"{fn.__module__}.{fn.__name__}"
+
+
+# Operations clients may run server-side: name -> (function, readonly)
+FUNCTIONS = {function_name(fn): (fn, readonly) for fn, readonly in [
+    (query_builder.fetch_page, True),
+    (query_builder.fetch_rows, True),
+    (queries.fetch_invoice_items, True),
+    (queries.fetch_invoices, True),
+    (queries.select_invoice_ids, True),
+    (queries.list_options, True),
+    (queries.lookup_barcode, True),
+    (queries.pick, True),
+    (queries.pick_record, True),
+    (queries.add_product, False),
+    (queries.update_product, False),
+    (queries.insert_record, False),
+    (queries.update_record, False),
+    (queries.delete_record, False),
+    (product_index.fetch_entries, True),
+    (importer.load_ids, True),
+    (importer.write_batch, False),
+    (search.has_index, True),
+    (search.search, True),
+    (summary.dashboard, True),
+    (stock.save_invoice, False),
+    (stock.delete_invoice, False),
+    (stock.set_stock, False),
+    (stock.stock_at, True),
+]}
+
+
+def encode(value):
+    # sqlite3.Row is not JSON; result sets travel as one column list plus value lists
+    if isinstance(value, sqlite3.Row):
+        return {"$row": [value.keys(), list(value)]}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(v, sqlite3.Row) for v in value):
+            return {"$rows": [value[0].keys(), [list(v) for v in value]]}
+        return [encode(v) for v in value]
+    if isinstance(value, dict):
+        return {k: encode(v) for k, v in value.items()}
+    return value
+
+
+def _error(e):
+    return {"ok": False, "error": str(e), "type": type(e).__name__}
+
+
+class PosServer:
+    def __init__(self, token, host=DEFAULT_HOST, port=DEFAULT_PORT, readers=connection.READER_COUNT):
+        if not token:
+            raise ValueError(f"The POS server needs a shared token (--token or {TOKEN_ENV}).")
+        self._token = token.encode()
+        self.host = host
+        self.port = port
+        self._readers = ThreadPoolExecutor(readers, thread_name_prefix="pos-reader")
+        self._writerThread = ThreadPoolExecutor(1, thread_name_prefix="pos-writer")
+        self._writes = None
+        self._server = None
+        self.stats = {"requests": 0, "ops": 0, "write_groups": 0, "writes": 0}
+        self._changeLog = deque(maxlen=CHANGE_LOG_SIZE)  # (seq, table, keys)
+        self._changeSeq = 0
+        self._changeLock = threading.Lock()
+        changes.subscribe(self._logChange)
+
+    def _logChange(self, table, keys, origin):
+        with self._changeLock:
+            self._changeSeq += 1
+            self._changeLog.append((self._changeSeq, table, sorted(keys) if keys is not None else None))
+
+    def changesSince(self, since):
+        with self._changeLock:
+            oldest = self._changeLog[0][0] if self._changeLog else self._changeSeq + 1
+            # A client that fell behind the log (or is new) is told to drop everything
+            reset = since < oldest - 1
+            entries = [[table, keys] for seq, table, keys in self._changeLog if seq > since]
+            return {"ok": True, "seq": self._changeSeq, "reset": reset, "changes": [] if reset else entries}
+
+    # ---------- operations ----------
+    def _work(self, op):
+        # -> (readonly, fn(conn)) for one op; raises on malformed ops
+        if not isinstance(op, dict):
+            raise ValueError("An op must be a JSON object.")
+        if op.get("op") != "call":
+            raise ValueError(f"Unknown op {op.get('op')!r}.")
+        try:
+            fn, readonly = FUNCTIONS[op["fn"]]
+        except (KeyError, TypeError):
+            raise ValueError(f"Unknown function {op.get('fn')!r}.")
+        args, kwargs = op.get("args") or [], op.get("kwargs") or {}
+        if not isinstance(args, list) or not isinstance(kwargs, dict):
+            raise ValueError("args must be a list and kwargs an object.")
+        return readonly, lambda conn: fn(conn, *args, **kwargs)
+
+    def _read(self, work):
+        with connection.get_connection(readonly=True) as conn:
+            return encode(work(conn))
+
+    def _commitGroup(self, works):
+        # One transaction for the whole group; a failing op only rolls back its savepoint
+        results = []
+        try:
+            with connection.get_connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                for work in works:
+                    conn.execute("SAVEPOINT pos_op")
+                    try:
+                        results.append((True, encode(work(conn))))
+                        conn.execute("RELEASE pos_op")
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO pos_op")
+                        conn.execute("RELEASE pos_op")
+                        results.append((False, e))
+        except Exception as e:
+            return [(False, e)] * len(works)
+        return results
+
+    async def _writer(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            group = [await self._writes.get()]
+            while len(group) < MAX_GROUP and not self._writes.empty():
+                group.append(self._writes.get_nowait())
+            results = await loop.run_in_executor(self._writerThread, self._commitGroup, [w for w, _ in group])
+            self.stats["write_groups"] += 1
+            self.stats["writes"] += len(group)
+            for (_, future), (ok, value) in zip(group, results):
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    def _submit(self, op):
+        # -> (readonly, future) right away: reads start on a reader thread, writes join the queue
+        loop = asyncio.get_running_loop()
+        self.stats["ops"] += 1
+        try:
+            readonly, work = self._work(op)
+        except Exception as e:
+            future = loop.create_future()
+            future.set_exception(e)
+            return True, future
+        if readonly:
+            return True, loop.run_in_executor(self._readers, self._read, work)
+        future = loop.create_future()
+        self._writes.put_nowait((work, future))
+        return False, future
+
+    async def _envelope(self, future):
+        try:
+            return {"ok": True, "result": await future}
+        except Exception as e:
+            return _error(e)
+
+    async def _batch(self, ops):
+        # Consecutive writes are queued together so they commit in the same group. A read
+        # is only started once the writes before it have committed, so a batch sees its
+        # own changes.
+        results = []
+        pending = []
+        for op in ops:
+            if pending and self._isRead(op):
+                results.extend([await self._envelope(f) for f in pending])
+                pending = []
+            readonly, future = self._submit(op)
+            if readonly:
+                results.append(await self._envelope(future))
+            else:
+                pending.append(future)
+        results.extend([await self._envelope(f) for f in pending])
+        return results
+
+    def _isRead(self, op):
+        try:
+            return self._work(op)[0]
+        except Exception:
+            return True
+
+    def _authorized(self, headers):
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        return scheme.lower() == "bearer" and hmac.compare_digest(token.strip().encode(), self._token)
+
+    async def _dispatch(self, method, path, headers, body):
+        self.stats["requests"] += 1
+        if not self._authorized(headers):
+            return 401, {"ok": False, "error": "Missing or wrong token"}
+        path, _, query = path.partition("?")
+        if method == "GET" and path == "/health":
+            return 200, {"ok": True, "stats": self.stats}
+        if method == "GET" and path == "/changes":
+            try:
+                since = int(dict(p.split("=", 1) for p in query.split("&") if "=" in p).get("since", -1))
+            except ValueError:
+                return 400, {"ok": False, "error": "since must be an integer"}
+            return 200, self.changesSince(since)
+        if method != "POST" or path not in ("/rpc", "/batch"):
+            return 404, {"ok": False, "error": f"No route for {method} {path}"}
+        try:
+            payload = json.loads(body or b"null")
+        except ValueError as e:
+            return 400, {"ok": False, "error": f"Invalid JSON: {e}"}
+        if path == "/batch":
+            if not isinstance(payload, list):
+                return 400, {"ok": False, "error": "/batch expects a list of ops"}
+            return 200, await self._batch(payload)
+        return 200, await self._envelope(self._submit(payload)[1])
+
+    # ---------- HTTP ----------
+    async def _serveClient(self, reader, writer):
+        # Minimal HTTP/1.1 with keep-alive, which is all pos_client needs
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, path, version = line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                keepAlive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                if length > MAX_BODY:
+                    status, payload = 413, {"ok": False, "error": "Request body too large"}
+                    keepAlive = False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = await self._dispatch(method, path, headers, body)
+                data = json.dumps(payload, separators=(",", ":")).encode()
+                head = (f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                        f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n")
+                if not keepAlive:
+                    head += "Connection: close\r\n"
+                writer.write(head.encode("latin-1") + b"\r\n" + data)
+                await writer.drain()
+                if not keepAlive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, ready=None):
+        self._writes = asyncio.Queue()
+        writerTask = asyncio.create_task(self._writer())
+        self._server = await asyncio.start_server(self._serveClient, self.host, self.port)
+        if ready is not None:
+            ready(self._server.sockets[0].getsockname())
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        finally:
+            writerTask.cancel()
+            self._readers.shutdown(wait=True)
+            self._writerThread.shutdown(wait=True)
+            connection.close_pool()
+
+
+def run_server(host=DEFAULT_HOST, port=DEFAULT_PORT, dbFile=None, token=None):
+    server = PosServer(token or os.environ.get(TOKEN_ENV), host, port)
+    if dbFile is not None:
+        connection.DB_FILE = dbFile
+    with connection.get_connection() as conn:
+        migrate(conn)
+    try:
+        asyncio.run(server.serve(lambda address: print(f"Serving {connection.DB_FILE} on http://{address[0]}:{address[1]}",
+                                                       flush=True)))
+    except KeyboardInterrupt:
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the inventory database to POS clients.")
+    parser.add_argument("--db", default=connection.DB_FILE)
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--token", help=f"shared token clients must send (default: ${TOKEN_ENV})")
+    args = parser.parse_args(argv)
+    try:
+        run_server(args.host, args.port, args.db, args.token)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
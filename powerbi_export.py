@@ -0,0 +1,357 @@
+import csv, glob, json, os
+from itertools import chain
+
+# -------------------- PowerBI Export --------------------
+# Writes the PowerBI/ CSV files from the database, all tables from one read transaction.
+# High-water marks in the state file keep a nightly run to the rows that changed:
+# - append: the stock ledger is append-only, so only rows past the primary-key mark are
+#   added to the file
+# - changes: invoices and their items are edited and deleted in place. Triggers stamp
+#   updated_at on every insert and update and log deletions in Export_Deletions; rows
+#   stamped since the mark replace their old lines and deleted keys are dropped, merged
+#   in key order into the file
+# - snapshot: the small dimension tables are rewritten in full
+# Rows are streamed in keyset batches, never materialised.
+
+EXPORT_DIR = "PowerBI"
+STATE_FILE = ".export_state.json"
+BATCH_SIZE = 5000
+NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+# file name -> (table, key, mode)
+EXPORTS = {
+    "category": ("Categories", "category_id", "snapshot"),
+    "suppliers": ("Suppliers", "supplier_id", "snapshot"),
+    "customers": ("Customers", "customer_id", "snapshot"),
+    "users": ("Users", "user_id", "snapshot"),
+    "products": ("Products", "product_id", "snapshot"),
+    "invoices": ("Invoices", "invoice_id", "changes"),
+    "invoice_items": ("Invoice_Items", "item_id", "changes"),
+    "stock_logs": ("Stock_Logs", "log_id", "append"),
+}
+TRACKED_TABLES = {"Invoices": "invoice_id", "Invoice_Items": "item_id"}
+SQLITE_TO_ARROW = {"INTEGER": "int64", "REAL": "float64"}
+
+
+# -------------------- Change Tracking --------------------
+def create_tracking(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS Export_Deletions (
+            deletion_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_key INTEGER NOT NULL
+        )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_export_deletions_table ON Export_Deletions(table_name, deletion_id)")
+    for table in TRACKED_TABLES:
+        if "updated_at" not in [c for c, _ in table_columns(conn, table)]:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN updated_at TEXT")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table.lower()}_updated_at ON {table}(updated_at)")
+    # Stamps are when a row was last written (not a business date), so the marks only move forward
+    for table in TRACKED_TABLES:
+        conn.execute(f"UPDATE {table} SET updated_at = {NOW} WHERE updated_at IS NULL")
+    create_tracking_triggers(conn)
+
+
+def create_tracking_triggers(conn):
+    for table, key in TRACKED_TABLES.items():
+        name = table.lower()
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS export_{name}_ai AFTER INSERT ON {table}
+            WHEN new.updated_at IS NULL BEGIN
+                UPDATE {table} SET updated_at = {NOW} WHERE {key} = new.{key};
+            END""")
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS export_{name}_au AFTER UPDATE ON {table}
+            WHEN new.updated_at IS old.updated_at BEGIN
+                UPDATE {table} SET updated_at = {NOW} WHERE {key} = new.{key};
+            END""")
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS export_{name}_ad AFTER DELETE ON {table} BEGIN
+                INSERT INTO Export_Deletions (table_name, row_key) VALUES ('{table}', old.{key});
+            END""")
+
+
+def drop_tracking_triggers(conn):
+    # For bulk loads that stamp updated_at themselves
+    for table in TRACKED_TABLES:
+        for suffix in ("ai", "au", "ad"):
+            conn.execute(f"DROP TRIGGER IF EXISTS export_{table.lower()}_{suffix}")
+
+
+def prune_deletions(conn, directory=EXPORT_DIR):
+    # Drops logged deletions every format exported to `directory` has applied. Another
+    # export directory that still needed them notices its row count is off and starts over.
+    state = load_state(directory)
+    for name, (table, key, mode) in EXPORTS.items():
+        marks = [v for k, v in state.get(name, {}).items() if k.endswith("_deletion")] if mode == "changes" else []
+        if marks:
+            conn.execute("DELETE FROM Export_Deletions WHERE table_name = ? AND deletion_id <= ?",
+                         (table, min(marks)))
+
+
+def load_state(directory=EXPORT_DIR):
+    try:
+        with open(os.path.join(directory, STATE_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state, directory=EXPORT_DIR):
+    path = os.path.join(directory, STATE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def table_columns(conn, table):
+    return [(row[1], (row[2] or "").upper()) for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def iter_batches(conn, table, key, after=None, batchSize=BATCH_SIZE):
+    # Keyset pagination keeps every query an index range scan, however far along we are
+    while True:
+        if after is None:
+            rows = conn.execute(f"SELECT * FROM {table} ORDER BY {key} LIMIT ?", (batchSize,)).fetchall()
+        else:
+            rows = conn.execute(f"SELECT * FROM {table} WHERE {key} > ? ORDER BY {key} LIMIT ?",
+                                (after, batchSize)).fetchall()
+        if not rows:
+            return
+        yield rows
+        after = rows[-1][key]
+
+
+def _write_csv(path, columns, batches, append):
+    count = 0
+    last = None
+    exists = append and os.path.exists(path)
+    target = path if exists else path + ".tmp"
+    with open(target, "a" if exists else "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if not exists:
+            writer.writerow(columns)
+        for rows in batches:
+            writer.writerows(tuple(row) for row in rows)
+            count += len(rows)
+            last = rows[-1]
+    if not exists:
+        os.replace(target, path)
+    return count, last
+
+
+def _write_parquet(path, columns, types, batches):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires the pyarrow package.")
+    schema = pa.schema([(c, getattr(pa, SQLITE_TO_ARROW.get(t, "string"))()) for c, t in zip(columns, types)])
+    count = 0
+    last = None
+    # Written even without rows, so a table that is now empty does not keep its old file
+    with pq.ParquetWriter(path + ".tmp", schema) as writer:
+        for rows in batches:
+            data = {c: [row[i] for row in rows] for i, c in enumerate(columns)}
+            writer.write_batch(pa.RecordBatch.from_pydict(data, schema=schema))
+            count += len(rows)
+            last = rows[-1]
+    os.replace(path + ".tmp", path)
+    return count, last
+
+
+def _read_csv(path, columns, keyIndex):
+    # -> (key, row) in file order, or None if the file is missing or has other columns
+    try:
+        with open(path, newline="", encoding="utf-8") as f:
+            if next(csv.reader(f), None) != columns:
+                return None
+    except OSError:
+        return None
+
+    def rows():
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            next(reader)
+            for row in reader:
+                yield int(row[keyIndex]), row
+    return rows()
+
+
+def _read_parquet(path, columns, keyIndex):
+    if not os.path.exists(path):
+        return None
+    import pyarrow.parquet as pq
+    file = pq.ParquetFile(path)
+    if file.schema_arrow.names != columns:
+        return None
+
+    def rows():
+        for batch in file.iter_batches(batch_size=BATCH_SIZE):
+            for row in zip(*(column.to_pylist() for column in batch.columns)):
+                yield row[keyIndex], row
+    return rows()
+
+
+def _merge(old, changed, deleted, keyIndex):
+    # Both in key order: changed rows replace the old row with their key or are new,
+    # old rows with a deleted key are dropped
+    new = next(changed, None)
+    for key, row in old:
+        while new is not None and new[keyIndex] < key:
+            yield new
+            new = next(changed, None)
+        if new is not None and new[keyIndex] == key:
+            yield new
+            new = next(changed, None)
+        elif key not in deleted:
+            yield row
+    while new is not None:
+        yield new
+        new = next(changed, None)
+
+
+def _batched(rows, batchSize=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batchSize:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _count_through(conn, table, key, last):
+    return conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {key} <= ?", (last,)).fetchone()[0]
+
+
+def _clear_parts(directory, name):
+    for path in glob.glob(os.path.join(directory, name, "part-*.parquet")):
+        os.remove(path)
+
+
+def _changed_rows(conn, table, key, op, since):
+    cur = conn.execute(f"SELECT * FROM {table} WHERE updated_at {op} ? ORDER BY {key}", (since,))
+    while True:
+        rows = cur.fetchmany(BATCH_SIZE)
+        if not rows:
+            return
+        for row in rows:
+            yield tuple(row)
+
+
+def _export_changes(conn, name, state, directory, format, full, columns, types):
+    table, key, _ = EXPORTS[name]
+    mark = state.get(name, {})
+    path = os.path.join(directory, f"{name}.{format}")
+    keyIndex = columns.index(key)
+    total = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    latest = conn.execute(f"SELECT MAX(updated_at) FROM {table}").fetchone()[0]
+    lastDeletion = conn.execute("SELECT COALESCE(MAX(deletion_id), 0) FROM Export_Deletions").fetchone()[0]
+    since, deletion = mark.get(f"{format}_updated_at"), mark.get(f"{format}_deletion")
+    read = _read_parquet if format == "parquet" else _read_csv
+    old = None if full or since is None or deletion is None else read(path, columns, keyIndex)
+    count = None
+    if old is not None:
+        # Rows past the mark changed. A write committed after the last run but stamped in
+        # its final millisecond shows up as a different count at the mark; those rows are
+        # then taken again (replacing a row with itself is harmless).
+        atMark = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE updated_at = ?", (since,)).fetchone()[0]
+        op = ">" if atMark == mark.get(f"{format}_at_mark") else ">="
+        count = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE updated_at {op} ?", (since,)).fetchone()[0]
+        deleted = {k for (k,) in conn.execute("""
+            SELECT row_key FROM Export_Deletions WHERE table_name = ? AND deletion_id > ?
+        """, (table, deletion))}
+        if count or deleted:
+            batches = _batched(_merge(old, _changed_rows(conn, table, key, op, since), deleted, keyIndex))
+            if format == "parquet":
+                rows, _ = _write_parquet(path, columns, types, batches)
+            else:
+                rows, _ = _write_csv(path, columns, batches, False)
+        else:
+            rows = mark.get(f"{format}_rows")
+        if rows != total:
+            count = None  # rows were changed without passing the triggers; start over
+    if count is None:
+        if format == "parquet":
+            count, _ = _write_parquet(path, columns, types, iter_batches(conn, table, key))
+        else:
+            count, _ = _write_csv(path, columns, iter_batches(conn, table, key), False)
+    atLatest = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE updated_at = ?", (latest,)).fetchone()[0]
+    state[name] = {**mark, f"{format}_updated_at": latest, f"{format}_at_mark": atLatest,
+                   f"{format}_deletion": lastDeletion, f"{format}_rows": total}
+    return count
+
+
+def export_table(conn, name, state, directory=EXPORT_DIR, format="csv", full=False):
+    table, key, mode = EXPORTS[name]
+    info = table_columns(conn, table)
+    if not info:
+        return None  # table not present in this database
+    columns = [c for c, _ in info]
+    types = [t for _, t in info]
+    if mode == "changes":
+        if format == "parquet":
+            _clear_parts(directory, name)  # left over from when this table was exported as parts
+        return _export_changes(conn, name, state, directory, format, full, columns, types)
+    mark = state.get(name, {}) if mode == "append" else {}
+    after = None if full else mark.get(f"last_{format}_key")
+    # Ledger rows are never updated, but deleting a product cascades to its rows; if rows up
+    # to the mark have gone since the last run, the export starts over
+    if after is not None and _count_through(conn, table, key, after) != mark.get(f"{format}_rows"):
+        after = None
+    incremental = after is not None
+    batches = iter_batches(conn, table, key, after)
+    if format == "parquet":
+        if mode == "append":
+            # Each incremental run adds a part file covering the new key range
+            os.makedirs(os.path.join(directory, name), exist_ok=True)
+            if not incremental:
+                _clear_parts(directory, name)
+            path = os.path.join(directory, name, f"part-{(after or 0) + 1:012d}.parquet")
+            first = next(batches, None)
+            if incremental and first is None:
+                return 0  # no new rows, no empty part file
+            batches = chain([first], batches) if first is not None else batches
+        else:
+            _clear_parts(directory, name)  # left over from when this table was exported incrementally
+            path = os.path.join(directory, f"{name}.parquet")
+        count, last = _write_parquet(path, columns, types, batches)
+    else:
+        path = os.path.join(directory, f"{name}.csv")
+        count, last = _write_csv(path, columns, batches, incremental)
+    if mode == "append":
+        if last is not None:
+            mark[f"last_{format}_key"] = last[key]
+        elif not incremental:
+            mark.pop(f"last_{format}_key", None)
+        mark[f"{format}_rows"] = (mark.get(f"{format}_rows", 0) if incremental else 0) + count
+        state[name] = mark
+    else:
+        state.pop(name, None)
+    return count
+
+
+def export_all(conn, directory=EXPORT_DIR, format="csv", full=False, names=None, progress=None):
+    os.makedirs(directory, exist_ok=True)
+    state = load_state(directory)
+    written = {}
+    # One read transaction, so every file comes from the same snapshot (no items without
+    # their invoice) and the marks match what was written
+    owned = not conn.in_transaction
+    if owned:
+        conn.execute("BEGIN")
+    try:
+        for name in names or EXPORTS:
+            count = export_table(conn, name, state, directory, format, full)
+            if count is None:
+                continue
+            written[name] = count
+            save_state(state, directory)
+            if progress is not None:
+                progress(name, count)
+    finally:
+        if owned:
+            conn.commit()
+    return written
@@ -0,0 +1,144 @@
+import threading
+from collections import namedtuple
+
+import changes
+import queries
+from connection import run
+
+# -------------------- Barcode Index --------------------
+# Checkout scans resolve through an in-memory dict of barcode -> product, so a lookup is a
+# hash probe however many products there are. The index loads in the background the first
+# time it is needed; until then lookups fall back to the UNIQUE index on Products.barcode.
+# Change notifications keep it current: rows the data layer reports as changed are re-read
+# on the next lookup, and an unspecific change ("something changed") drops the index so it
+# is loaded again.
+
+ProductEntry = namedtuple("ProductEntry", "product_id name price stock_quantity")
+
+REFRESH_CHUNK = 500  # ids per IN (...) when re-reading changed rows
+
+
+def fetch_entries(conn, product_ids=None):
+    # -> [(barcode, product_id, name, price, stock_quantity)]; every product with a barcode,
+    # or only the given ids. Plain rows, so the POS server can send them to a client.
+    sql = "SELECT barcode, product_id, name, price, stock_quantity FROM Products WHERE barcode IS NOT NULL"
+    if product_ids is None:
+        return conn.execute(sql).fetchall()
+    rows = []
+    product_ids = list(product_ids)
+    for i in range(0, len(product_ids), REFRESH_CHUNK):
+        chunk = product_ids[i:i + REFRESH_CHUNK]
+        rows += conn.execute(f"{sql} AND product_id IN ({', '.join('?' * len(chunk))})", chunk).fetchall()
+    return rows
+
+
+def _entries(rows):
+    # -> [(barcode, ProductEntry)]
+    return [(r[0], ProductEntry(*r[1:])) for r in rows]
+
+
+class ProductIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._byCode = {}
+        self._codeById = {}
+        self._stale = set()  # product ids changed since they were indexed
+        self._complete = False
+        self._loading = False
+        self._refreshed = set()  # ids refreshed while a full load was reading
+        self._generation = 0  # bumped on every full invalidation
+        changes.subscribe(self._onChange, tables=["Products"])
+
+    def _onChange(self, table, keys, origin):
+        with self._lock:
+            if keys is None:
+                self._byCode, self._codeById, self._stale = {}, {}, set()
+                self._complete = False
+                self._generation += 1
+            else:
+                self._stale.update(keys)
+
+    def __len__(self):
+        return len(self._byCode)
+
+    @property
+    def complete(self):
+        return self._complete
+
+    def lookup(self, code):
+        # -> ProductEntry or None
+        code = code.strip()
+        if self._stale:
+            self._refresh()
+        entry = self._byCode.get(code)
+        if entry is not None or self._complete:
+            return entry
+        self.warm()
+        row = run(queries.lookup_barcode, code, readonly=True)
+        return ProductEntry(*row) if row is not None else None
+
+    def warm(self):
+        # Start the full load on a background thread unless it is loaded or loading
+        with self._lock:
+            if self._complete or self._loading:
+                return
+            self._loading = True
+        threading.Thread(target=self.load, name="product-index", daemon=True).start()
+
+    def load(self):
+        with self._lock:
+            self._loading = True
+            self._refreshed = set()
+            generation = self._generation
+        try:
+            entries = _entries(run(fetch_entries, readonly=True))
+        except Exception:
+            with self._lock:
+                self._loading = False
+            raise
+        byCode = dict(entries)
+        codeById = {entry.product_id: code for code, entry in entries}
+        with self._lock:
+            self._loading = False
+            if generation == self._generation:
+                # Rows changed during the load are re-read on the next lookup: those still in
+                # _stale, and those a lookup refreshed meanwhile, which the snapshot may predate
+                self._byCode, self._codeById = byCode, codeById
+                self._stale |= self._refreshed
+                self._complete = True
+            self._refreshed = set()
+
+    def _refresh(self):
+        with self._lock:
+            ids, self._stale = self._stale, set()
+            generation = self._generation
+            if self._loading:
+                self._refreshed |= ids
+        try:
+            entries = _entries(run(fetch_entries, list(ids), readonly=True))
+        except Exception:
+            with self._lock:
+                if generation == self._generation:
+                    self._stale |= ids  # retried on the next lookup
+            raise
+        with self._lock:
+            if generation != self._generation:
+                return
+            for productId in ids:
+                code = self._codeById.pop(productId, None)
+                if code is not None:
+                    self._byCode.pop(code, None)
+            for code, entry in entries:
+                self._byCode[code] = entry
+                self._codeById[entry.product_id] = code
+
+_index = None
+_indexLock = threading.Lock()
+
+
+def get_index():
+    global _index
+    with _indexLock:
+        if _index is None:
+            _index = ProductIndex()
+        return _index
@@ -0,0 +1,193 @@
+import changes
+import search
+import stock
+
+# -------------------- Table Queries --------------------
+# Plain functions over a connection so they can run on a worker thread, from the CLI
+# or in benchmarks without touching Qt.
+
+TABLE_COLUMNS = {
+    "Products": ["product_id", "name", "category_id", "supplier_id", "price", "stock_quantity", "barcode", "created_at"],
+    "Invoices": ["invoice_id", "customer_id", "user_id", "total_amount", "payment_status", "created_at"],
+    "Suppliers": ["supplier_id", "name", "contact_name", "contact_email", "phone_number"],
+    "Categories": ["category_id", "category_name"],
+    "Customers": ["customer_id", "name", "email", "phone_number", "address"],
+    "Users": ["user_id", "username", "password_hash", "role"],
+}
+TABLE_KEYS = {
+    "Products": "product_id",
+    "Invoices": "invoice_id",
+    "Suppliers": "supplier_id",
+    "Categories": "category_id",
+    "Customers": "customer_id",
+    "Users": "user_id",
+}
+PAGE_SIZE = 200
+
+
+def fetch_invoice_items(conn, invoice_id):
+    return conn.execute("""
+        SELECT ii.product_id, p.name as product_name, ii.quantity, ii.price_per_item
+        FROM Invoice_Items ii JOIN Products p ON ii.product_id = p.product_id
+        WHERE invoice_id = ?
+    """, (invoice_id,)).fetchall()
+
+
+def select_invoice_ids(conn, start=None, end=None):
+    # Dates are inclusive 'YYYY-MM-DD' strings; served by idx_invoices_created_at
+    clauses, args = [], []
+    if start:
+        clauses.append("created_at >= ?")
+        args.append(start)
+    if end:
+        clauses.append("created_at < date(?, '+1 day')")
+        args.append(end)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return [row[0] for row in conn.execute(f"SELECT invoice_id FROM Invoices {where} ORDER BY invoice_id", args)]
+
+
+def fetch_invoices(conn, invoiceIds):
+    # -> [invoice dict with an "items" list], in id order. Headers and items for a whole
+    # batch in two queries instead of two per invoice.
+    marks = ", ".join("?" * len(invoiceIds))
+    invoices = {row["invoice_id"]: dict(row) for row in conn.execute(f"""
+        SELECT i.*, COALESCE(c.name, 'Unknown') AS customer_name
+        FROM Invoices i LEFT JOIN Customers c ON c.customer_id = i.customer_id
+        WHERE i.invoice_id IN ({marks}) ORDER BY i.invoice_id
+    """, invoiceIds)}
+    for invoice in invoices.values():
+        invoice["items"] = []
+    for row in conn.execute(f"""
+        SELECT ii.invoice_id, ii.product_id, p.name as product_name, ii.quantity, ii.price_per_item
+        FROM Invoice_Items ii JOIN Products p ON ii.product_id = p.product_id
+        WHERE ii.invoice_id IN ({marks}) ORDER BY ii.invoice_id, ii.item_id
+    """, invoiceIds):
+        invoices[row["invoice_id"]]["items"].append(dict(row))
+    return list(invoices.values())
+
+
+def lookup_barcode(conn, code):
+    # Served by the UNIQUE index on Products.barcode
+    return conn.execute("SELECT product_id, name, price, stock_quantity FROM Products WHERE barcode = ?",
+                        (code,)).fetchone()
+
+
+def update_product(conn, product_id, name, category_id, supplier_id, price, stock_quantity):
+    conn.execute("""
+        UPDATE Products
+        SET name = ?, category_id = ?, supplier_id = ?, price = ?
+        WHERE product_id = ?
+    """, (name, category_id, supplier_id, price, product_id))
+    changes.record("Products", [product_id])
+    # Stock changes go through the ledger as an adjustment
+    stock.set_stock(conn, product_id, stock_quantity)
+
+
+# ---------- record edits ----------
+# The add/edit/delete dialogs write through these so that a client station runs them on
+# the POS server like any other registered operation. Only the columns listed here can be
+# set, which also keeps the column names that reach the SQL fixed.
+EDITABLE_COLUMNS = {
+    "Categories": ("category_name",),
+    "Customers": ("name", "email", "phone_number", "address"),
+    "Suppliers": ("name", "contact_name", "contact_email", "phone_number"),
+    "Users": ("username", "password_hash", "role"),
+}
+# Deleting a row of these tables sets the foreign key to NULL in the dependent table
+DELETE_AFFECTS = {"Categories": "Products", "Suppliers": "Products", "Customers": "Invoices", "Users": "Invoices"}
+# combo box options: table -> (key, label column)
+OPTIONS = {"Categories": ("category_id", "category_name"), "Suppliers": ("supplier_id", "name")}
+
+
+def _editable(table, values):
+    if table not in EDITABLE_COLUMNS:
+        raise ValueError(f"{table} cannot be edited here.")
+    unknown = [c for c in values if c not in EDITABLE_COLUMNS[table]]
+    if unknown or not values:
+        raise ValueError(f"Invalid {table} columns: {', '.join(unknown) or 'none given'}")
+    return list(values)
+
+
+def insert_record(conn, table, values):
+    columns = _editable(table, values)
+    cur = conn.execute(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                       [values[c] for c in columns])
+    changes.record(table, [cur.lastrowid])
+    return cur.lastrowid
+
+
+def update_record(conn, table, record_id, values):
+    columns = _editable(table, values)
+    conn.execute(f"UPDATE {table} SET {', '.join(f'{c} = ?' for c in columns)} WHERE {TABLE_KEYS[table]} = ?",
+                 [values[c] for c in columns] + [record_id])
+    changes.record(table, [record_id])
+
+
+def delete_record(conn, table, record_id):
+    if table not in EDITABLE_COLUMNS and table != "Products":
+        raise ValueError(f"{table} rows cannot be deleted here.")
+    conn.execute(f"DELETE FROM {table} WHERE {TABLE_KEYS[table]} = ?", (record_id,))
+    changes.record(table, [record_id])
+    if table in DELETE_AFFECTS:
+        changes.record(DELETE_AFFECTS[table])
+
+
+def add_product(conn, name, category_id, supplier_id, price, stock_quantity, barcode):
+    # The opening stock reaches the ledger through the products insert trigger
+    cur = conn.execute("""
+        INSERT INTO Products (name, category_id, supplier_id, price, stock_quantity, barcode)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (name, category_id, supplier_id, price, stock_quantity, barcode))
+    changes.record("Products", [cur.lastrowid])
+    return cur.lastrowid
+
+
+def list_options(conn, table):
+    key, column = OPTIONS[table]
+    return conn.execute(f"SELECT {key} AS id, {column} AS label FROM {table} ORDER BY {column}").fetchall()
+
+
+# ---------- record pickers ----------
+# Type-ahead lookups for the pickers in the invoice dialogs. Names are matched by prefix
+# on a NOCASE index (a range scan that stops after one page); tables with a full-text
+# index then top the page up with word matches, so "apple" also finds "Red Apple".
+# kind -> (table, key, label column, extra columns)
+PICKERS = {
+    "products": ("Products", "product_id", "name", ("price", "stock_quantity")),
+    "customers": ("Customers", "customer_id", "name", ("phone_number",)),
+    "users": ("Users", "user_id", "username", ("role",)),
+}
+PICK_LIMIT = 50
+
+
+def _pick_select(kind, alias="t"):
+    table, key, column, extra = PICKERS[kind]
+    columns = ", ".join([f"{alias}.{key} AS id", f"{alias}.{column} AS label"] + [f"{alias}.{c}" for c in extra])
+    return f"SELECT {columns} FROM {table} {alias}"
+
+
+def pick(conn, kind, term="", limit=PICK_LIMIT):
+    table, key, column, extra = PICKERS[kind]
+    term = term.strip()
+    order = f"ORDER BY t.{column} COLLATE NOCASE, t.{key} LIMIT ?"
+    if not term:
+        return conn.execute(f"{_pick_select(kind)} {order}", (limit,)).fetchall()
+    # Everything that sorts between the prefix and the prefix followed by the highest code point
+    rows = conn.execute(f"""
+        {_pick_select(kind)} WHERE t.{column} >= ? COLLATE NOCASE AND t.{column} < ? COLLATE NOCASE {order}
+    """, (term, term + "\U0010ffff", limit)).fetchall()
+    match = search.build_match(term, [column])
+    if len(rows) < limit and match and search.is_searchable(table, column) and search.has_index(conn, table):
+        seen = [r["id"] for r in rows]
+        fts = search.fts_name(table)
+        rows += conn.execute(f"""
+            {_pick_select(kind)} JOIN {fts} f ON f.rowid = t.{key}
+            WHERE {fts} MATCH ? AND t.{key} NOT IN ({", ".join("?" * len(seen))})
+            ORDER BY f.rank LIMIT ?
+        """, [match] + seen + [limit - len(rows)]).fetchall()
+    return rows
+
+
+def pick_record(conn, kind, record_id):
+    table, key, column, extra = PICKERS[kind]
+    return conn.execute(f"{_pick_select(kind)} WHERE t.{key} = ?", (record_id,)).fetchone()
@@ -0,0 +1,219 @@
+import string
+
+import search
+from queries import TABLE_COLUMNS, TABLE_KEYS, PAGE_SIZE
+
+# -------------------- Sorted & Filtered Views --------------------
+# A TableQuery describes what a table view shows: column filters (including ranges such
+# as price between two values) and a sort column. Pages are read with keyset paging on
+# (sort column, primary key), so page N costs the same as page 1 and nothing is counted or
+# skipped with OFFSET. Columns and operators are checked against TABLE_COLUMNS, so a
+# spec coming from a client cannot inject SQL.
+#
+# SQLite sorts NULLs first. A NULL sort value cannot be compared with `>`, so NULL rows
+# and non-NULL rows are read as two phases, each an index range scan.
+
+OPERATORS = {
+    "=": "{col} = ?",
+    "!=": "{col} <> ?",
+    "<": "{col} < ?",
+    "<=": "{col} <= ?",
+    ">": "{col} > ?",
+    ">=": "{col} >= ?",
+    "between": "{col} BETWEEN ? AND ?",
+    "like": "{col} LIKE ?",
+    "match": None,  # full-text match where the column is indexed, LIKE otherwise
+}
+# Name columns sort case-insensitively, which the NOCASE indexes serve
+NOCASE_COLUMNS = {("Products", "name"), ("Customers", "name"), ("Users", "username"),
+                  ("Suppliers", "name"), ("Categories", "category_name")}
+KEY_CHUNK = 500  # keys per IN (...)
+_FOLD = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)  # what NOCASE folds
+
+
+class _Descending:
+    # Inverts the order of a sort key, for positioning rows of a descending view
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+    def __le__(self, other):
+        return other.key <= self.key
+
+    def __gt__(self, other):
+        return other.key > self.key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+
+def _rank(value):
+    # SQLite's cross-type order: NULL < numbers < text < blobs
+    if value is None:
+        return 0
+    if isinstance(value, (int, float)):
+        return 1
+    return 2 if isinstance(value, str) else 3
+
+
+class TableQuery:
+    def __init__(self, table, filters=(), sort=None, descending=False):
+        if table not in TABLE_COLUMNS:
+            raise ValueError(f"Unknown table {table!r}.")
+        columns = TABLE_COLUMNS[table]
+        self.table = table
+        self.key = TABLE_KEYS[table]
+        self.filters = []
+        for column, op, value in filters:
+            if column not in columns:
+                raise ValueError(f"Unknown column {column!r} for {table}.")
+            if op not in OPERATORS:
+                raise ValueError(f"Unknown operator {op!r}.")
+            self.filters.append([column, op, value])
+        if sort is not None and sort not in columns:
+            raise ValueError(f"Unknown column {sort!r} for {table}.")
+        self.sort = None if sort == self.key else sort
+        self.descending = bool(descending)
+        self._nocase = (table, self.sort) in NOCASE_COLUMNS
+
+    @classmethod
+    def fromSpec(cls, spec):
+        if isinstance(spec, TableQuery):
+            return spec
+        return cls(spec["table"], spec.get("filters") or (), spec.get("sort"), spec.get("descending", False))
+
+    def spec(self):
+        # Plain JSON, so a query can be sent to the POS server
+        return {"table": self.table, "filters": self.filters, "sort": self.sort, "descending": self.descending}
+
+    # ---------- SQL ----------
+    def where(self, conn):
+        clauses, args = [], []
+        for column, op, value in self.filters:
+            if op == "match":
+                match = search.build_match(str(value), [column])
+                if match and search.is_searchable(self.table, column) and search.has_index(conn, self.table):
+                    fts = search.fts_name(self.table)
+                    clauses.append(f"{self.key} IN (SELECT rowid FROM {fts} WHERE {fts} MATCH ?)")
+                    args.append(match)
+                    continue
+                op = "like"
+            if op == "like":
+                value = f"%{value}%"
+            clauses.append(OPERATORS[op].format(col=column))
+            args.extend(value if op == "between" else [value])
+        return clauses, args
+
+    def _sortExpr(self):
+        return f"{self.sort} COLLATE NOCASE" if self._nocase else self.sort
+
+    def orderBy(self):
+        direction = "DESC" if self.descending else "ASC"
+        if self.sort is None:
+            return f"ORDER BY {self.key} {direction}"
+        return f"ORDER BY {self._sortExpr()} {direction}, {self.key} {direction}"
+
+    def phases(self):
+        if self.sort is None:
+            return ["all"]
+        return ["values", "nulls"] if self.descending else ["nulls", "values"]
+
+    def cursor(self, row):
+        # Position of a row in the view, used to continue paging after it
+        return [row[self.sort] if self.sort else None, row[self.key]]
+
+    def phaseOf(self, cursor):
+        if self.sort is None:
+            return "all"
+        return "nulls" if cursor[0] is None else "values"
+
+    def phaseClause(self, phase, cursor=None, through=False):
+        # Rows of `phase` after `cursor`, or with through=True up to and including it
+        after, before = ("<", ">") if self.descending else (">", "<")
+        keyOp = (before if through else after) + ("=" if through else "")
+        clauses, args = [], []
+        if phase == "nulls":
+            clauses.append(f"{self.sort} IS NULL")
+        elif phase == "values" and cursor is None:
+            clauses.append(f"{self.sort} IS NOT NULL")
+        if cursor is not None:
+            if phase == "values":
+                # `s >= ? AND (s > ? OR key > ?)` rather than a row value, so the sort
+                # index is searched from the cursor instead of scanned from the start
+                s, value = self._sortExpr(), cursor[0]
+                bound = before if through else after
+                clauses.append(f"{s} {bound}= ? AND ({s} {bound} ? OR {self.key} {keyOp} ?)")
+                args += [value, value, cursor[1]]
+            else:
+                clauses.append(f"{self.key} {keyOp} ?")
+                args.append(cursor[1])
+        return clauses, args
+
+    # ---------- ordering in Python ----------
+    def orderKey(self, row):
+        # Sorts rows the way orderBy() does, for placing changed rows in a loaded view
+        if self.sort is None:
+            key = (row[self.key],)
+        else:
+            value = row[self.sort]
+            if value is None:
+                key = (0, 0, row[self.key])
+            else:
+                if self._nocase and isinstance(value, str):
+                    value = value.translate(_FOLD)
+                key = (_rank(value), value, row[self.key])
+        return _Descending(key) if self.descending else key
+
+
+def _select(query, conn, extra=(), extraArgs=()):
+    clauses, args = query.where(conn)
+    clauses = clauses + list(extra)
+    sql = f"SELECT * FROM {query.table}"
+    if clauses:
+        sql += " WHERE " + " AND ".join(f"({c})" for c in clauses)
+    return sql, args + list(extraArgs)
+
+
+def fetch_page(conn, spec, after=None, limit=PAGE_SIZE):
+    # The page of rows following cursor `after` (from TableQuery.cursor) in view order
+    query = TableQuery.fromSpec(spec)
+    phases = query.phases()
+    if after is not None:
+        phases = phases[phases.index(query.phaseOf(after)):]
+    rows = []
+    for i, phase in enumerate(phases):
+        clauses, args = query.phaseClause(phase, after if i == 0 else None)
+        sql, args = _select(query, conn, clauses, args)
+        rows += conn.execute(f"{sql} {query.orderBy()} LIMIT ?", args + [limit - len(rows)]).fetchall()
+        if len(rows) >= limit:
+            break
+    return rows
+
+
+def fetch_rows(conn, spec, keys=None, upTo=None):
+    # Current rows for the given keys (or every row up to cursor `upTo`) that still match
+    # the view's filters; keys missing from the result were deleted or filtered out
+    query = TableQuery.fromSpec(spec)
+    if keys is not None:
+        rows = []
+        keys = sorted(keys)
+        for i in range(0, len(keys), KEY_CHUNK):
+            chunk = keys[i:i + KEY_CHUNK]
+            sql, args = _select(query, conn, [f"{query.key} IN ({', '.join('?' * len(chunk))})"], chunk)
+            rows += conn.execute(sql, args).fetchall()
+        return rows
+    if upTo is None:
+        sql, args = _select(query, conn)
+        return conn.execute(f"{sql} {query.orderBy()}", args).fetchall()
+    rows = []
+    phases = query.phases()
+    for phase in phases[:phases.index(query.phaseOf(upTo)) + 1]:
+        last = phase == query.phaseOf(upTo)
+        clauses, args = query.phaseClause(phase, upTo if last else None, through=True)
+        sql, args = _select(query, conn, clauses, args)
+        rows += conn.execute(f"{sql} {query.orderBy()}", args).fetchall()
+    return rows
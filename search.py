@@ -0,0 +1,121 @@
+import re, sqlite3
+
+# -------------------- Full-Text Search --------------------
+# External-content FTS5 tables mirror the text columns of their base table. Triggers keep
+# them in sync, so the index stores only tokens and rows are read back from the base table.
+
+FTS_TABLES = {
+    "Products": ("product_id", ("name",)),
+    "Customers": ("customer_id", ("name", "email", "phone_number", "address")),
+    "Suppliers": ("supplier_id", ("name", "contact_name", "contact_email", "phone_number")),
+}
+SEARCH_LIMIT = 500
+
+
+def fts_name(table):
+    return f"{table}_fts"
+
+
+def fts5_available(conn):
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp.fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def has_index(conn, table):
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                       (fts_name(table),)).fetchone()
+    return row is not None
+
+
+def trigger_statements(table):
+    key, columns = FTS_TABLES[table]
+    fts = fts_name(table)
+    cols = ", ".join(columns)
+    new_vals = ", ".join(f"new.{c}" for c in columns)
+    old_vals = ", ".join(f"old.{c}" for c in columns)
+    insert = f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.{key}, {new_vals});"
+    delete = f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.{key}, {old_vals});"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete} END",
+        # Only edits to indexed columns touch the index; stock and price updates skip it
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN {delete} {insert} END",
+    ]
+
+
+def create_triggers(conn, table):
+    for statement in trigger_statements(table):
+        conn.execute(statement)
+
+
+def drop_triggers(conn, table):
+    for suffix in ("ai", "ad", "au"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {fts_name(table)}_{suffix}")
+
+
+def create_indexes(conn):
+    if not fts5_available(conn):
+        return False
+    for table, (key, columns) in FTS_TABLES.items():
+        fts = fts_name(table)
+        conn.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                {", ".join(columns)}, content='{table}', content_rowid='{key}',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )""")
+        create_triggers(conn, table)
+    rebuild(conn)
+    return True
+
+
+def rebuild(conn, tables=None):
+    for table in tables or FTS_TABLES:
+        if has_index(conn, table):
+            fts = fts_name(table)
+            conn.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def optimize(conn):
+    for table in FTS_TABLES:
+        if has_index(conn, table):
+            fts = fts_name(table)
+            conn.execute(f"INSERT INTO {fts}({fts}) VALUES ('optimize')")
+
+
+def is_searchable(table, column):
+    return table in FTS_TABLES and column in FTS_TABLES[table][1]
+
+
+def build_match(term, columns=None):
+    # Every token becomes a quoted prefix query; tokens are ANDed, so "red app" matches "Red Apple"
+    tokens = re.findall(r"\w+", term, re.UNICODE)
+    if not tokens:
+        return None
+    expr = " ".join(f'"{t}"*' for t in tokens)
+    if columns:
+        return "{%s} : (%s)" % (" ".join(columns), expr)
+    return expr
+
+
+def search(conn, table, term, columns=None, limit=SEARCH_LIMIT):
+    key, indexed = FTS_TABLES[table]
+    columns = columns or indexed
+    unknown = [c for c in columns if c not in indexed]
+    if unknown:
+        raise ValueError(f"{table} is not searchable by {', '.join(unknown)}.")
+    if not has_index(conn, table):
+        where = " OR ".join(f"{c} LIKE ?" for c in columns)
+        args = [f"%{term}%"] * len(columns) + [limit]
+        return conn.execute(f"SELECT * FROM {table} WHERE {where} LIMIT ?", args).fetchall()
+    match = build_match(term, columns)
+    if match is None:
+        return []
+    fts = fts_name(table)
+    return conn.execute(f"""
+        SELECT t.* FROM {fts} f JOIN {table} t ON t.{key} = f.rowid
+        WHERE {fts} MATCH ? ORDER BY f.rank LIMIT ?
+    """, (match, limit)).fetchall()
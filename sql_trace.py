@@ -0,0 +1,272 @@
+import json, os, re, sqlite3, sys, threading, time
+
+# -------------------- SQL Tracing --------------------
+# With tracing enabled, connections opened by connection.open_connection() time every
+# statement: how long it ran (execute plus fetching its rows), how many rows it returned
+# or changed, and the code that issued it. Statements are aggregated by their SQL text.
+# Those slower than the threshold are appended to a slow-query log (JSON lines) with their
+# EXPLAIN QUERY PLAN, and plans that read a whole table are flagged.
+#
+# Tracing is off unless enable() is called before the connections are opened; untraced
+# connections are plain sqlite3 connections and cost nothing extra.
+
+SLOW_LOG = "slow_queries.log"
+SLOW_THRESHOLD_MS = 50.0
+MAX_SQL_LENGTH = 2000  # in the slow log
+_SKIP_FILES = {os.path.abspath(__file__), os.path.join(os.path.dirname(os.path.abspath(__file__)), "connection.py")}
+_WHITESPACE = re.compile(r"\s+")
+_FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(?!CONSTANT ROW)(\w+)(?!.*\b(?:USING|VIRTUAL TABLE)\b)")
+
+_enabled = False
+_threshold = SLOW_THRESHOLD_MS / 1000.0
+_logPath = SLOW_LOG
+_lock = threading.Lock()
+_stats = {}  # normalized sql -> StatementStats
+_fullScans = {}  # normalized sql -> tables scanned in full
+
+
+class StatementStats:
+    __slots__ = ("sql", "calls", "total", "max", "rows", "slow", "site")
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.slow = 0
+        self.site = None  # most recent caller, "file:line function"
+
+    def asdict(self):
+        return {"sql": self.sql, "calls": self.calls, "total_ms": round(self.total * 1000, 3),
+                "mean_ms": round(self.total / self.calls * 1000, 3) if self.calls else 0.0,
+                "max_ms": round(self.max * 1000, 3), "rows": self.rows, "slow": self.slow,
+                "full_scan": ", ".join(_fullScans.get(self.sql, ())), "site": self.site}
+
+
+def enable(threshold_ms=SLOW_THRESHOLD_MS, log_path=SLOW_LOG):
+    global _enabled, _threshold, _logPath
+    _enabled = True
+    _threshold = threshold_ms / 1000.0
+    _logPath = log_path
+
+
+def enabled():
+    return _enabled
+
+
+def connection_factory():
+    # For sqlite3.connect(factory=...)
+    return TracedConnection if _enabled else sqlite3.Connection
+
+
+def normalize(sql):
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def call_site():
+    # The first frame outside the tracing and pooling code
+    frame = sys._getframe(2)
+    while frame is not None and os.path.abspath(frame.f_code.co_filename) in _SKIP_FILES:
+        frame = frame.f_back
+    if frame is None:
+        return None
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno} {frame.f_code.co_name}"
+
+
+def full_scans(plan):
+    # Tables an EXPLAIN QUERY PLAN reads row by row without an index
+    return [m.group(1) for m in (_FULL_SCAN.match(row[-1]) for row in plan) if m]
+
+
+def _record(conn, sql, params, elapsed, rows, site):
+    key = normalize(sql)
+    with _lock:
+        stats = _stats.get(key)
+        if stats is None:
+            stats = _stats[key] = StatementStats(key)
+        stats.calls += 1
+        stats.total += elapsed
+        stats.max = max(stats.max, elapsed)
+        stats.rows += max(rows, 0)
+        stats.site = site
+        slow = elapsed >= _threshold
+        if slow:
+            stats.slow += 1
+    if slow:
+        _log_slow(conn, key, sql, params, elapsed, rows, site)
+
+
+def _log_slow(conn, key, sql, params, elapsed, rows, site):
+    plan = []
+    if params is not None:
+        try:
+            cur = sqlite3.Cursor(conn)
+            plan = [tuple(r) for r in sqlite3.Cursor.execute(cur, f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+        except sqlite3.Error:
+            pass
+    scans = full_scans(plan)
+    entry = {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "ms": round(elapsed * 1000, 3), "rows": rows,
+             "site": site, "sql": key[:MAX_SQL_LENGTH], "plan": [row[-1] for row in plan], "full_scan": scans}
+    with _lock:
+        if scans:
+            _fullScans[key] = sorted(set(_fullScans.get(key, ())) | set(scans))
+        try:
+            with open(_logPath, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError:
+            pass
+
+
+def snapshot(order="total_ms"):
+    # Aggregated statement stats, slowest first
+    with _lock:
+        rows = [stats.asdict() for stats in _stats.values()]
+    return sorted(rows, key=lambda row: row[order], reverse=True)
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+        _fullScans.clear()
+
+
+def read_slow_log(path=None, limit=None):
+    # -> slow-log entries aggregated by statement: calls, total/max ms, plan, full scans
+    grouped = {}
+    try:
+        with open(path or _logPath, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                group = grouped.setdefault(entry["sql"], {"sql": entry["sql"], "calls": 0, "total_ms": 0.0,
+                                                          "max_ms": 0.0, "site": None, "plan": [], "full_scan": []})
+                group["calls"] += 1
+                group["total_ms"] = round(group["total_ms"] + entry["ms"], 3)
+                group["max_ms"] = max(group["max_ms"], entry["ms"])
+                group["site"] = entry.get("site")
+                group["plan"] = entry.get("plan") or group["plan"]
+                group["full_scan"] = entry.get("full_scan") or group["full_scan"]
+    except FileNotFoundError:
+        return []
+    rows = sorted(grouped.values(), key=lambda g: g["total_ms"], reverse=True)
+    return rows[:limit] if limit else rows
+
+
+def format_stats(rows, limit=20):
+    lines = [f"{'calls':>7} {'total ms':>10} {'mean ms':>9} {'max ms':>9} {'rows':>9}  statement"]
+    for row in rows[:limit]:
+        flag = f"  [full scan: {row['full_scan']}]" if row["full_scan"] else ""
+        lines.append(f"{row['calls']:>7} {row['total_ms']:>10.2f} {row['mean_ms']:>9.3f} {row['max_ms']:>9.2f} "
+                     f"{row['rows']:>9}  {row['sql'][:100]}{flag}")
+        if row["site"]:
+            lines.append(f"{'':>49}  at {row['site']}")
+    return "\n".join(lines)
+
+
+class TracedCursor(sqlite3.Cursor):
+    # A statement's time runs from execute() until its rows have been read (or the cursor
+    # is reused, closed or dropped); rows counts fetched rows, or rowcount for writes
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._pending = None  # (sql, params, site) of the statement being timed
+        self._elapsed = 0.0
+        self._rows = 0
+
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            sql, params, site = pending
+            rows = self._rows if self.description is not None else self.rowcount
+            _record(self.connection, sql, params, self._elapsed, rows, site)
+
+    def _start(self, sql, params, site):
+        self._finish()
+        self._elapsed = 0.0
+        self._rows = 0
+        self._pending = (sql, params, site)
+
+    def execute(self, sql, params=()):
+        self._start(sql, params, call_site())
+        started = time.perf_counter()
+        try:
+            super().execute(sql, params)
+        except Exception:
+            self._pending = None  # failed statements are not timed
+            raise
+        self._elapsed += time.perf_counter() - started
+        if self.description is None:
+            self._finish()
+        return self
+
+    def executemany(self, sql, seq):
+        self._start(sql, None, call_site())  # no single parameter set to explain with
+        started = time.perf_counter()
+        try:
+            super().executemany(sql, seq)
+        except Exception:
+            self._pending = None
+            raise
+        self._elapsed += time.perf_counter() - started
+        self._finish()
+        return self
+
+    def _timed(self, fetch, *args):
+        started = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            self._elapsed += time.perf_counter() - started
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._finish()
+        else:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        self._rows += len(rows)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._rows += len(rows)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            row = self._timed(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+        self._rows += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class TracedConnection(sqlite3.Connection):
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq):
+        return self.cursor().executemany(sql, seq)
@@ -0,0 +1,198 @@
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import changes
+import metrics
+
+# -------------------- Stock Movements --------------------
+# Every change to Products.stock_quantity goes through here and is mirrored by a row in
+# Stock_Logs, so summing a product's ledger up to any moment gives its stock at that time.
+# Quantities in the ledger are signed: additions and returns positive, sales negative.
+
+CHANGE_TYPES = ("Addition", "Sale", "Return", "Adjustment")
+
+
+class InsufficientStock(ValueError):
+    def __init__(self, product_id, requested, available, name=None):
+        super().__init__(f"Only {available} of {name or f'product {product_id}'} in stock, {requested} requested.")
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+        self.name = name
+
+
+def create_ledger(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS Stock_Logs (
+            log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            change_type TEXT CHECK(change_type IN ('Addition', 'Sale', 'Return', 'Adjustment')) NOT NULL,
+            quantity INTEGER NOT NULL,
+            invoice_id INTEGER,
+            created_at TEXT DEFAULT (datetime('now')),
+            FOREIGN KEY (product_id) REFERENCES Products(product_id) ON DELETE CASCADE
+        )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_stock_logs_product ON Stock_Logs(product_id, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_stock_logs_invoice ON Stock_Logs(invoice_id)")
+    create_ledger_trigger(conn)
+    # Existing products get an opening balance equal to their current stock
+    conn.execute("""
+        INSERT INTO Stock_Logs (product_id, change_type, quantity, created_at)
+        SELECT product_id, 'Addition', stock_quantity, COALESCE(created_at, datetime('now')) FROM Products
+        WHERE stock_quantity <> 0
+          AND product_id NOT IN (SELECT product_id FROM Stock_Logs)
+    """)
+
+
+def create_ledger_trigger(conn):
+    # New products open their ledger with the stock they were created with
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS stock_logs_products_ai AFTER INSERT ON Products
+        WHEN new.stock_quantity <> 0 BEGIN
+            INSERT INTO Stock_Logs (product_id, change_type, quantity, created_at)
+            VALUES (new.product_id, 'Addition', new.stock_quantity, COALESCE(new.created_at, datetime('now')));
+        END""")
+
+
+def drop_ledger_trigger(conn):
+    # For bulk loads that write the products' opening balances themselves
+    conn.execute("DROP TRIGGER IF EXISTS stock_logs_products_ai")
+
+
+@contextmanager
+def _transaction(conn):
+    # Joins the caller's transaction if there is one, otherwise takes the write lock up front
+    if conn.in_transaction:
+        yield
+        return
+    started = time.perf_counter()
+    conn.execute("BEGIN IMMEDIATE")  # waits (up to the busy timeout) while another process writes
+    metrics.DB_LOCK_WAIT_SECONDS.labels("database").observe(time.perf_counter() - started)
+    try:
+        yield
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _quantities(items):
+    totals = Counter()
+    for item in items:
+        totals[item["product_id"]] += item["quantity"]
+    return totals
+
+
+def apply_movements(conn, deltas, change_type, invoice_id=None):
+    # deltas: {product_id: signed change}. Decrements are guarded in the UPDATE itself, so two
+    # cashiers selling the last unit cannot both succeed.
+    log = []
+    for product_id, delta in sorted(deltas.items()):
+        if delta == 0:
+            continue
+        if delta < 0:
+            cur = conn.execute("""
+                UPDATE Products SET stock_quantity = stock_quantity - ?
+                WHERE product_id = ? AND stock_quantity >= ?
+            """, (-delta, product_id, -delta))
+        else:
+            cur = conn.execute("UPDATE Products SET stock_quantity = stock_quantity + ? WHERE product_id = ?",
+                               (delta, product_id))
+        if cur.rowcount == 0:
+            row = conn.execute("SELECT stock_quantity, name FROM Products WHERE product_id = ?",
+                               (product_id,)).fetchone()
+            if row is None:
+                raise ValueError(f"Product {product_id} does not exist.")
+            raise InsufficientStock(product_id, -delta, row[0], row[1])
+        log.append((product_id, change_type(delta) if callable(change_type) else change_type, delta, invoice_id))
+    conn.executemany("INSERT INTO Stock_Logs (product_id, change_type, quantity, invoice_id) VALUES (?, ?, ?, ?)",
+                     log)
+    if log:
+        changes.record("Products", [row[0] for row in log])
+    return len(log)
+
+
+def _sale_or_return(delta):
+    return "Sale" if delta < 0 else "Return"
+
+
+def save_invoice(conn, invoice_id, customer_id, user_id, payment_status, items):
+    # Header, items, stock and ledger change together or not at all. Editing an invoice only
+    # moves stock by the difference between its old and new lines.
+    total = sum(item["quantity"] * item["price_per_item"] for item in items)
+    with _transaction(conn):
+        cur = conn.cursor()
+        if invoice_id is not None:
+            old = _quantities(cur.execute("SELECT product_id, quantity FROM Invoice_Items WHERE invoice_id = ?",
+                                          (invoice_id,)))
+            cur.execute("""
+                UPDATE Invoices
+                SET customer_id = ?, user_id = ?, total_amount = ?, payment_status = ?
+                WHERE invoice_id = ?
+            """, (customer_id, user_id, total, payment_status, invoice_id))
+            cur.execute("DELETE FROM Invoice_Items WHERE invoice_id = ?", (invoice_id,))
+        else:
+            old = Counter()
+            cur.execute("""
+                INSERT INTO Invoices (customer_id, user_id, total_amount, payment_status)
+                VALUES (?, ?, ?, ?)
+            """, (customer_id, user_id, total, payment_status))
+            invoice_id = cur.lastrowid
+        new = _quantities(items)
+        deltas = {pid: old[pid] - new[pid] for pid in set(old) | set(new) if pid is not None}
+        apply_movements(conn, deltas, _sale_or_return, invoice_id)
+        cur.executemany("""
+            INSERT INTO Invoice_Items (invoice_id, product_id, quantity, price_per_item)
+            VALUES (?, ?, ?, ?)
+        """, [(invoice_id, item["product_id"], item["quantity"], item["price_per_item"]) for item in items])
+        changes.record("Invoices", [invoice_id])
+    return invoice_id
+
+
+def delete_invoice(conn, invoice_id):
+    # Deleting an invoice puts its items back on the shelf
+    with _transaction(conn):
+        old = _quantities(conn.execute("SELECT product_id, quantity FROM Invoice_Items WHERE invoice_id = ?",
+                                       (invoice_id,)))
+        apply_movements(conn, {pid: qty for pid, qty in old.items() if pid is not None}, "Return", invoice_id)
+        conn.execute("DELETE FROM Invoice_Items WHERE invoice_id = ?", (invoice_id,))
+        conn.execute("DELETE FROM Invoices WHERE invoice_id = ?", (invoice_id,))
+        changes.record("Invoices", [invoice_id])
+
+
+def set_stock(conn, product_id, quantity, change_type="Adjustment"):
+    # Manual corrections (stock takes, edits in the product dialog) are logged as the difference
+    with _transaction(conn):
+        row = conn.execute("SELECT stock_quantity FROM Products WHERE product_id = ?", (product_id,)).fetchone()
+        if row is None:
+            raise ValueError(f"Product {product_id} does not exist.")
+        if quantity < 0:
+            raise ValueError("Stock quantity cannot be negative.")
+        apply_movements(conn, {product_id: quantity - row[0]}, change_type)
+
+
+def stock_at(conn, product_id, at):
+    # Stock on hand at timestamp `at` ('YYYY-MM-DD HH:MM:SS' or a date), read from the ledger
+    row = conn.execute("SELECT COALESCE(SUM(quantity), 0) FROM Stock_Logs WHERE product_id = ? AND created_at <= ?",
+                       (product_id, at)).fetchone()
+    return row[0]
+
+
+def stock_levels_at(conn, at):
+    return dict(conn.execute("""
+        SELECT product_id, SUM(quantity) FROM Stock_Logs WHERE created_at <= ? GROUP BY product_id
+    """, (at,)).fetchall())
+
+
+def rebuild_stock(conn):
+    # Recompute Products.stock_quantity from the ledger; returns the products that had drifted
+    with _transaction(conn):
+        drifted = conn.execute("""
+            UPDATE Products SET stock_quantity = COALESCE(
+                (SELECT SUM(quantity) FROM Stock_Logs l WHERE l.product_id = Products.product_id), 0)
+            WHERE stock_quantity <> COALESCE(
+                (SELECT SUM(quantity) FROM Stock_Logs l WHERE l.product_id = Products.product_id), 0)
+        """).rowcount
+        changes.record("Products")
+    return drifted
@@ -0,0 +1,185 @@
+# -------------------- Summary Tables --------------------
+# Running totals kept up to date by triggers on the base tables, so dashboard figures are
+# index lookups instead of scans over Invoices and Invoice_Items. rebuild() recomputes them
+# from scratch (after bulk loads that ran with the triggers dropped, or to clear drift).
+
+SUMMARY_TABLES = {
+    # Revenue and invoice count per calendar day of Invoices.created_at
+    "Sales_Daily": """
+        CREATE TABLE IF NOT EXISTS Sales_Daily (
+            day TEXT PRIMARY KEY,
+            invoice_count INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0
+        ) WITHOUT ROWID""",
+    # Units and revenue per product over all invoice lines
+    "Sales_Product": """
+        CREATE TABLE IF NOT EXISTS Sales_Product (
+            product_id INTEGER PRIMARY KEY,
+            units_sold INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0
+        )""",
+    # Current stock per category; category_id 0 collects uncategorised products
+    "Stock_Category": """
+        CREATE TABLE IF NOT EXISTS Stock_Category (
+            category_id INTEGER PRIMARY KEY,
+            product_count INTEGER NOT NULL DEFAULT 0,
+            units_in_stock INTEGER NOT NULL DEFAULT 0,
+            stock_value REAL NOT NULL DEFAULT 0
+        )""",
+}
+SUMMARY_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_sales_product_units ON Sales_Product(units_sold)",
+)
+
+
+# Invoices without a (valid) created_at have no day; like rebuild(), the triggers skip them
+# rather than abort the write on Sales_Daily's NOT NULL key
+def _add_day(row):
+    return f"""INSERT INTO Sales_Daily (day, invoice_count, revenue)
+        SELECT date({row}.created_at), 1, {row}.total_amount
+        WHERE date({row}.created_at) IS NOT NULL
+        ON CONFLICT(day) DO UPDATE SET invoice_count = invoice_count + 1,
+                                       revenue = revenue + excluded.revenue;"""
+
+
+def _remove_day(row):
+    return f"""UPDATE Sales_Daily SET invoice_count = invoice_count - 1, revenue = revenue - {row}.total_amount
+        WHERE day = date({row}.created_at) AND date({row}.created_at) IS NOT NULL;
+        DELETE FROM Sales_Daily WHERE day = date({row}.created_at) AND invoice_count <= 0;"""
+
+
+def _add_product(row):
+    return f"""INSERT INTO Sales_Product (product_id, units_sold, revenue)
+        SELECT {row}.product_id, {row}.quantity, {row}.quantity * {row}.price_per_item
+        WHERE {row}.product_id IS NOT NULL
+        ON CONFLICT(product_id) DO UPDATE SET units_sold = units_sold + excluded.units_sold,
+                                              revenue = revenue + excluded.revenue;"""
+
+
+def _remove_product(row):
+    return f"""UPDATE Sales_Product SET units_sold = units_sold - {row}.quantity,
+        revenue = revenue - {row}.quantity * {row}.price_per_item
+        WHERE product_id = {row}.product_id;"""
+
+
+def _add_stock(row):
+    return f"""INSERT INTO Stock_Category (category_id, product_count, units_in_stock, stock_value)
+        VALUES (COALESCE({row}.category_id, 0), 1, {row}.stock_quantity, {row}.stock_quantity * {row}.price)
+        ON CONFLICT(category_id) DO UPDATE SET product_count = product_count + 1,
+                                               units_in_stock = units_in_stock + excluded.units_in_stock,
+                                               stock_value = stock_value + excluded.stock_value;"""
+
+
+def _remove_stock(row):
+    return f"""UPDATE Stock_Category SET product_count = product_count - 1,
+        units_in_stock = units_in_stock - {row}.stock_quantity,
+        stock_value = stock_value - {row}.stock_quantity * {row}.price
+        WHERE category_id = COALESCE({row}.category_id, 0);
+        DELETE FROM Stock_Category WHERE category_id = COALESCE({row}.category_id, 0) AND product_count <= 0;"""
+
+
+# trigger name -> CREATE TRIGGER statement
+SUMMARY_TRIGGERS = {
+    "summary_invoices_ai": f"AFTER INSERT ON Invoices BEGIN {_add_day('new')} END",
+    "summary_invoices_ad": f"AFTER DELETE ON Invoices BEGIN {_remove_day('old')} END",
+    "summary_invoices_au": (f"AFTER UPDATE OF total_amount, created_at ON Invoices "
+                            f"BEGIN {_remove_day('old')} {_add_day('new')} END"),
+    "summary_items_ai": f"AFTER INSERT ON Invoice_Items BEGIN {_add_product('new')} END",
+    "summary_items_ad": f"AFTER DELETE ON Invoice_Items BEGIN {_remove_product('old')} END",
+    "summary_items_au": (f"AFTER UPDATE OF product_id, quantity, price_per_item ON Invoice_Items "
+                         f"BEGIN {_remove_product('old')} {_add_product('new')} END"),
+    "summary_products_ai": f"AFTER INSERT ON Products BEGIN {_add_stock('new')} END",
+    "summary_products_ad": (f"AFTER DELETE ON Products BEGIN {_remove_stock('old')} "
+                            f"DELETE FROM Sales_Product WHERE product_id = old.product_id; END"),
+    # Name and barcode edits leave the stock totals alone
+    "summary_products_au": (f"AFTER UPDATE OF category_id, price, stock_quantity ON Products "
+                            f"BEGIN {_remove_stock('old')} {_add_stock('new')} END"),
+}
+
+
+def create_triggers(conn):
+    for name, body in SUMMARY_TRIGGERS.items():
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+
+
+def drop_triggers(conn):
+    for name in SUMMARY_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def create_tables(conn):
+    for statement in SUMMARY_TABLES.values():
+        conn.execute(statement)
+    for statement in SUMMARY_INDEXES:
+        conn.execute(statement)
+    create_triggers(conn)
+    rebuild(conn)
+
+
+def rebuild(conn):
+    for table in SUMMARY_TABLES:
+        conn.execute(f"DELETE FROM {table}")
+    conn.execute("""
+        INSERT INTO Sales_Daily (day, invoice_count, revenue)
+        SELECT date(created_at), COUNT(*), SUM(total_amount) FROM Invoices
+        WHERE date(created_at) IS NOT NULL GROUP BY date(created_at)
+    """)
+    conn.execute("""
+        INSERT INTO Sales_Product (product_id, units_sold, revenue)
+        SELECT product_id, SUM(quantity), SUM(quantity * price_per_item) FROM Invoice_Items
+        WHERE product_id IS NOT NULL GROUP BY product_id
+    """)
+    conn.execute("""
+        INSERT INTO Stock_Category (category_id, product_count, units_in_stock, stock_value)
+        SELECT COALESCE(category_id, 0), COUNT(*), SUM(stock_quantity), SUM(stock_quantity * price)
+        FROM Products GROUP BY COALESCE(category_id, 0)
+    """)
+
+
+# -------------------- Reads --------------------
+def sales_between(conn, start, end):
+    # Inclusive 'YYYY-MM-DD' bounds; a range scan over one row per day
+    row = conn.execute("""
+        SELECT COALESCE(SUM(invoice_count), 0) AS invoice_count, COALESCE(SUM(revenue), 0) AS revenue
+        FROM Sales_Daily WHERE day BETWEEN ? AND ?
+    """, (start, end)).fetchone()
+    return row["invoice_count"], row["revenue"]
+
+
+def daily_sales(conn, days=30):
+    return conn.execute("""
+        SELECT day, invoice_count, revenue FROM Sales_Daily
+        WHERE day > date('now', ?) ORDER BY day DESC
+    """, (f"-{days} days",)).fetchall()
+
+
+def top_products(conn, limit=10):
+    return conn.execute("""
+        SELECT s.product_id, p.name, s.units_sold, s.revenue
+        FROM Sales_Product s JOIN Products p ON p.product_id = s.product_id
+        ORDER BY s.units_sold DESC LIMIT ?
+    """, (limit,)).fetchall()
+
+
+def stock_by_category(conn):
+    return conn.execute("""
+        SELECT s.category_id, COALESCE(c.category_name, 'Uncategorised') AS category_name,
+               s.product_count, s.units_in_stock, s.stock_value
+        FROM Stock_Category s LEFT JOIN Categories c ON c.category_id = s.category_id
+        ORDER BY s.stock_value DESC
+    """).fetchall()
+
+
+def dashboard(conn, days=30, limit=10):
+    today = conn.execute("SELECT date('now')").fetchone()[0]
+    start = conn.execute("SELECT date('now', ?)", (f"-{days - 1} days",)).fetchone()[0]
+    stock = stock_by_category(conn)
+    return {
+        "today": sales_between(conn, today, today),
+        "period": sales_between(conn, start, today),
+        "days": days,
+        "daily": daily_sales(conn, days),
+        "top_products": top_products(conn, limit),
+        "stock": stock,
+        "stock_value": sum(row["stock_value"] for row in stock),
+    }
@@ -0,0 +1,42 @@
+import os, shutil, sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import changes
+from connection import open_connection
+from migrations import migrate
+
+SHIPPED_DB = os.path.join(ROOT, "inventory_billing.db")
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    # A copy of the shipped database, so tests never touch the real one
+    path = tmp_path / "inventory_billing.db"
+    shutil.copyfile(SHIPPED_DB, path)
+    return str(path)
+
+
+@pytest.fixture
+def conn(db_file):
+    conn = open_connection(db_file)
+    migrate(conn)
+    yield conn
+    changes.flush(committed=False)
+    conn.close()
+
+
+@pytest.fixture
+def pool(db_file, monkeypatch):
+    # The connection pool (and so connection.run) pointed at a migrated copy
+    import connection
+    conn = open_connection(db_file)
+    migrate(conn)
+    conn.close()
+    connection.close_pool()
+    monkeypatch.setattr(connection, "DB_FILE", db_file)
+    yield db_file
+    connection.close_pool()
@@ -0,0 +1,50 @@
+import sqlite3
+
+import pytest
+
+from connection import get_connection
+
+
+def _names(db_file):
+    conn = sqlite3.connect(db_file)
+    try:
+        return {row[0] for row in conn.execute("SELECT category_name FROM Categories")}
+    finally:
+        conn.close()
+
+
+def _add(conn, name):
+    conn.execute("INSERT INTO Categories (category_name) VALUES (?)", (name,))
+
+
+def test_nested_block_does_not_commit_outer_work(pool):
+    with get_connection() as outer:
+        _add(outer, "Outer")
+        with get_connection() as inner:
+            _add(inner, "Inner")
+        # Neither is visible to other connections until the outer block commits
+        assert not {"Outer", "Inner"} & _names(pool)
+    assert {"Outer", "Inner"} <= _names(pool)
+
+
+def test_nested_failure_undoes_only_its_own_work(pool):
+    with get_connection() as outer:
+        _add(outer, "Outer")
+        with pytest.raises(sqlite3.IntegrityError):
+            with get_connection() as inner:
+                _add(inner, "Inner")
+                _add(inner, "Outer")  # UNIQUE
+        _add(outer, "After")
+    names = _names(pool)
+    assert {"Outer", "After"} <= names
+    assert "Inner" not in names
+
+
+def test_outer_failure_undoes_nested_work(pool):
+    with pytest.raises(RuntimeError):
+        with get_connection() as outer:
+            with get_connection() as inner:
+                _add(inner, "Inner")
+            _add(outer, "Outer")
+            raise RuntimeError
+    assert not {"Outer", "Inner"} & _names(pool)
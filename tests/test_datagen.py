@@ -0,0 +1,39 @@
+import connection
+import cli
+import stock
+from connection import open_connection
+
+# table -> (generate option, rows to add)
+VOLUMES = {"Categories": ("categories", 30), "Suppliers": ("suppliers", 5), "Products": ("products", 50),
+           "Customers": ("customers", 20), "Users": ("users", 3), "Invoices": ("invoices", 100),
+           "Invoice_Items": ("items", 300)}
+
+
+def _counts(conn):
+    return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in VOLUMES}
+
+
+def test_generate_adds_to_shipped_database(db_file, monkeypatch):
+    monkeypatch.setattr(connection, "DB_FILE", connection.DB_FILE)
+    conn = open_connection(db_file)
+    before = _counts(conn)
+    categories = conn.execute("SELECT category_id, category_name FROM Categories").fetchall()
+    conn.close()
+
+    argv = ["--db", db_file, "generate", "--seed", "7"]
+    for option, count in VOLUMES.values():
+        argv += [f"--{option}", str(count)]
+    assert cli.main(argv) == 0
+
+    conn = open_connection(db_file)
+    try:
+        assert _counts(conn) == {table: before[table] + count for table, (_, count) in VOLUMES.items()}
+        # Existing categories are kept; generated names that clash with them get the id appended
+        for row in categories:
+            assert conn.execute("SELECT category_name FROM Categories WHERE category_id = ?",
+                                (row[0],)).fetchone()[0] == row[1]
+        names = [row[0] for row in conn.execute("SELECT category_name FROM Categories")]
+        assert len(names) == len(set(names))
+        assert stock.rebuild_stock(conn) == 0
+    finally:
+        conn.close()
@@ -0,0 +1,38 @@
+from connection import open_connection
+from migrations import LATEST_VERSION, migrate, schema_version
+
+
+def _state(conn):
+    schema = conn.execute("SELECT type, name, tbl_name, sql FROM sqlite_master ORDER BY type, name").fetchall()
+    tables = [row[1] for row in schema if row[0] == "table" and not row[1].startswith("sqlite_")]
+    data = {table: sorted(map(tuple, conn.execute(f'SELECT * FROM "{table}"')), key=repr) for table in tables}
+    return schema_version(conn), [tuple(row) for row in schema], data
+
+
+def test_migrate_upgrades_shipped_database(db_file):
+    conn = open_connection(db_file)
+    try:
+        applied = migrate(conn)
+        assert applied and applied[-1][0] == LATEST_VERSION
+        assert schema_version(conn) == LATEST_VERSION
+    finally:
+        conn.close()
+
+
+def test_second_migrate_is_a_no_op(db_file):
+    conn = open_connection(db_file)
+    try:
+        migrate(conn)
+        before = _state(conn)
+        assert migrate(conn) == []
+        assert _state(conn) == before
+    finally:
+        conn.close()
+
+    # Also from a fresh connection, as on the next start of the app
+    conn = open_connection(db_file)
+    try:
+        assert migrate(conn) == []
+        assert _state(conn) == before
+    finally:
+        conn.close()
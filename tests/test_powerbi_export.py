@@ -0,0 +1,58 @@
+import csv, os
+
+import powerbi_export
+import stock
+
+
+def _csv(directory, name):
+    with open(os.path.join(directory, f"{name}.csv"), newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def _table(conn, table, key):
+    return [["" if value is None else str(value) for value in row]
+            for row in conn.execute(f"SELECT * FROM {table} ORDER BY {key}")]
+
+
+def _assert_exported(conn, directory):
+    for name in ("invoices", "invoice_items"):
+        table, key, _ = powerbi_export.EXPORTS[name]
+        assert _csv(directory, name)[1:] == _table(conn, table, key)
+
+
+def _export(conn, directory):
+    return powerbi_export.export_all(conn, directory, names=["invoices", "invoice_items"])
+
+
+def _item(product_id, quantity):
+    return {"product_id": product_id, "quantity": quantity, "price_per_item": 1.0}
+
+
+def test_incremental_export_applies_edits_and_deletes(conn, tmp_path):
+    directory = str(tmp_path / "out")
+    products = [row[0] for row in conn.execute("SELECT product_id FROM Products WHERE stock_quantity >= 10")]
+    first = stock.save_invoice(conn, None, 1, 2, "paid", [_item(products[0], 1), _item(products[1], 2)])
+    second = stock.save_invoice(conn, None, 1, 2, "paid", [_item(products[0], 1)])
+    written = _export(conn, directory)
+    _assert_exported(conn, directory)
+    assert written["invoice_items"] == conn.execute("SELECT COUNT(*) FROM Invoice_Items").fetchone()[0]
+
+    # Nothing changed: nothing is read again
+    assert _export(conn, directory) == {"invoices": 0, "invoice_items": 0}
+
+    # An edited invoice replaces its lines, a deleted one drops them, a new one is added
+    stock.save_invoice(conn, first, 1, 2, "pending", [_item(products[1], 1)])
+    stock.delete_invoice(conn, second)
+    stock.save_invoice(conn, None, 1, 2, "paid", [_item(products[0], 3)])
+    assert _export(conn, directory) == {"invoices": 2, "invoice_items": 2}
+    _assert_exported(conn, directory)
+
+
+def test_empty_table_truncates_file(conn, tmp_path):
+    directory = str(tmp_path / "out")
+    _export(conn, directory)
+    for (invoiceId,) in conn.execute("SELECT invoice_id FROM Invoices").fetchall():
+        stock.delete_invoice(conn, invoiceId)
+    _export(conn, directory)
+    assert len(_csv(directory, "invoices")) == 1  # header only
+    assert len(_csv(directory, "invoice_items")) == 1
@@ -0,0 +1,58 @@
+import pytest
+
+import changes
+import product_index
+from connection import run
+from product_index import ProductIndex
+
+
+@pytest.fixture
+def index(pool):
+    index = ProductIndex()
+    yield index
+    changes.unsubscribe(index._onChange)
+
+
+def _first_product(conn):
+    return conn.execute("SELECT barcode, product_id, price FROM Products WHERE barcode IS NOT NULL "
+                        "ORDER BY product_id").fetchone()
+
+
+def _set_price(conn, productId, price):
+    conn.execute("UPDATE Products SET price = ? WHERE product_id = ?", (price, productId))
+    changes.record("Products", [productId])
+
+
+def test_change_refreshed_during_load_survives_the_snapshot(index, monkeypatch):
+    code, productId, price = run(_first_product)
+    fetch = product_index.fetch_entries
+
+    def slowFetch(conn, productIds=None):
+        rows = fetch(conn, productIds)
+        if productIds is None:
+            # The snapshot is read; the product changes and a lookup refreshes it before it is installed
+            monkeypatch.setattr(product_index, "fetch_entries", fetch)
+            run(_set_price, productId, price + 1)
+            assert index.lookup(code).price == price + 1
+        return rows
+
+    monkeypatch.setattr(product_index, "fetch_entries", slowFetch)
+    index.load()
+    assert index.complete
+    assert index.lookup(code).price == price + 1
+
+
+def test_failed_refresh_is_retried(index, monkeypatch):
+    code, productId, price = run(_first_product)
+    index.load()
+    run(_set_price, productId, price + 2)
+
+    def failingFetch(conn, productIds=None):
+        raise OSError("server unreachable")
+
+    fetch = product_index.fetch_entries
+    monkeypatch.setattr(product_index, "fetch_entries", failingFetch)
+    with pytest.raises(OSError):
+        index.lookup(code)
+    monkeypatch.setattr(product_index, "fetch_entries", fetch)
+    assert index.lookup(code).price == price + 2
@@ -0,0 +1,70 @@
+import pytest
+
+import query_builder
+from query_builder import TableQuery
+
+
+@pytest.fixture
+def products(conn):
+    # Supplier ids with ties and NULLs spread across the key range
+    supplier = conn.execute("INSERT INTO Suppliers (name) VALUES ('Second supplier')").lastrowid
+    first = conn.execute("SELECT MIN(supplier_id) FROM Suppliers").fetchone()[0]
+    for i, supplier_id in enumerate([None, supplier, first, None, first, supplier, None, first]):
+        conn.execute("INSERT INTO Products (name, supplier_id, price, stock_quantity) VALUES (?, ?, ?, 1)",
+                     (f"Item {i}", supplier_id, 1.0 + i))
+    conn.commit()
+    return conn
+
+
+def _page_through(conn, spec, limit):
+    query = TableQuery.fromSpec(spec)
+    rows, after = [], None
+    while True:
+        page = query_builder.fetch_page(conn, spec, after, limit)
+        rows += page
+        if len(page) < limit:
+            return rows
+        after = query.cursor(page[-1])
+
+
+def _keys(rows):
+    return [row["product_id"] for row in rows]
+
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("limit", [1, 2, 3, 100])
+def test_paging_with_null_sort_values(products, descending, limit):
+    spec = TableQuery("Products", sort="supplier_id", descending=descending).spec()
+    direction = "DESC" if descending else "ASC"
+    expected = _keys(products.execute(
+        f"SELECT product_id FROM Products ORDER BY supplier_id {direction}, product_id {direction}").fetchall())
+    rows = _page_through(products, spec, limit)
+
+    assert _keys(rows) == expected
+    # NULLs sort first ascending and last descending, as in SQLite
+    nulls = [row["supplier_id"] is None for row in rows]
+    assert nulls == sorted(nulls, reverse=not descending)
+    assert 0 < sum(nulls) < len(rows)
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_order_key_matches_sql_order(products, descending):
+    query = TableQuery("Products", sort="supplier_id", descending=descending)
+    rows = query_builder.fetch_rows(products, query.spec())
+    assert _keys(sorted(rows, key=query.orderKey)) == _keys(rows)
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_fetch_rows_up_to_cursor_across_null_phase(products, descending):
+    query = TableQuery("Products", sort="supplier_id", descending=descending)
+    rows = _page_through(products, query.spec(), 100)
+    for i, row in enumerate(rows):
+        upTo = query_builder.fetch_rows(products, query.spec(), upTo=query.cursor(row))
+        assert _keys(upTo) == _keys(rows[:i + 1])
+
+
+def test_filtered_paging_with_null_sort_values(products):
+    spec = TableQuery("Products", filters=[("price", ">=", 3.0)], sort="supplier_id").spec()
+    expected = _keys(products.execute(
+        "SELECT product_id FROM Products WHERE price >= 3.0 ORDER BY supplier_id, product_id").fetchall())
+    assert _keys(_page_through(products, spec, 2)) == expected
@@ -0,0 +1,85 @@
+import pytest
+
+import stock
+from stock import InsufficientStock
+
+
+def _stock(conn, product_id):
+    return conn.execute("SELECT stock_quantity FROM Products WHERE product_id = ?", (product_id,)).fetchone()[0]
+
+
+def _ledger(conn, product_id):
+    return conn.execute("SELECT COALESCE(SUM(quantity), 0) FROM Stock_Logs WHERE product_id = ?",
+                        (product_id,)).fetchone()[0]
+
+
+def _product(conn, name, quantity):
+    cur = conn.execute("INSERT INTO Products (name, price, stock_quantity) VALUES (?, 10.0, ?)", (name, quantity))
+    conn.commit()
+    return cur.lastrowid
+
+
+def _item(product_id, quantity):
+    return {"product_id": product_id, "quantity": quantity, "price_per_item": 10.0}
+
+
+def _save(conn, invoice_id, items):
+    return stock.save_invoice(conn, invoice_id, 1, 2, "paid", items)
+
+
+def test_new_invoice_takes_stock(conn):
+    pid = _product(conn, "Widget", 10)
+    _save(conn, None, [_item(pid, 3)])
+    assert _stock(conn, pid) == 7
+    assert _ledger(conn, pid) == 7
+
+
+def test_editing_invoice_moves_stock_by_difference(conn):
+    a, b, c = _product(conn, "A", 10), _product(conn, "B", 10), _product(conn, "C", 10)
+    invoice_id = _save(conn, None, [_item(a, 4), _item(b, 2)])
+    assert (_stock(conn, a), _stock(conn, b), _stock(conn, c)) == (6, 8, 10)
+
+    # More of a, b dropped, c added
+    assert _save(conn, invoice_id, [_item(a, 6), _item(c, 1)]) == invoice_id
+    assert (_stock(conn, a), _stock(conn, b), _stock(conn, c)) == (4, 10, 9)
+    assert [_ledger(conn, pid) for pid in (a, b, c)] == [4, 10, 9]
+    types = dict(conn.execute("""
+        SELECT product_id, change_type FROM Stock_Logs WHERE invoice_id = ? AND log_id IN
+            (SELECT MAX(log_id) FROM Stock_Logs WHERE invoice_id = ? GROUP BY product_id)
+    """, (invoice_id, invoice_id)).fetchall())
+    assert types == {a: "Sale", b: "Return", c: "Sale"}
+
+    # Saving the same lines again changes nothing
+    logs = conn.execute("SELECT COUNT(*) FROM Stock_Logs").fetchone()[0]
+    _save(conn, invoice_id, [_item(a, 6), _item(c, 1)])
+    assert (_stock(conn, a), _stock(conn, b), _stock(conn, c)) == (4, 10, 9)
+    assert conn.execute("SELECT COUNT(*) FROM Stock_Logs").fetchone()[0] == logs
+
+
+def test_overselling_is_blocked(conn):
+    a, b = _product(conn, "A", 10), _product(conn, "Short", 2)
+    invoices = conn.execute("SELECT COUNT(*) FROM Invoices").fetchone()[0]
+    logs = conn.execute("SELECT COUNT(*) FROM Stock_Logs").fetchone()[0]
+
+    with pytest.raises(InsufficientStock) as info:
+        _save(conn, None, [_item(a, 1), _item(b, 3)])
+    assert (info.value.product_id, info.value.requested, info.value.available) == (b, 3, 2)
+    assert info.value.name == "Short"
+
+    # Nothing from the failed save is kept
+    assert (_stock(conn, a), _stock(conn, b)) == (10, 2)
+    assert conn.execute("SELECT COUNT(*) FROM Invoices").fetchone()[0] == invoices
+    assert conn.execute("SELECT COUNT(*) FROM Stock_Logs").fetchone()[0] == logs
+
+
+def test_editing_invoice_cannot_oversell(conn):
+    pid = _product(conn, "Widget", 5)
+    invoice_id = _save(conn, None, [_item(pid, 3)])
+
+    # Only the 2 extra units are checked against the 2 left on the shelf
+    _save(conn, invoice_id, [_item(pid, 5)])
+    assert _stock(conn, pid) == 0
+    with pytest.raises(InsufficientStock):
+        _save(conn, invoice_id, [_item(pid, 6)])
+    assert _stock(conn, pid) == 0
+    assert conn.execute("SELECT quantity FROM Invoice_Items WHERE invoice_id = ?", (invoice_id,)).fetchone()[0] == 5
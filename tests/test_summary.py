@@ -0,0 +1,40 @@
+import pytest
+
+import summary
+
+
+def _tables(conn):
+    return {table: conn.execute(f"SELECT * FROM {table} ORDER BY 1").fetchall() for table in summary.SUMMARY_TABLES}
+
+
+def _rebuilt(conn):
+    conn.execute("SAVEPOINT check_rebuild")
+    summary.rebuild(conn)
+    rebuilt = _tables(conn)
+    conn.execute("ROLLBACK TO check_rebuild")
+    conn.execute("RELEASE check_rebuild")
+    return rebuilt
+
+
+def _insert(conn, created_at):
+    return conn.execute("""
+        INSERT INTO Invoices (customer_id, user_id, total_amount, payment_status, created_at)
+        VALUES (1, 2, 12.5, 'paid', ?)
+    """, (created_at,)).lastrowid
+
+
+@pytest.mark.parametrize("created_at", [None, "not a date"])
+def test_invoices_without_a_day_are_skipped(conn, created_at):
+    invoiceId = _insert(conn, created_at)
+    other = _insert(conn, "2025-03-01 10:00:00")
+    assert _tables(conn) == _rebuilt(conn)
+
+    # Moving invoices to and from no day keeps the totals in step
+    conn.execute("UPDATE Invoices SET created_at = ? WHERE invoice_id = ?", (created_at, other))
+    conn.execute("UPDATE Invoices SET created_at = '2025-03-02 09:00:00' WHERE invoice_id = ?", (invoiceId,))
+    conn.execute("UPDATE Invoices SET total_amount = 20 WHERE invoice_id = ?", (other,))
+    assert _tables(conn) == _rebuilt(conn)
+
+    conn.execute("DELETE FROM Invoices WHERE invoice_id IN (?, ?)", (invoiceId, other))
+    assert _tables(conn) == _rebuilt(conn)
+    conn.commit()
@@ -0,0 +1,122 @@
+import threading
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from connection import READER_COUNT, get_connection, get_remote, run
+
+# -------------------- Background Query Executor --------------------
+# Database work runs on a QThreadPool; results come back to the GUI thread through
+# queued signals. Tasks submitted under the same key supersede each other, so a new
+# search cancels the one still running for the previous term.
+
+class TaskSignals(QObject):
+    done = pyqtSignal(bool, object)
+    progress = pyqtSignal(int, int)
+
+
+class QueryTask(QRunnable):
+    def __init__(self, fn, args, readonly, reportsProgress=False, pooled=True):
+        super(QueryTask, self).__init__()
+        self.setAutoDelete(False)
+        self.fn = fn
+        self.args = args
+        self.readonly = readonly
+        self.reportsProgress = reportsProgress
+        self.pooled = pooled
+        self.signals = TaskSignals()
+        self.cancelled = False
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def run(self):
+        if self.cancelled:
+            self.signals.done.emit(False, None)
+            return
+        try:
+            remote = get_remote()
+            if not self.pooled:
+                # fn opens its own short units of work through connection.run()
+                kwargs = {"progress": self.signals.progress.emit} if self.reportsProgress else {}
+                result = self.fn(*self.args, **kwargs)
+            elif remote is not None and remote.serves(self.fn) and not self.reportsProgress:
+                # Client mode: the whole operation runs on the POS server in one request
+                result = run(self.fn, *self.args, readonly=self.readonly)
+            else:
+                result = self._runLocal()
+        except Exception as e:
+            self.signals.done.emit(False, e)
+            return
+        self.signals.done.emit(True, result)
+
+    def _runLocal(self):
+        with get_connection(readonly=self.readonly) as conn:
+            with self._lock:
+                self._conn = conn
+            try:
+                if self.reportsProgress:
+                    return self.fn(conn, *self.args, progress=self.signals.progress.emit)
+                return self.fn(conn, *self.args)
+            finally:
+                with self._lock:
+                    self._conn = None
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            # Only reads are interrupted; an interrupted write would be rolled back
+            if self._conn is not None and self.readonly:
+                self._conn.interrupt()
+
+
+class QueryExecutor(QObject):
+    def __init__(self, maxThreads=READER_COUNT, parent=None):
+        super(QueryExecutor, self).__init__(parent)
+        self._threadPool = QThreadPool(self)
+        self._threadPool.setMaxThreadCount(maxThreads)
+        self._current = {}  # key -> latest task
+        self._tasks = set()  # keeps running tasks alive until they report back
+
+    def submit(self, fn, *args, key=None, readonly=True, pooled=True, onResult=None, onError=None, onProgress=None):
+        # fn(conn, *args) runs on a pooled connection; callbacks run on the GUI thread.
+        # With onProgress, fn also receives progress=callable(done, total). With pooled=False
+        # fn(*args) gets no connection and must not hold one for long (bulk imports).
+        task = QueryTask(fn, args, readonly, onProgress is not None, pooled)
+        if onProgress is not None:
+            task.signals.progress.connect(onProgress)
+        if key is not None:
+            previous = self._current.get(key)
+            if previous is not None:
+                previous.cancel()
+            self._current[key] = task
+        task.signals.done.connect(lambda ok, value: self._finish(task, key, ok, value, onResult, onError))
+        self._tasks.add(task)
+        self._threadPool.start(task)
+        return task
+
+    def _finish(self, task, key, ok, value, onResult, onError):
+        self._tasks.discard(task)
+        if key is not None:
+            if self._current.get(key) is not task:
+                return
+            del self._current[key]
+        if task.cancelled:
+            return
+        if ok:
+            if onResult is not None:
+                onResult(value)
+        elif onError is not None:
+            onError(value)
+
+    def shutdown(self):
+        for task in list(self._current.values()):
+            task.cancel()
+        self._threadPool.waitForDone()
+
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = QueryExecutor()
+    return _executor